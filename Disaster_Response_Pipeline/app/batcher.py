@@ -0,0 +1,101 @@
+import threading
+import queue
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher(object):
+    """
+    This class collects messages submitted by concurrent requests and runs
+    them through a single prediction call. A batch is flushed when it holds
+    max_batch_size messages or when the oldest request has waited max_wait
+    seconds, whichever happens first.
+    INPUT:
+    predict_fn - function taking a list of messages and returning a tuple of
+                 arrays (labels, probabilities), one row per message
+    max_batch_size - int - upper bound of messages per prediction call
+    max_wait - float - seconds a request may wait for others to join its batch
+    workers - int - batches predicted at the same time, more than 1 only helps
+              when predict_fn does not hold the GIL, e.g. a process pool
+    """
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait=0.01, workers=1):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.workers = workers
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+
+    def _start(self):
+        # start the workers lazily so forked server processes get their own
+        with self._lock:
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            while len(self._workers) < self.workers:
+                worker = threading.Thread(target=self._run, daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, messages):
+        """
+        This function queues a list of messages for prediction
+        INPUT:
+        messages - list of strings to classify
+        OUTPUT:
+        future - concurrent.futures.Future resolving to (labels, probabilities)
+        """
+        future = Future()
+        if len(messages) == 0:
+            future.set_result((None, None))
+            return future
+        self._start()
+        self._queue.put((list(messages), future))
+        return future
+
+    def predict(self, messages, timeout=None):
+        """
+        This function classifies messages and blocks until the batch holding
+        them has been predicted
+        INPUT:
+        messages - list of strings to classify
+        timeout - float - seconds to wait for the result, None waits forever
+        OUTPUT:
+        labels - array of shape (n_messages, n_categories)
+        probabilities - array of shape (n_messages, n_categories)
+        """
+        return self.submit(messages).result(timeout)
+
+    def _collect(self):
+        # block for the first request, then gather more until size or deadline
+        pending = [self._queue.get()]
+        size = len(pending[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            messages = [msg for msgs, _ in pending for msg in msgs]
+            try:
+                labels, probabilities = self.predict_fn(messages)
+            except Exception as exc:
+                for _, future in pending:
+                    future.set_exception(exc)
+                continue
+            # hand every request back its own slice of the batch
+            start = 0
+            for msgs, future in pending:
+                end = start + len(msgs)
+                future.set_result((labels[start:end], probabilities[start:end]))
+                start = end
@@ -0,0 +1,53 @@
+import os
+import sys
+import importlib
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+
+WORDS = ['water', 'food', 'shelter', 'medical', 'fire', 'flood', 'storm', 'help', 'please', 'need']
+CATEGORIES = ['related', 'request', 'offer', 'aid_related', 'water', 'food']
+
+
+def message_table(n_rows, seed=0):
+    """
+    This function builds a message_category table of random messages whose
+    labels follow their words
+    """
+    rng = np.random.RandomState(seed)
+    messages = [' '.join(rng.choice(WORDS, rng.randint(3, 8))) for _ in range(n_rows)]
+    df = pd.DataFrame({'id': np.arange(1, n_rows + 1), 'message': messages,
+                       'original': [None] * n_rows, 'genre': rng.choice(['direct', 'news', 'social'], n_rows)})
+    for k, name in enumerate(CATEGORIES):
+        df[name] = [int(WORDS[k] in msg.split()) for msg in messages]
+    return df
+
+
+@pytest.fixture(scope='session')
+def run(tmp_path_factory):
+    """
+    This fixture imports the app on a small database and model
+    """
+    import train_classifier
+    directory = tmp_path_factory.mktemp('app')
+    database_filepath = str(directory / 'DisasterResponse.db')
+    model_filepath = str(directory / 'classifier.pkl')
+    df = message_table(120)
+    df.to_sql('message_category', create_engine('sqlite:///{}'.format(database_filepath)), index=False)
+
+    model = train_classifier.build_model().estimator
+    model.set_params(clf__estimator__n_estimators=3)
+    model.fit(df['message'].values, df[CATEGORIES].values)
+    train_classifier.save_model(model, model_filepath)
+    train_classifier.save_similarity_index(model, database_filepath, model_filepath, chunksize=50)
+
+    # run.py reads its settings when it is imported
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv('DISASTER_DATABASE', database_filepath)
+        patch.setenv('DISASTER_MODEL', model_filepath)
+        patch.setenv('DISASTER_CACHE_SIZE', '0')
+        return importlib.import_module('run')
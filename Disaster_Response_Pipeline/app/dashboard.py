@@ -0,0 +1,86 @@
+import os
+import time
+import hashlib
+import threading
+
+import pandas as pd
+from sqlalchemy import inspect, text
+
+
+def query_aggregates(engine, table='message_category'):
+    """
+    This function lets sqlite compute the aggregates shown on the index page,
+    so only a few dozen numbers are read instead of the whole table
+    INPUT:
+    engine - SQLAlchemy engine of the disaster response database
+    table - string - name of the cleaned messages table
+    OUTPUT:
+    genre_counts - Series of message counts per genre
+    cat_counts - Series of message counts per category, ascending
+    perc_msg_counts - Series of the 10 categories with the highest share of messages
+    """
+    category_names = [col['name'] for col in inspect(engine).get_columns(table)][4:]
+    with engine.connect() as connection:
+        genres = pd.read_sql_query(text(
+            'SELECT genre, COUNT(message) AS message FROM {} '
+            'WHERE genre IS NOT NULL GROUP BY genre ORDER BY genre'.format(table)), connection)
+        sums = connection.execute(text('SELECT COUNT(*), {} FROM {}'.format(
+            ', '.join('SUM("{}")'.format(col) for col in category_names), table))).fetchone()
+
+    genre_counts = genres.set_index('genre')['message']
+    n_rows = sums[0]
+    category_sums = pd.Series([value or 0 for value in sums[1:]], index=category_names)
+
+    # Message count by categories
+    cat_counts = category_sums.sort_values()
+    # Top 10 message categories
+    perc_msg_counts = (category_sums / max(n_rows, 1)).sort_values(ascending=False).head(10)
+    return genre_counts, cat_counts, perc_msg_counts
+
+
+class DashboardCache(object):
+    """
+    This class keeps the rendered graph JSON of the index page in memory and
+    rebuilds it only when the database file changes. The file is checked at
+    most once every check_interval seconds, so a page view never touches the
+    database while it is unchanged.
+    INPUT:
+    database_filepath - string - path of the sqlite database
+    build_fn - function returning (ids, graphJSON) from the database
+    check_interval - float - seconds between two checks of the database file
+    """
+
+    def __init__(self, database_filepath, build_fn, check_interval=5.0):
+        self.database_filepath = database_filepath
+        self.build_fn = build_fn
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked_at = 0.0
+        self._value = None
+
+    def _file_signature(self):
+        stat = os.stat(self.database_filepath)
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self):
+        """
+        This function returns the cached page data, rebuilding it first when
+        the database changed since it was built
+        OUTPUT:
+        ids - list of graph element ids
+        graphJSON - string - plotly graphs encoded as JSON
+        etag - string - hash of graphJSON for conditional requests
+        """
+        now = time.monotonic()
+        if self._value is not None and now - self._checked_at < self.check_interval:
+            return self._value
+        with self._lock:
+            signature = self._file_signature()
+            if self._value is None or signature != self._signature:
+                ids, graphJSON = self.build_fn()
+                etag = hashlib.sha1(graphJSON.encode('utf-8')).hexdigest()
+                self._value = (ids, graphJSON, etag)
+                self._signature = signature
+            self._checked_at = now
+        return self._value
@@ -0,0 +1,248 @@
+import os
+import time
+import random
+import cProfile
+import threading
+from contextlib import contextmanager
+
+# upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(names, values):
+    """
+    This function renders label pairs in the Prometheus text format
+    """
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append('{}="{}"'.format(name, value))
+    return '{' + ','.join(pairs) + '}'
+
+
+def format_value(value):
+    """
+    This function renders a sample value, infinities the way Prometheus spells them
+    """
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric(object):
+    """
+    This class holds the samples of one metric for every combination of label
+    values. Updates take a lock, so request threads can share it.
+    INPUT:
+    name - string - metric name
+    documentation - string - help text
+    labelnames - tuple of label names
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError('{} takes the labels {}'.format(self.name, self.labelnames))
+        return tuple(labels[name] for name in self.labelnames)
+
+    def render(self):
+        """
+        This function returns the metric in the Prometheus text format
+        """
+        lines = ['# HELP {} {}'.format(self.name, self.documentation), '# TYPE {} {}'.format(self.name, self.kind)]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        return ['{}{} {}'.format(self.name, format_labels(self.labelnames, key), format_value(value))]
+
+
+class Counter(Metric):
+    """
+    This class counts events, e.g. requests per endpoint
+    """
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    This class holds a value that is set rather than accumulated
+    """
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(Metric):
+    """
+    This class counts observations into cumulative buckets, e.g. latencies
+    INPUT:
+    buckets - sorted upper bounds of the buckets, +Inf is added
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        Metric.__init__(self, name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        This function observes the seconds spent in a with block
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self, key, value):
+        counts, total = value
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            labels = format_labels(self.labelnames + ('le',), key + (format_value(float(bound)),))
+            lines.append('{}_bucket{} {}'.format(self.name, labels, cumulative))
+        labels = format_labels(self.labelnames, key)
+        lines.append('{}_sum{} {}'.format(self.name, labels, repr(total)))
+        lines.append('{}_count{} {}'.format(self.name, labels, cumulative))
+        return lines
+
+
+class CallbackMetric(Metric):
+    """
+    This class reads its value from a function whenever it is rendered, for
+    counts an object keeps itself
+    INPUT:
+    kind - string - 'counter' or 'gauge'
+    fn - function returning the current value
+    """
+
+    def __init__(self, name, documentation, kind, fn):
+        Metric.__init__(self, name, documentation)
+        self.kind = kind
+        self.fn = fn
+
+    def render(self):
+        value = self.fn()
+        with self._lock:
+            self._values = {(): value}
+        return Metric.render(self)
+
+
+class Registry(object):
+    """
+    This class collects the metrics of the app and renders them all for the
+    /metrics endpoint
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def callback(self, *args, **kwargs):
+        return self.register(CallbackMetric(*args, **kwargs))
+
+    def render(self):
+        """
+        This function returns every metric in the Prometheus text format
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class RequestProfiler(object):
+    """
+    This class profiles a random share of requests with cProfile and writes
+    the stats of each one to a file that pstats or snakeviz can read.
+    INPUT:
+    sample_rate - float - share of requests profiled, 0 disables profiling
+    directory - string - folder receiving one .prof file per profiled request
+    """
+
+    def __init__(self, sample_rate=0.0, directory='profiles'):
+        self.sample_rate = sample_rate
+        self.directory = directory
+
+    def start(self):
+        """
+        This function starts profiling the current request when it is sampled
+        OUTPUT:
+        profile - cProfile.Profile to hand to stop, or None
+        """
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler is active in this thread
+            return None
+        return profile
+
+    def stop(self, profile, name):
+        """
+        This function stops a profile and writes its stats
+        INPUT:
+        profile - value returned by start
+        name - string - identifies the request in the file name
+        OUTPUT:
+        path of the stats file, None when the request was not sampled
+        """
+        if profile is None:
+            return None
+        profile.disable()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, '{}-{:.6f}-{}.prof'.format(name, time.time(), threading.get_ident()))
+        profile.dump_stats(path)
+        return path
@@ -0,0 +1,200 @@
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# the tokenizer replaces anything that is not a letter or a digit by a space
+NON_ALPHANUMERIC = re.compile(r"[^a-zA-Z0-9]+")
+
+SIMHASH_BITS = 64
+# the 64 bits are split into this many bands, two fingerprints within
+# SIMHASH_BANDS - 1 bits of each other share at least one band
+SIMHASH_BANDS = 4
+
+
+def normalize(message):
+    """
+    This function returns the cache key of a message: the text the tokenizer
+    sees, lower case words separated by single spaces, and the raw length,
+    which the model also uses as a feature. Messages with the same key get
+    the same prediction.
+    """
+    return ' '.join(NON_ALPHANUMERIC.sub(' ', message.lower()).split()), len(message)
+
+
+def simhash(text, bits=SIMHASH_BITS):
+    """
+    This function returns the SimHash fingerprint of a normalized text, built
+    from its words and word pairs, so texts differing in a few words have
+    fingerprints differing in a few bits
+    """
+    words = text.split()
+    features = words + [' '.join(pair) for pair in zip(words, words[1:])]
+    if not features:
+        return 0
+    hashes = np.array([int.from_bytes(hashlib.blake2b(f.encode('utf-8'), digest_size=8).digest(), 'little')
+                       for f in features], dtype=np.uint64)
+    bit_values = (hashes[:, np.newaxis] >> np.arange(bits, dtype=np.uint64)) & np.uint64(1)
+    weights = (2 * bit_values.astype(np.int64) - 1).sum(axis=0)
+    return int(sum(1 << i for i in np.flatnonzero(weights > 0)))
+
+
+def bands(fingerprint, n_bands=SIMHASH_BANDS, bits=SIMHASH_BITS):
+    width = bits // n_bands
+    mask = (1 << width) - 1
+    return [(i, (fingerprint >> (i * width)) & mask) for i in range(n_bands)]
+
+
+class PredictionCache(object):
+    """
+    This class remembers the predictions of recent messages, so repeated and
+    retweeted messages skip tokenizing and the forests. Entries expire after
+    ttl seconds, the least recently used ones are dropped beyond max_size, and
+    all of them are dropped when the model version changes.
+    INPUT:
+    max_size - int - number of messages remembered, 0 disables the cache
+    ttl - float - seconds an entry is served, None keeps entries until evicted
+    version_fn - function returning the version of the model serving the
+                 predictions, checked at most once every check_interval seconds
+    check_interval - float - seconds between two calls of version_fn
+    max_distance - int - also serve the prediction of a message whose SimHash
+                   differs in at most this many bits, 0 only serves exact keys.
+                   Near duplicates may differ in a word or two, so their
+                   prediction is an approximation. At most SIMHASH_BANDS - 1.
+    """
+
+    def __init__(self, max_size=10000, ttl=3600.0, version_fn=None, check_interval=5.0, max_distance=0):
+        if max_distance >= SIMHASH_BANDS:
+            raise ValueError('max_distance must be below {}'.format(SIMHASH_BANDS))
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version_fn = version_fn
+        self.check_interval = check_interval
+        self.max_distance = max_distance
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bands = {}
+        self._version = None
+        self._checked_at = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bands.clear()
+
+    def _check_version(self):
+        # called with the lock held
+        now = time.monotonic()
+        if self.version_fn is None or (self._checked_at is not None and now - self._checked_at < self.check_interval):
+            return
+        self._checked_at = now
+        version = self.version_fn()
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bands.clear()
+            self._version = version
+
+    def _remove(self, key):
+        labels, probabilities, expires, fingerprint = self._entries.pop(key)
+        if fingerprint is not None:
+            for band in bands(fingerprint):
+                keys = self._bands.get(band)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._bands[band]
+
+    def _get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] is not None and entry[2] < now:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _get_near(self, fingerprint, now):
+        candidates = set()
+        for band in bands(fingerprint):
+            candidates.update(self._bands.get(band, ()))
+        best, best_distance = None, self.max_distance + 1
+        for key in candidates:
+            distance = bin(self._entries[key][3] ^ fingerprint).count('1')
+            if distance < best_distance:
+                best, best_distance = key, distance
+        return None if best is None else self._get(best, now)
+
+    def _put(self, key, labels, probabilities, now):
+        if key in self._entries:
+            self._remove(key)
+        fingerprint = simhash(key[0]) if self.max_distance else None
+        expires = None if self.ttl is None else now + self.ttl
+        self._entries[key] = (labels, probabilities, expires, fingerprint)
+        if fingerprint is not None:
+            for band in bands(fingerprint):
+                self._bands.setdefault(band, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def predict(self, messages, predict_fn):
+        """
+        This function returns the predictions of messages, calling predict_fn
+        once for the distinct messages that are not cached
+        INPUT:
+        messages - list of strings to classify
+        predict_fn - function taking a list of messages and returning a tuple
+                     of arrays (labels, probabilities), one row per message
+        OUTPUT:
+        labels - array of shape (n_messages, n_categories)
+        probabilities - array of shape (n_messages, n_categories)
+        """
+        if self.max_size <= 0 or len(messages) == 0:
+            return predict_fn(messages)
+
+        keys = [normalize(msg) for msg in messages]
+        rows = [None] * len(messages)
+        missing = OrderedDict()
+        with self._lock:
+            self._check_version()
+            version = self._version
+            now = time.monotonic()
+            for i, key in enumerate(keys):
+                entry = self._get(key, now)
+                if entry is None and self.max_distance:
+                    entry = self._get_near(simhash(key[0]), now)
+                    if entry is not None:
+                        self.near_hits += 1
+                if entry is None:
+                    missing.setdefault(key, []).append(i)
+                    self.misses += 1
+                else:
+                    rows[i] = entry[:2]
+                    self.hits += 1
+
+        if missing:
+            # one prediction per distinct message, the first of each key stands for it
+            labels, probabilities = predict_fn([messages[positions[0]] for positions in missing.values()])
+            with self._lock:
+                now = time.monotonic()
+                # a model that changed meanwhile must not see these entries
+                store = version == self._version
+                for j, (key, positions) in enumerate(missing.items()):
+                    if store:
+                        self._put(key, labels[j], probabilities[j], now)
+                    for i in positions:
+                        rows[i] = (labels[j], probabilities[j])
+
+        return np.vstack([row[0] for row in rows]), np.vstack([row[1] for row in rows])
@@ -1,41 +1,30 @@
+import os
+import sys
 import json
+import time
+import threading
 import plotly
 import pandas as pd
 import numpy as np
 
-from nltk.stem import WordNetLemmatizer
-from nltk.tokenize import word_tokenize
-
 from flask import Flask
-from flask import render_template, request, jsonify
+from flask import render_template, request, jsonify, make_response, Response, stream_with_context, g
 from plotly.graph_objs import Bar, Heatmap
-from sklearn.externals import joblib
-from sqlalchemy import create_engine
-
+from sqlalchemy import create_engine, inspect
 
-app = Flask(__name__)
+from batcher import MicroBatcher
+from dashboard import DashboardCache, query_aggregates
+from metrics import Registry, RequestProfiler
+from prediction_cache import PredictionCache
 
-def tokenize(text):
-    """
-    This function case normalizes, tokenizes and lemmatizes a text
-    
-    INPUT
-    text - string that needs processing
-    OUTPUT
-    clean_tokens - list of cleaned tokens
-    """
-    # create word_tokenizer object
-    tokens = word_tokenize(text)
-    # create lemmatizer object
-    lemmatizer = WordNetLemmatizer()
+# share the tokenizer of the training pipeline
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+from tokenizer import tokenize
+from model_io import load_serving_model, predict_with_proba, artifact_filepath, artifact_version
+from similarity import load_similarity_index, similar_filepath, tfidf_stage
 
-    clean_tokens = []
-    # loop through tokens
-    for tok in tokens:
-        clean_tok = lemmatizer.lemmatize(tok).lower().strip()
-        clean_tokens.append(clean_tok)
 
-    return clean_tokens
+app = Flask(__name__)
 
 def text_length_extractor(arr):
     """
@@ -47,37 +36,269 @@ def text_length_extractor(arr):
     """
     return np.array([len(text) for text in arr]).reshape(-1,1)
 
-# load data
-engine = create_engine('sqlite:///../data/DisasterResponse.db')
-df = pd.read_sql_table('message_category', engine)
+# artifact locations, relative to the app directory unless overridden
+DATABASE_FILEPATH = os.environ.get('DISASTER_DATABASE', '../data/DisasterResponse.db')
+MODEL_FILEPATH = os.environ.get('DISASTER_MODEL', '../models/classifier.pkl')
 
-# load model
-model = joblib.load("../models/classifier.pkl")
+# micro-batching settings of the /classify endpoint
+MAX_BATCH_SIZE = int(os.environ.get('DISASTER_MAX_BATCH_SIZE', 64))
+MAX_BATCH_WAIT = float(os.environ.get('DISASTER_MAX_BATCH_WAIT', 0.01))
 
+# seconds between two checks of the database for changed dashboard data
+DASHBOARD_CHECK_INTERVAL = float(os.environ.get('DISASTER_DASHBOARD_CHECK_INTERVAL', 5))
 
-# index webpage displays cool visuals and receives user input text for model
-@app.route('/')
-@app.route('/index')
-def index():
-    
-    # extract data needed for visuals
-    # TODO: Below is an example - modify to extract data for your own visuals
-    # Message count by genre
-    genre_counts = df.groupby('genre').count()['message']
+# seconds between two checks of the model artifact for a retrained model
+MODEL_CHECK_INTERVAL = float(os.environ.get('DISASTER_MODEL_CHECK_INTERVAL', 5))
+
+# prediction cache of repeated messages, a size of 0 disables it; a SimHash
+# distance above 0 also serves near duplicates, at most 3 bits
+CACHE_SIZE = int(os.environ.get('DISASTER_CACHE_SIZE', 10000))
+CACHE_TTL = float(os.environ.get('DISASTER_CACHE_TTL', 3600))
+CACHE_SIMHASH_DISTANCE = int(os.environ.get('DISASTER_CACHE_SIMHASH_DISTANCE', 0))
+
+# similar messages returned by /similar by default and at most; reading
+# more postings per query term finds more of the true neighbors, slower
+SIMILAR_K = int(os.environ.get('DISASTER_SIMILAR_K', 10))
+SIMILAR_MAX_K = int(os.environ.get('DISASTER_SIMILAR_MAX_K', 100))
+SIMILAR_MAX_POSTINGS = int(os.environ.get('DISASTER_SIMILAR_MAX_POSTINGS', 2000))
+
+# share of requests profiled with cProfile, 0 disables the profiler
+PROFILE_SAMPLE_RATE = float(os.environ.get('DISASTER_PROFILE_SAMPLE_RATE', 0))
+PROFILE_DIR = os.environ.get('DISASTER_PROFILE_DIR', 'profiles')
+
+# request and prediction stage metrics served at /metrics
+metrics = Registry()
+request_count = metrics.counter('disaster_requests_total', 'Requests served by endpoint, method and status.',
+                                ('endpoint', 'method', 'status'))
+request_latency = metrics.histogram('disaster_request_duration_seconds', 'Seconds spent serving a request.',
+                                    ('endpoint',))
+stage_latency = metrics.histogram('disaster_stage_duration_seconds',
+                                  'Seconds spent in a stage of the prediction path: features (tokenizing and '
+                                  'vectorizing), classify (the 36 forests), pool (both in a worker process of '
+                                  'serve.py), render (templates), similar (similar messages lookup).', ('stage',))
+predicted_messages = metrics.counter('disaster_predicted_messages_total', 'Messages classified by the model.')
+model_info = metrics.gauge('disaster_model_info', 'Export of the loaded model and its version, always 1.',
+                           ('path', 'version'))
+model_loaded_at = metrics.gauge('disaster_model_loaded_timestamp_seconds', 'Unix time the model was loaded.')
+model_load_seconds = metrics.gauge('disaster_model_load_seconds', 'Seconds it took to load the model.')
+
+profiler = RequestProfiler(PROFILE_SAMPLE_RATE, PROFILE_DIR)
+
+
+def stage_timer(stage):
+    """
+    This function returns a context manager recording the seconds spent in a
+    stage of the prediction path
+    """
+    return stage_latency.time(stage=stage)
+
+
+# only the category names are kept in memory, aggregates come from sqlite
+engine = create_engine('sqlite:///{}'.format(DATABASE_FILEPATH))
+category_names = [col['name'] for col in inspect(engine).get_columns('message_category')][4:]
+
+# the model is loaded by the first request that needs it
+model = None
+model_version = None
+model_checked_at = None
+model_lock = threading.Lock()
+
+
+def get_model():
+    """
+    This function returns the model, loading the slim serving artifact with
+    memory-mapped arrays on first use so worker startup stays cheap. The
+    artifact is checked at most every MODEL_CHECK_INTERVAL seconds and
+    reloaded when it was retrained; a failed reload keeps the loaded model.
+    """
+    global model, model_version, model_checked_at
+    now = time.monotonic()
+    if model is not None and now - model_checked_at < MODEL_CHECK_INTERVAL:
+        return model
+    with model_lock:
+        if model is None or now - model_checked_at >= MODEL_CHECK_INTERVAL:
+            version = artifact_version(MODEL_FILEPATH)
+            if version != model_version:
+                start = time.perf_counter()
+                try:
+                    loaded = load_serving_model(MODEL_FILEPATH)
+                except Exception:
+                    # the artifact may be halfway written, retry at the next check
+                    if model is None:
+                        raise
+                    loaded = None
+                if loaded is not None:
+                    model, model_version = loaded, version
+                    model_load_seconds.set(time.perf_counter() - start)
+                    model_loaded_at.set(time.time())
+                    model_info.clear()
+                    model_info.set(1, path=artifact_filepath(MODEL_FILEPATH), version=version)
+            model_checked_at = now
+    return model
+
+
+def get_model_version():
+    """
+    This function returns the version of the model serving predictions
+    """
+    get_model()
+    return model_version
+
+
+# set by serve.py to classify in worker processes instead of this one
+model_pool = None
+
+
+def predict_messages(messages):
+    """
+    This function classifies a batch of messages with a single call to the
+    model and returns hard labels together with the probability of each
+    category being present
+    INPUT:
+    messages - list of strings to classify
+    OUTPUT:
+    labels - int array of shape (n_messages, n_categories)
+    probabilities - float array of shape (n_messages, n_categories)
+    """
+    predicted_messages.inc(len(messages))
+    if model_pool is not None:
+        with stage_timer('pool'):
+            return model_pool.predict(messages)
+    return predict_with_proba(get_model(), messages, timer=stage_timer)
+
+
+# the similarity index is loaded by the first /similar request, and again
+# whenever the model changes since it is built from the model's features
+similar_index = None
+similar_version = None
+similar_lock = threading.Lock()
+
+
+def get_similar_index():
+    """
+    This function returns the similarity index of the loaded model with its
+    TF-IDF transform, memory-mapped so it costs little memory per worker
+    OUTPUT:
+    index - SimilarityIndex, None when the model was trained without one
+    transform - function turning messages into TF-IDF vectors
+    """
+    global similar_index, similar_version
+    version = get_model_version()
+    with similar_lock:
+        if similar_version != version:
+            directory = similar_filepath(MODEL_FILEPATH)
+            try:
+                index = load_similarity_index(directory) if os.path.isdir(directory) else None
+            except ValueError:
+                # an index of an older layout is rebuilt by retraining
+                index = None
+            similar_index, similar_version = (index, tfidf_stage(get_model())), version
+    return similar_index
+
+
+def find_similar(query, k):
+    """
+    This function looks up the past messages most similar to a query with
+    their labels in the database
+    OUTPUT:
+    results - list of dicts with the id, message, genre, similarity score and
+              the categories of a message, most similar first, None without
+              a similarity index
+    """
+    index, transform = get_similar_index()
+    if index is None:
+        return None
+    with stage_timer('similar'):
+        ids, scores = index.query(transform([query]), k, max_postings=SIMILAR_MAX_POSTINGS)
+    if len(ids) == 0:
+        return []
+    params = ','.join(str(int(message_id)) for message_id in ids)
+    with engine.connect() as connection:
+        df = pd.read_sql_query('SELECT * FROM message_category WHERE id IN ({}) ORDER BY rowid'.format(params),
+                               connection)
+    # the first row of an id repeated in the database stands for it
+    df = df.drop_duplicates('id').set_index('id')
+    results = []
+    # messages deleted since the index was built are left out, and an id
+    # indexed more than once is returned at its best score
+    for message_id, score in zip(ids.tolist(), scores.tolist()):
+        if message_id not in df.index or message_id in (result['id'] for result in results):
+            continue
+        row = df.loc[message_id]
+        results.append({
+            'id': message_id,
+            'message': row['message'],
+            'genre': row['genre'],
+            'score': round(score, 4),
+            'labels': [name for name in category_names if row[name] == 1]
+        })
+    return results
+
+
+batcher = MicroBatcher(predict_messages, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_BATCH_WAIT)
+
+# repeated messages are answered from the cache, which is emptied when the model changes
+cache = PredictionCache(max_size=CACHE_SIZE, ttl=CACHE_TTL, version_fn=get_model_version,
+                        check_interval=MODEL_CHECK_INTERVAL, max_distance=CACHE_SIMHASH_DISTANCE)
+metrics.callback('disaster_cache_hits_total', 'Messages answered from the prediction cache, near hits included.',
+                 'counter', lambda: cache.hits)
+metrics.callback('disaster_cache_near_hits_total', 'Messages answered with the prediction of a near duplicate.',
+                 'counter', lambda: cache.near_hits)
+metrics.callback('disaster_cache_misses_total', 'Messages not found in the prediction cache.',
+                 'counter', lambda: cache.misses)
+metrics.callback('disaster_cache_invalidations_total', 'Times the prediction cache was emptied by a new model.',
+                 'counter', lambda: cache.invalidations)
+metrics.callback('disaster_cache_entries', 'Messages held by the prediction cache.', 'gauge', lambda: len(cache))
+
+
+def format_results(messages, labels, probabilities):
+    """
+    This function turns batched predictions into JSON serializable records
+    INPUT:
+    messages - list of classified strings
+    labels - int array of shape (n_messages, n_categories)
+    probabilities - float array of shape (n_messages, n_categories)
+    OUTPUT:
+    results - list of dicts with the message, its labels and probabilities
+    """
+    results = []
+    for msg, lab, prob in zip(messages, labels, probabilities):
+        results.append({
+            'message': msg,
+            'labels': dict(zip(category_names, lab.tolist())),
+            'probabilities': dict(zip(category_names, prob.round(4).tolist()))
+        })
+    return results
+
+
+def parse_ndjson_line(line):
+    """
+    This function extracts a message from one NDJSON line, which may hold
+    either a JSON string or an object with a 'message' key
+    """
+    record = json.loads(line)
+    if isinstance(record, dict):
+        record = record.get('message')
+    if not isinstance(record, str):
+        raise ValueError('every NDJSON line must be a string or hold a "message" string')
+    return record
+
+
+def build_graphs(genre_counts, cat_counts, perc_msg_counts):
+    """
+    This function creates the plotly figures of the index page
+    INPUT:
+    genre_counts - Series of message counts per genre
+    cat_counts - Series of message counts per category
+    perc_msg_counts - Series of the top 10 categories and their share of messages
+    OUTPUT:
+    graphs - list of plotly figure dicts
+    """
     genre_names = list(genre_counts.index)
-    
-    # Message count by categories
-    cat_counts = df[df.columns[4:]].sum().sort_values()
-    cat_counts.sort_values()
     cat_names = list(cat_counts.index)
-    
-    # Top 10 message categories
-    num_vars = df.select_dtypes(include=['int']).columns.drop('id')
-    perc_msg_counts = df[num_vars].mean().sort_values(ascending=False).head(10)
     perc_msg_names = list(perc_msg_counts.index)
-    
+
     # create visuals
-    # TODO: Below is an example - modify to create your own visuals
     graphs = [
         {
             'data': [
@@ -137,12 +358,82 @@ def index():
         
     ]
     
+    return graphs
+
+
+def render_dashboard():
+    """
+    This function aggregates the database and encodes the index page graphs
+    OUTPUT:
+    ids - list of graph element ids
+    graphJSON - string - plotly graphs encoded as JSON
+    """
+    graphs = build_graphs(*query_aggregates(engine))
+
     # encode plotly graphs in JSON
     ids = ["graph-{}".format(i) for i, _ in enumerate(graphs)]
     graphJSON = json.dumps(graphs, cls=plotly.utils.PlotlyJSONEncoder)
+    return ids, graphJSON
+
+
+# the graphs are rebuilt only when the database file changes
+dashboard = DashboardCache(DATABASE_FILEPATH, render_dashboard, check_interval=DASHBOARD_CHECK_INTERVAL)
+
+
+def not_modified(etag):
+    """
+    This function answers a conditional request whose ETag still matches
+    """
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+@app.before_request
+def start_request():
+    g.request_start = time.perf_counter()
+    g.profile = profiler.start()
+
+
+@app.after_request
+def record_request(response):
+    # streamed responses are recorded once their headers are sent
+    endpoint = request.endpoint or 'unmatched'
+    request_latency.observe(time.perf_counter() - g.get('request_start', time.perf_counter()), endpoint=endpoint)
+    request_count.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    profiler.stop(g.pop('profile', None), endpoint)
+    return response
+
+
+# request and model metrics in the Prometheus text format
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+# index webpage displays cool visuals and receives user input text for model
+@app.route('/')
+@app.route('/index')
+def index():
+    ids, graphJSON, etag = dashboard.get()
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
     
     # render web page with plotly graphs
-    return render_template('master.html', ids=ids, graphJSON=graphJSON)
+    response = make_response(render_template('master.html', ids=ids, graphJSON=graphJSON))
+    response.set_etag(etag)
+    return response
+
+
+# pre-rendered plotly graphs of the index page
+@app.route('/graphs.json')
+def graphs_json():
+    ids, graphJSON, etag = dashboard.get()
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    response = Response(graphJSON, mimetype='application/json')
+    response.set_etag(etag)
+    return response
 
 
 # web page that handles user query and displays model results
@@ -152,15 +443,89 @@ def go():
     query = request.args.get('query', '') 
 
     # use model to predict classification for query
-    classification_labels = model.predict([query])[0]
-    classification_results = dict(zip(df.columns[4:], classification_labels))
+    classification_labels = cache.predict([query], predict_messages)[0][0]
+    classification_results = dict(zip(category_names, classification_labels))
 
     # This will render the go.html Please see that file. 
-    return render_template(
-        'go.html',
-        query=query,
-        classification_result=classification_results
-    )
+    with stage_timer('render'):
+        return render_template(
+            'go.html',
+            query=query,
+            classification_result=classification_results
+        )
+
+
+# JSON api returning the past messages most similar to a query
+@app.route('/similar')
+def similar():
+    query = request.args.get('query', '')
+    try:
+        k = int(request.args.get('k', SIMILAR_K))
+    except ValueError:
+        return jsonify({'error': 'k must be an integer'}), 400
+    if not query.strip() or not 1 <= k <= SIMILAR_MAX_K:
+        return jsonify({'error': 'expected a query and 1 <= k <= {}'.format(SIMILAR_MAX_K)}), 400
+
+    results = find_similar(query, k)
+    if results is None:
+        return jsonify({'error': 'no similarity index, train the model without --no-similar-index'}), 404
+    return jsonify({'query': query, 'results': results})
+
+
+# JSON api that classifies a batch of messages
+@app.route('/classify', methods=['POST'])
+def classify():
+    # NDJSON input is classified in chunks and streamed back line by line
+    if request.mimetype in ('application/x-ndjson', 'application/jsonlines'):
+        return Response(stream_with_context(classify_stream(request.stream)),
+                        mimetype='application/x-ndjson')
+
+    payload = request.get_json(silent=True)
+    messages = payload.get('messages') if isinstance(payload, dict) else payload
+    if not isinstance(messages, list) or not all(isinstance(msg, str) for msg in messages):
+        return jsonify({'error': 'expected {"messages": [...]} with a list of strings'}), 400
+    # an empty batch never reaches the model
+    if not messages:
+        return jsonify({'results': []})
+
+    labels, probabilities = cache.predict(messages, batcher.predict)
+    return jsonify({'results': format_results(messages, labels, probabilities)})
+
+
+def classify_stream(stream):
+    """
+    This function reads NDJSON messages from a request stream, submits them
+    to the batcher in chunks and yields one NDJSON result line per message.
+    A line that is not a message ends the stream with an error line, after
+    the results of the messages read before it.
+    """
+    chunk = []
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            chunk.append(parse_ndjson_line(line))
+        except ValueError as exc:
+            for record in classify_chunk(chunk):
+                yield record
+            yield json.dumps({'error': str(exc)}) + '\n'
+            return
+        if len(chunk) == MAX_BATCH_SIZE:
+            for record in classify_chunk(chunk):
+                yield record
+            chunk = []
+    for record in classify_chunk(chunk):
+        yield record
+
+
+def classify_chunk(chunk):
+    """
+    This function yields the NDJSON result lines of a list of messages
+    """
+    if chunk:
+        for record in format_results(chunk, *cache.predict(chunk, batcher.predict)):
+            yield json.dumps(record) + '\n'
 
 
 def main():
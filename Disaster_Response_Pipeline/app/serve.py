@@ -0,0 +1,305 @@
+import os
+import json
+import time
+import argparse
+import functools
+import threading
+import contextvars
+import multiprocessing
+from http import HTTPStatus
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import run
+from model_io import predict_with_proba
+
+# requests with a larger body are refused before the app sees them
+MAX_BODY_BYTES = int(os.environ.get('DISASTER_MAX_BODY_BYTES', 16 * 1024 * 1024))
+
+# server threads beyond the limits, they answer the requests that find the
+# queue full with a 503 right away
+SPARE_THREADS = 4
+
+
+def predict_in_worker(messages):
+    """
+    This function runs in a worker process and classifies messages with the
+    model the worker inherited from the server, or loaded on first use when
+    it was spawned. A retrained model is reloaded like in the app.
+    """
+    return predict_with_proba(run.get_model(), messages)
+
+
+class ModelPool(object):
+    """
+    This class classifies messages in a pool of worker processes, so
+    predictions run in parallel instead of taking turns on the GIL. Where
+    processes can be forked, the model is loaded before the workers start:
+    they share its pages copy-on-write, and the memory-mapped arrays of the
+    compact export through the page cache. When a worker dies, e.g. killed
+    for running out of memory, the pool is started anew and the batch it
+    was predicting is tried once more.
+    INPUT:
+    processes - int - number of worker processes
+    """
+
+    def __init__(self, processes):
+        self.processes = processes
+        self.restarts = 0
+        fork = 'fork' in multiprocessing.get_all_start_methods()
+        if fork:
+            run.get_model()
+        self._context = multiprocessing.get_context('fork' if fork else None)
+        self._lock = threading.Lock()
+        self._executor = self._start()
+
+    def _start(self):
+        executor = ProcessPoolExecutor(self.processes, mp_context=self._context)
+        # a forking pool starts every worker on the first task, do it before
+        # the server threads exist
+        executor.submit(int).result()
+        return executor
+
+    def _restart(self, broken):
+        # requests failing together restart the pool once
+        with self._lock:
+            if self._executor is broken:
+                broken.shutdown(wait=False)
+                self._executor = self._start()
+                self.restarts += 1
+            return self._executor
+
+    def submit(self, messages):
+        """
+        This function queues messages for a worker process
+        OUTPUT:
+        future - concurrent.futures.Future resolving to (labels, probabilities)
+        """
+        executor = self._executor
+        try:
+            return executor.submit(predict_in_worker, list(messages))
+        except BrokenProcessPool:
+            return self._restart(executor).submit(predict_in_worker, list(messages))
+
+    def predict(self, messages):
+        executor = self._executor
+        try:
+            return executor.submit(predict_in_worker, list(messages)).result()
+        except BrokenProcessPool:
+            return self._restart(executor).submit(predict_in_worker, list(messages)).result()
+
+    def shutdown(self):
+        self._executor.shutdown()
+
+
+def error_response(start_response, code, message=None, headers=()):
+    status = HTTPStatus(code)
+    body = json.dumps({'error': message or status.phrase}).encode('utf-8')
+    start_response('{} {}'.format(code, status.phrase),
+                   [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))] + list(headers))
+    return [body]
+
+
+class LimitedResponse(object):
+    """
+    This class passes on the body of a response started within the limits,
+    and frees its slot once the server closes it
+    INPUT:
+    first - bytes - first part of the body, already read to start the response
+    written - list of the parts the app writes through start_response
+    parts - iterator over the other parts
+    result - iterable returned by the app, closed with the response
+    release - function freeing the slot of the request
+    context - contextvars.Context the app started in, e.g. the request
+              context of Flask, the rest of the app runs in it too
+    """
+
+    def __init__(self, first, written, parts, result, release, context):
+        self.first = first
+        self.context = context
+        self.written = written
+        self.parts = parts
+        self.result = result
+        self.release = release
+
+    def __iter__(self):
+        if self.first:
+            yield self.first
+        while True:
+            part = self.context.run(next, self.parts, None)
+            if part is None:
+                break
+            if self.written:
+                yield b''.join(self.written)
+                del self.written[:]
+            yield part
+        if self.written:
+            yield b''.join(self.written)
+
+    def close(self):
+        try:
+            if hasattr(self.result, 'close'):
+                self.context.run(self.result.close)
+        finally:
+            self.release()
+
+
+class RequestLimits(object):
+    """
+    This class wraps a WSGI app so at most max_concurrency requests run it at
+    once. Up to max_queue more wait for a free slot, further ones are
+    answered 503 right away so clients back off instead of piling up. A
+    request whose response has not started within timeout seconds, waiting
+    included, gets a 504; the app keeps its slot until it returns. A started
+    response is passed on as the app produces it, so NDJSON results are not
+    cut off by the timeout.
+    INPUT:
+    app - WSGI app, e.g. the Flask app of run.py
+    max_concurrency - int - requests served at the same time
+    max_queue - int - requests waiting for a slot before new ones are refused
+    timeout - float - seconds until a request without a response is answered 504
+    """
+
+    def __init__(self, app, max_concurrency=32, max_queue=256, timeout=30.0):
+        self.app = app
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.rejected = 0
+        self.timeouts = 0
+        self.waiting = 0
+        self.active = 0
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(max_concurrency)
+        # the app runs in these threads until its response starts, so the
+        # server thread can give up on it after the timeout
+        self._threads = ThreadPoolExecutor(max_concurrency)
+
+    def start_app(self, environ):
+        """
+        This function calls the app up to the first non-empty part of its body
+        OUTPUT:
+        status, headers - given to start_response
+        first - bytes, empty when the body is
+        written - list collecting the later writes of the app
+        parts - iterator over the rest of the body
+        result - iterable returned by the app
+        """
+        response = {}
+        written = []
+
+        def start_response(status, headers, exc_info=None):
+            response['status'], response['headers'] = status, headers
+            return written.append
+
+        result = self.app(environ, start_response)
+        try:
+            parts = iter(result)
+            first = b''
+            for first in parts:
+                if first:
+                    break
+            # what the app wrote through start_response comes first
+            first = b''.join(written) + first
+            del written[:]
+            return response['status'], response['headers'], first, written, parts, result
+        except Exception:
+            if hasattr(result, 'close'):
+                result.close()
+            raise
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+        self._slots.release()
+
+    def abandon(self, context, future):
+        # the request got its 504, free the slot once the app is done
+        try:
+            result = future.result()[-1]
+            if hasattr(result, 'close'):
+                context.run(result.close)
+        except Exception:
+            pass
+        finally:
+            self.release()
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                return error_response(start_response, 503, 'server overloaded, retry later', [('Retry-After', '1')])
+            self.waiting += 1
+        deadline = time.monotonic() + self.timeout
+        try:
+            acquired = self._slots.acquire(timeout=self.timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not acquired:
+            with self._lock:
+                self.timeouts += 1
+            return error_response(start_response, 504)
+
+        with self._lock:
+            self.active += 1
+        context = contextvars.copy_context()
+        future = self._threads.submit(context.run, self.start_app, environ)
+        try:
+            status, headers, first, written, parts, result = future.result(max(deadline - time.monotonic(), 0))
+        except TimeoutError:
+            future.add_done_callback(functools.partial(self.abandon, context))
+            with self._lock:
+                self.timeouts += 1
+            return error_response(start_response, 504)
+        except Exception:
+            self.release()
+            raise
+        start_response(status, headers)
+        return LimitedResponse(first, written, parts, result, self.release, context)
+
+
+def main():
+    # only the server needs waitress, the pool and the limits import without it
+    import waitress
+
+    parser = argparse.ArgumentParser(description='Serves the classifier app with waitress and the model in a '
+                                                 'pool of worker processes.')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=3001)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes running the model (default: one per cpu)')
+    parser.add_argument('--max-concurrency', type=int, default=32,
+                        help='requests served at the same time (default: 32)')
+    parser.add_argument('--max-queue', type=int, default=256,
+                        help='requests waiting for a slot before new ones get a 503 (default: 256)')
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='seconds until a request gets a 504, waiting included (default: 30)')
+    args = parser.parse_args()
+
+    pool = ModelPool(args.workers)
+    run.model_pool = pool
+    run.batcher.workers = args.workers
+
+    app = RequestLimits(run.app, args.max_concurrency, args.max_queue, args.timeout)
+    run.metrics.callback('disaster_serve_rejected_total', 'Requests answered 503 because the queue was full.',
+                         'counter', lambda: app.rejected)
+    run.metrics.callback('disaster_serve_timeouts_total', 'Requests answered 504 after the timeout.',
+                         'counter', lambda: app.timeouts)
+    run.metrics.callback('disaster_serve_waiting_requests', 'Requests waiting for a free slot.',
+                         'gauge', lambda: app.waiting)
+    run.metrics.callback('disaster_serve_active_requests', 'Requests being served.',
+                         'gauge', lambda: app.active)
+
+    # every request waitress accepts reaches the limits: running, waiting
+    # for a slot, or refused by a spare thread
+    threads = args.max_concurrency + args.max_queue + SPARE_THREADS
+    try:
+        waitress.serve(app, host=args.host, port=args.port, threads=threads,
+                       connection_limit=max(threads, 100), max_request_body_size=MAX_BODY_BYTES)
+    finally:
+        pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import json
+
+from sqlalchemy import create_engine
+
+from conftest import CATEGORIES, message_table
+
+
+def test_classify_empty_batch(run):
+    client = run.app.test_client()
+    for payload in ({'messages': []}, []):
+        response = client.post('/classify', data=json.dumps(payload), content_type='application/json')
+        assert response.status_code == 200
+        assert response.get_json() == {'results': []}
+
+
+def test_classify_empty_stream(run):
+    response = run.app.test_client().post('/classify', data=b'\n', content_type='application/x-ndjson')
+    assert response.status_code == 200
+    assert response.get_data() == b''
+
+
+def test_classify_batch(run):
+    response = run.app.test_client().post('/classify', data=json.dumps({'messages': ['need water', 'fire']}),
+                                          content_type='application/json')
+    results = response.get_json()['results']
+    assert [result['message'] for result in results] == ['need water', 'fire']
+    assert set(results[0]['labels']) == set(CATEGORIES)
+
+
+def similar(run, query, k=3):
+    response = run.app.test_client().get('/similar', query_string={'query': query, 'k': k})
+    assert response.status_code == 200
+    return response.get_json()['results']
+
+
+def test_similar_survives_rebuilt_database(run):
+    df = message_table(120)
+    expected = df.set_index('id').loc[7]
+    results = similar(run, expected['message'])
+    assert results[0]['id'] == 7 and results[0]['message'] == expected['message']
+
+    # a rebuild numbers the rows anew, the index must still find id 7
+    engine = create_engine('sqlite:///{}'.format(run.DATABASE_FILEPATH))
+    df.iloc[::-1].to_sql('message_category', engine, index=False, if_exists='replace')
+    results = similar(run, expected['message'])
+    assert results[0]['id'] == 7 and results[0]['message'] == expected['message']
+    assert results[0]['labels'] == [name for name in CATEGORIES if expected[name] == 1]
+    assert len({result['id'] for result in results}) == len(results)
+
+
+def test_similar_rejects_bad_requests(run):
+    client = run.app.test_client()
+    assert client.get('/similar').status_code == 400
+    assert client.get('/similar', query_string={'query': 'water', 'k': 'many'}).status_code == 400
+
+
+def test_classify_stream_answers_messages_before_a_bad_line(run):
+    lines = b'"need water"\n{"message": "fire"}\n{"text": "no message"}\n"never read"\n'
+    response = run.app.test_client().post('/classify', data=lines, content_type='application/x-ndjson')
+    records = [json.loads(line) for line in response.get_data().splitlines()]
+    assert [record.get('message') for record in records[:2]] == ['need water', 'fire']
+    assert 'error' in records[2] and len(records) == 3
@@ -0,0 +1,149 @@
+import json
+import time
+import importlib
+import threading
+
+import numpy as np
+import pytest
+from werkzeug.test import Client, EnvironBuilder
+
+
+@pytest.fixture(scope='module')
+def serve(run):
+    # serve imports run, which must see the settings of the run fixture first
+    return importlib.import_module('serve')
+
+
+def call(app, path='/'):
+    """
+    This function calls a WSGI app like a server would
+    OUTPUT:
+    status - string, or None when the app did not start a response
+    body - list of the parts of the body
+    """
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = status
+
+    result = app(EnvironBuilder(path=path).get_environ(), start_response)
+    try:
+        return response.get('status'), list(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_streamed_response_is_passed_on_as_it_is_produced(serve):
+    release = threading.Event()
+    received = []
+
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'application/x-ndjson')])
+        yield b''
+        yield b'first\n'
+        release.wait(5)
+        yield b'second\n'
+
+    limits = serve.RequestLimits(app, max_concurrency=1, max_queue=1, timeout=5)
+    result = limits(EnvironBuilder().get_environ(), lambda status, headers: received.append(status))
+    parts = iter(result)
+    assert received == ['200 OK'] and next(parts) == b'first\n'
+    # the server has the first line while the app still works on the next
+    assert not release.is_set() and limits.active == 1
+    release.set()
+    assert list(parts) == [b'second\n']
+    result.close()
+    assert limits.active == 0
+
+
+def test_parts_written_through_start_response_are_kept(serve):
+    def app(environ, start_response):
+        write = start_response('200 OK', [])
+        write(b'a')
+        yield b'b'
+        write(b'c')
+        yield b'd'
+        write(b'e')
+
+    limits = serve.RequestLimits(app, timeout=5)
+    assert call(limits) == ('200 OK', [b'ab', b'c', b'd', b'e'])
+
+
+def test_full_queue_is_answered_503(serve):
+    release = threading.Event()
+
+    def app(environ, start_response):
+        release.wait(5)
+        start_response('200 OK', [])
+        return [b'done']
+
+    limits = serve.RequestLimits(app, max_concurrency=1, max_queue=1, timeout=5)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(call(limits))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    wait_until(lambda: limits.active == 1 and limits.waiting == 1)
+    status, body = call(limits)
+    assert status.startswith('503') and limits.rejected == 1
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == [('200 OK', [b'done'])] * 2
+
+
+def test_slow_response_is_answered_504_and_keeps_its_slot(serve):
+    release = threading.Event()
+    closed = []
+
+    class Body(list):
+        def close(self):
+            closed.append(True)
+
+    def app(environ, start_response):
+        release.wait(5)
+        start_response('200 OK', [])
+        return Body([b'late'])
+
+    limits = serve.RequestLimits(app, max_concurrency=1, max_queue=1, timeout=0.2)
+    status, body = call(limits)
+    assert status.startswith('504') and limits.timeouts == 1
+    # the app still runs, the next request waits for its slot and times out too
+    assert limits.active == 1
+    assert call(limits)[0].startswith('504') and limits.timeouts == 2
+    release.set()
+    wait_until(lambda: limits.active == 0)
+    assert closed == [True]
+
+
+def test_ndjson_upload_is_classified_line_by_line(run, serve):
+    lines = b'{"message": "need water"}\n{"message": "fire"}\n'
+    limits = serve.RequestLimits(run.app, max_concurrency=2, max_queue=2, timeout=30)
+    response = Client(limits).post('/classify', data=lines, content_type='application/x-ndjson')
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.get_data().splitlines()]
+    assert [result['message'] for result in results] == ['need water', 'fire']
+    # servers close the response once it is sent, which frees the slot
+    response.close()
+    assert limits.active == 0
+
+
+def test_model_pool_recovers_from_a_dead_worker(serve):
+    pool = serve.ModelPool(1)
+    try:
+        labels, _ = pool.predict(['need water'])
+        for process in list(pool._executor._processes.values()):
+            process.kill()
+        again, _ = pool.predict(['need water'])
+        assert np.array_equal(labels, again) and pool.restarts == 1
+        assert np.array_equal(pool.submit(['need water']).result()[0], labels)
+    finally:
+        pool.shutdown()
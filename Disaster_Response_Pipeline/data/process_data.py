@@ -1,8 +1,10 @@
 # import libraries
 import sys
+import argparse
+from itertools import zip_longest
 import pandas as pd
 import numpy as np
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 
 
 def load_data(messages_filepath, categories_filepath):
@@ -25,6 +27,61 @@ def load_data(messages_filepath, categories_filepath):
     
     return df
 
+def parse_categories(categories, category_colnames=None):
+    """
+    This function splits the categories column into one binary column per
+    category using vectorized operations
+    INPUT:
+    categories - Series of strings like 'related-1;request-0;...'
+    category_colnames - list of category names, read from the first row if None
+    OUTPUT:
+    Dataframe with one 0/1 uint8 column per category
+    """
+    # use the first row to extract a list of new column names for categories
+    fields = categories.iloc[0].split(';')
+    if category_colnames is None:
+        category_colnames = [item[:-2] for item in fields]
+
+    values = parse_fixed_layout(categories, fields)
+    if values is None:
+        # keep only the value after each '-' and split the values into columns
+        values = categories.str.replace(r'[^;]*-', '', regex=True).str.split(';', expand=True)
+        values = values.astype(np.int64).values
+
+    # convert category values to binary (0 or 1)
+    values = pd.DataFrame(values, columns=category_colnames, index=categories.index)
+    return values.clip(upper=1).astype(np.uint8)
+
+def parse_fixed_layout(categories, fields):
+    """
+    This function reads the category values straight from the bytes of the
+    strings when every row has the same layout as the first one, which is
+    the case for the Figure Eight export where every value is a single digit
+    INPUT:
+    categories - Series of category strings
+    fields - the first row split on ';'
+    OUTPUT:
+    int64 array of values, or None when the rows do not share one layout
+    """
+    width = len(categories.iloc[0])
+    try:
+        raw = ''.join(categories.tolist()).encode('ascii')
+    except (TypeError, UnicodeEncodeError):
+        return None
+    if len(raw) != width * len(categories):
+        return None
+    matrix = np.frombuffer(raw, dtype=np.uint8).reshape(len(categories), width)
+
+    # every field ends with its value, the rest of the row must match row one
+    digit_positions = np.cumsum([len(field) + 1 for field in fields]) - 2
+    text_positions = np.setdiff1d(np.arange(width), digit_positions)
+    if not (matrix[:, text_positions] == matrix[0, text_positions]).all():
+        return None
+    digits = matrix[:, digit_positions].astype(np.int64) - ord('0')
+    if digits.min() < 0 or digits.max() > 9:
+        return None
+    return digits
+
 def clean_data(df):
     """
     This function takes a dataframe, splits categories column on its        values to become separate column and converts them into binary.
@@ -33,28 +90,8 @@ def clean_data(df):
     OUTPUT:
         Cleaned dataframe
     """
-    # create a dataframe of the 36 individual category columns
-    categories = df['categories'].str.split(';',expand=True)
-
-    # select the first row of the categories dataframe
-    row = categories.iloc[0]
-    
-    # use this row to extract a list of new column names for            categories.
-    # one way is to apply a lambda function that takes everything 
-    # up to the second to last character of each string with slicing
-    category_colnames = row.apply(lambda x: x[:-2]).values
-    
-    # rename the columns of `categories`
-    categories.columns = category_colnames
-    
-    # convert categroy values to binary (0 or 1)
-    for column in categories:
-        # set each value to be the last character of the string
-        categories[column] = categories[column].str[-1]
-    
-        # convert column from string to numeric
-        categories[column] = pd.to_numeric(categories[column])
-        categories[column] = categories[column].apply(lambda x: 1 if x > 1 else x)
+    # create a dataframe of the 36 individual binary category columns
+    categories = parse_categories(df['categories'])
     
     # drop the original categories column from `df`
     df.drop('categories',axis=1,inplace=True)   
@@ -65,6 +102,20 @@ def clean_data(df):
     # drop duplicates
     df.drop_duplicates(inplace=True)
     
+    return downcast(df)
+
+def downcast(df):
+    """
+    This function shrinks the columns of a cleaned dataframe in memory: the
+    ids to the smallest integer type holding them and the three genres to a
+    categorical. The category columns are uint8 already.
+    INPUT:
+    df - cleaned dataframe
+    OUTPUT:
+    df - the same rows and values with smaller dtypes
+    """
+    df['id'] = pd.to_numeric(df['id'], downcast='integer')
+    df['genre'] = df['genre'].astype('category')
     return df
     
 def save_data(df, database_filename):
@@ -78,31 +129,331 @@ def save_data(df, database_filename):
     #save the clean dataset into an sqlite database
     engine = create_engine('sqlite:///{}'.format(database_filename))
     df.to_sql('message_category', engine, index=False, if_exists='replace')
+    drop_ingest_state(engine)
+    create_indexes(engine)
 
-def main():
-    if len(sys.argv) == 4:
+def drop_ingest_state(engine):
+    """
+    This function forgets the rows recorded by incremental runs. A rebuilt
+    message_category numbers its rows anew, so the recorded rowids would
+    point at other messages; the next incremental run records them again.
+    """
+    with engine.begin() as connection:
+        connection.execute(text('DROP TABLE IF EXISTS ingest_state'))
+
+def create_indexes(engine):
+    """
+    This function adds the indexes on the columns the web app and the
+    trainer query message_category by
+    """
+    with engine.begin() as connection:
+        connection.execute(text('CREATE INDEX IF NOT EXISTS ix_message_category_id ON message_category (id)'))
+        connection.execute(text('CREATE INDEX IF NOT EXISTS ix_message_category_genre ON message_category (genre)'))
 
-        messages_filepath, categories_filepath, database_filepath = sys.argv[1:]
+def ids_sorted(filepath, chunksize):
+    """
+    This function tells whether the ids of a csv file never decrease, within
+    and across chunks, reading only the id column
+    """
+    last = None
+    for chunk in pd.read_csv(filepath, usecols=['id'], chunksize=chunksize):
+        ids = chunk['id'].values
+        if not len(ids):
+            continue
+        if (last is not None and ids[0] < last) or (np.diff(ids) < 0).any():
+            return False
+        last = ids[-1]
+    return True
 
-        print('Loading data...\n    MESSAGES: {}\n    CATEGORIES: {}'
-              .format(messages_filepath, categories_filepath))
+def load_data_chunks(messages_filepath, categories_filepath, chunksize):
+    """
+    This function reads both csv files in fixed-size chunks and yields the
+    merged rows of each chunk. The files must be ordered by id, as the Figure
+    Eight export is: rows holding the last id read so far are kept back until
+    the next chunk, so repeated ids are merged together, and rows whose id has
+    not appeared in the other file yet are carried over as well. Files out of
+    order are merged in memory like load_data instead, before any chunk is
+    yielded, and the merged rows are yielded in chunks.
+    INPUT:
+    messages_filepath: path for the messages.csv file
+    categories_filepath: path for the categories.csv file
+    chunksize: number of rows read from each file at a time
+    OUTPUT:
+    generator of merged dataframes
+    """
+    if not (ids_sorted(messages_filepath, chunksize) and ids_sorted(categories_filepath, chunksize)):
+        print('    the csv files are not sorted by id, merging them in memory')
         df = load_data(messages_filepath, categories_filepath)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+        return
+
+    messages_chunks = pd.read_csv(messages_filepath, chunksize=chunksize)
+    categories_chunks = pd.read_csv(categories_filepath, chunksize=chunksize)
+
+    messages, categories = None, None
+    for messages_chunk, categories_chunk in zip_longest(messages_chunks, categories_chunks):
+        messages = pd.concat([messages, messages_chunk])
+        categories = pd.concat([categories, categories_chunk])
+
+        # ids below the last id read from each file are complete
+        boundary = min(chunk['id'].iloc[-1] for chunk in (messages_chunk, categories_chunk)
+                       if chunk is not None and len(chunk))
+        ready_messages = messages['id'] < boundary
+        ready_categories = categories['id'] < boundary
+        yield messages[ready_messages].merge(categories[ready_categories], on='id')
+
+        # keep the rows still waiting for their counterpart
+        matched_messages = ready_messages & messages['id'].isin(categories.loc[ready_categories, 'id'])
+        matched_categories = ready_categories & categories['id'].isin(messages.loc[ready_messages, 'id'])
+        messages, categories = messages[~matched_messages], categories[~matched_categories]
+
+    # rows holding the last ids of the files
+    if messages is not None and categories is not None:
+        yield messages.merge(categories, on='id')
+
+def insert_many(table, connection, keys, data_iter):
+    """
+    This function is a to_sql insertion method that hands all rows of a chunk
+    to the sqlite driver in one executemany call, skipping the per-row
+    parameter processing of SQLAlchemy
+    """
+    sql = 'INSERT INTO "{}" ({}) VALUES ({})'.format(
+        table.name, ', '.join('"{}"'.format(key) for key in keys), ', '.join('?' * len(keys)))
+    cursor = connection.connection.cursor()
+    try:
+        cursor.executemany(sql, data_iter)
+    finally:
+        cursor.close()
+
+def sorted_contains(sorted_values, values):
+    """
+    This function tells for every element of values whether it is in the
+    sorted array sorted_values
+    """
+    if len(sorted_values) == 0:
+        return np.zeros(len(values), dtype=bool)
+    positions = np.searchsorted(sorted_values, values)
+    return sorted_values[np.minimum(positions, len(sorted_values) - 1)] == values
 
-        print('Cleaning data...')
-        df = clean_data(df)
-        
-        print('Saving data...\n    DATABASE: {}'.format(database_filepath))
-        save_data(df, database_filepath)
-        
-        print('Cleaned data saved to database!')
+def sorted_insert(sorted_values, values):
+    """
+    This function returns sorted_values with the new values inserted at their
+    sorted positions
+    """
+    values = np.sort(values)
+    return np.insert(sorted_values, np.searchsorted(sorted_values, values), values)
+
+def drop_seen_rows(df, seen):
+    """
+    This function removes rows of a chunk that are duplicates, either within
+    the chunk or of rows kept from earlier chunks
+    INPUT:
+    df - cleaned dataframe chunk
+    seen - sorted uint64 array of the hashes of rows already kept
+    OUTPUT:
+    df - dataframe without duplicate rows
+    seen - updated sorted array of hashes
+    hashes - uint64 hashes of the rows kept from df
+    """
+    # 8 bytes per kept row instead of holding earlier chunks in memory
+    hashes = pd.util.hash_pandas_object(df, index=False).values
+    keep = ~pd.Series(hashes).duplicated().values & ~sorted_contains(seen, hashes)
+    return df[keep], sorted_insert(seen, hashes[keep]), hashes[keep]
+
+def clean_chunk(df, category_colnames):
+    """
+    This function splits the categories column of a merged chunk into binary
+    columns named after category_colnames, or after its first row if None
+    """
+    categories = parse_categories(df['categories'], category_colnames)
+    df = df.drop('categories', axis=1)
+    # a chunk whose text column is all missing would otherwise be read as
+    # float and hash differently from the same rows in another chunk
+    text_columns = [col for col in df.columns if col != 'id']
+    df[text_columns] = df[text_columns].astype(object)
+    return pd.concat([df, categories], axis=1)
+
+def process_data_chunked(messages_filepath, categories_filepath, database_filename, chunksize=10000):
+    """
+    This function runs the ETL pipeline chunk by chunk so memory stays flat
+    however large the csv files are. Every chunk is cleaned with vectorized
+    category parsing, deduplicated against the rows already saved and
+    appended to the database in a single transaction.
+    INPUT:
+    messages_filepath: path for the messages.csv file
+    categories_filepath: path for the categories.csv file
+    database_filename - string of the filename for saving the data
+    chunksize - number of rows read from each file at a time
+    OUTPUT:
+    n_rows - number of rows saved to the database
+    """
+    engine = create_engine('sqlite:///{}'.format(database_filename))
+    category_colnames = None
+    seen = np.array([], dtype=np.uint64)
+    n_rows = 0
+    if_exists = 'replace'
+    for df in load_data_chunks(messages_filepath, categories_filepath, chunksize):
+        if df.empty:
+            continue
+        # the first chunk fixes the category names for the following ones
+        df = clean_chunk(df, category_colnames)
+        category_colnames = list(df.columns[4:])
+
+        df, seen, _ = drop_seen_rows(df, seen)
+
+        # bulk insert the whole chunk in one transaction
+        with engine.begin() as connection:
+            df.to_sql('message_category', connection, index=False, if_exists=if_exists,
+                      method=insert_many)
+        if_exists = 'append'
+        n_rows += len(df)
+    drop_ingest_state(engine)
+    create_indexes(engine)
+    return n_rows
+
+def load_ingest_state(engine):
+    """
+    This function reads what earlier incremental runs stored in the
+    ingest_state table: the rowid in message_category, message id and
+    content hash of every ingested row
+    OUTPUT:
+    state - dataframe with row_id, id and row_hash columns, None when the
+            database has not been built incrementally yet or message_category
+            was written since without updating the state
+    """
+    tables = inspect(engine)
+    if not tables.has_table('ingest_state') or not tables.has_table('message_category'):
+        return None
+    with engine.connect() as connection:
+        recorded = connection.execute(text('SELECT count(*), max(row_id) FROM ingest_state')).one()
+        stored = connection.execute(text('SELECT count(*), max(rowid) FROM message_category')).one()
+    if tuple(recorded) != tuple(stored):
+        return None
+    state = pd.read_sql_query('SELECT row_id, id, row_hash FROM ingest_state', engine)
+    state['row_hash'] = state['row_hash'].values.astype(np.int64).view(np.uint64)
+    return state
+
+def ingest_incremental(messages_filepath, categories_filepath, database_filename, chunksize=10000):
+    """
+    This function upserts the csv files into the database instead of
+    rebuilding it. Rows whose content hash was ingested before are skipped,
+    new rows are appended, and earlier rows of a message id are deleted when
+    that id comes back with different content. A database that was not built
+    incrementally, or was rebuilt since, is rebuilt once to record the hashes.
+    INPUT:
+    messages_filepath: path for the messages.csv file
+    categories_filepath: path for the categories.csv file
+    database_filename - string of the filename for saving the data
+    chunksize - number of rows read from each file at a time
+    OUTPUT:
+    counts - dict with the number of inserted, unchanged and deleted rows
+    """
+    engine = create_engine('sqlite:///{}'.format(database_filename))
+    state = load_ingest_state(engine)
+    if state is None:
+        state = pd.DataFrame({'row_id': np.array([], dtype=np.int64), 'id': np.array([], dtype=np.int64),
+                              'row_hash': np.array([], dtype=np.uint64)})
+        with engine.begin() as connection:
+            connection.execute(text('DROP TABLE IF EXISTS message_category'))
+            connection.execute(text('DROP TABLE IF EXISTS ingest_state'))
+            connection.execute(text('CREATE TABLE ingest_state (row_id INTEGER PRIMARY KEY, id INTEGER, row_hash INTEGER)'))
+            connection.execute(text('CREATE INDEX IF NOT EXISTS ix_ingest_state_id ON ingest_state (id)'))
+    known_hashes = np.sort(state['row_hash'].values)
+
+    category_colnames = None
+    seen = np.array([], dtype=np.uint64)
+    seen_ids = np.array([], dtype=np.int64)
+    counts = {'inserted': 0, 'unchanged': 0, 'deleted': 0}
+    for df in load_data_chunks(messages_filepath, categories_filepath, chunksize):
+        if df.empty:
+            continue
+        df = clean_chunk(df, category_colnames)
+        category_colnames = list(df.columns[4:])
+        df, seen, hashes = drop_seen_rows(df, seen)
+        seen_ids = np.union1d(seen_ids, df['id'].values)
+
+        # rows stored by an earlier run are left as they are
+        new = ~sorted_contains(known_hashes, hashes)
+        counts['unchanged'] += int((~new).sum())
+        df, hashes = df[new], hashes[new]
+        if df.empty:
+            continue
+
+        with engine.begin() as connection:
+            has_rows = inspect(connection).has_table('message_category')
+            last_rowid = connection.execute(text('SELECT max(rowid) FROM message_category')).scalar() if has_rows else None
+            df.to_sql('message_category', connection, index=False, if_exists='append', method=insert_many)
+            # rows appended by one executemany get consecutive rowids
+            row_ids = np.arange(len(df)) + (last_rowid or 0) + 1
+            records = zip(row_ids.tolist(), df['id'].tolist(), hashes.view(np.int64).tolist())
+            connection.connection.cursor().executemany(
+                'INSERT INTO ingest_state (row_id, id, row_hash) VALUES (?, ?, ?)', records)
+        counts['inserted'] += len(df)
+
+    # earlier rows of the ids seen in this run whose content is gone are stale
+    stale = state[sorted_contains(seen_ids, state['id'].values) & ~sorted_contains(seen, state['row_hash'].values)]
+    if len(stale):
+        with engine.begin() as connection:
+            cursor = connection.connection.cursor()
+            rows = [(row_id,) for row_id in stale['row_id'].tolist()]
+            cursor.executemany('DELETE FROM message_category WHERE rowid = ?', rows)
+            cursor.executemany('DELETE FROM ingest_state WHERE row_id = ?', rows)
+        counts['deleted'] = len(stale)
+    if inspect(engine).has_table('message_category'):
+        create_indexes(engine)
+    return counts
+
+def parse_args(argv):
+    """
+    This function parses the command line arguments of the script
+    """
+    parser = argparse.ArgumentParser(
+        description='Clean the disaster messages and categories and save them to a sqlite database.',
+        epilog='Example: python process_data.py disaster_messages.csv disaster_categories.csv DisasterResponse.db')
+    parser.add_argument('messages_filepath', help='filepath of the messages dataset')
+    parser.add_argument('categories_filepath', help='filepath of the categories dataset')
+    parser.add_argument('database_filepath', help='filepath of the database to save the cleaned data to')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='stream the csv files in chunks of this many rows to keep memory flat')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only insert new or changed rows instead of rebuilding the database')
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    messages_filepath, categories_filepath = args.messages_filepath, args.categories_filepath
+    database_filepath = args.database_filepath
+
+    if args.incremental:
+        print('Ingesting new and changed rows...\n    MESSAGES: {}\n    CATEGORIES: {}\n    DATABASE: {}'
+              .format(messages_filepath, categories_filepath, database_filepath))
+        counts = ingest_incremental(messages_filepath, categories_filepath,
+                                    database_filepath, args.chunksize or 10000)
+        print('Database updated! ({inserted} rows inserted, {unchanged} unchanged, {deleted} deleted)'
+              .format(**counts))
+        return
+
+    if args.chunksize:
+        print('Processing data in chunks of {} rows...\n    MESSAGES: {}\n    CATEGORIES: {}\n    DATABASE: {}'
+              .format(args.chunksize, messages_filepath, categories_filepath, database_filepath))
+        n_rows = process_data_chunked(messages_filepath, categories_filepath,
+                                      database_filepath, args.chunksize)
+        print('Cleaned data saved to database! ({} rows)'.format(n_rows))
+        return
+
+    print('Loading data...\n    MESSAGES: {}\n    CATEGORIES: {}'
+          .format(messages_filepath, categories_filepath))
+    df = load_data(messages_filepath, categories_filepath)
+
+    print('Cleaning data...')
+    df = clean_data(df)
+    
+    print('Saving data...\n    DATABASE: {}'.format(database_filepath))
+    save_data(df, database_filepath)
     
-    else:
-        print('Please provide the filepaths of the messages and categories '\
-              'datasets as the first and second argument respectively, as '\
-              'well as the filepath of the database to save the cleaned data '\
-              'to as the third argument. \n\nExample: python process_data.py '\
-              'disaster_messages.csv disaster_categories.csv '\
-              'DisasterResponse.db')
+    print('Cleaned data saved to database!')
 
 
 if __name__ == '__main__':
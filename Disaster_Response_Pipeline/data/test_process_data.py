@@ -0,0 +1,135 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, inspect
+
+import process_data
+
+CATEGORIES = ['related', 'request', 'offer']
+
+
+def write_csvs(directory, ids, name='', text='message {}'):
+    """
+    This function writes a messages and a categories csv file in the layout
+    of the Figure Eight export, one message per id
+    """
+    messages = pd.DataFrame({'id': ids, 'message': [text.format(i) for i in ids],
+                             'original': ['original {}'.format(i) if i % 3 else None for i in ids],
+                             'genre': ['direct'] * len(ids)})
+    categories = pd.DataFrame({'id': ids, 'categories': [
+        ';'.join('{}-{}'.format(col, (i >> k) & 1) for k, col in enumerate(CATEGORIES)) for i in ids]})
+    messages_filepath = str(directory / '{}messages.csv'.format(name))
+    categories_filepath = str(directory / '{}categories.csv'.format(name))
+    messages.to_csv(messages_filepath, index=False)
+    categories.to_csv(categories_filepath, index=False)
+    return messages_filepath, categories_filepath
+
+
+def read_table(database_filepath):
+    engine = create_engine('sqlite:///{}'.format(database_filepath))
+    return pd.read_sql_table('message_category', engine)
+
+
+@pytest.mark.parametrize('rebuild', ['plain', 'chunked'])
+def test_incremental_after_rebuild_keeps_every_message_once(tmp_path, rebuild):
+    database_filepath = str(tmp_path / 'messages.db')
+    ids = list(range(1, 51))
+    ordered = write_csvs(tmp_path, ids)
+    process_data.ingest_incremental(*ordered, database_filepath, chunksize=7)
+
+    # a rebuild from the same rows in another order numbers the rows anew
+    reordered = write_csvs(tmp_path, ids[::-1], name='reordered_')
+    if rebuild == 'plain':
+        df = process_data.clean_data(process_data.load_data(*reordered))
+        process_data.save_data(df, database_filepath)
+    else:
+        process_data.process_data_chunked(*ordered, database_filepath, chunksize=7)
+
+    # the first four messages change, their earlier rows must be replaced
+    changed = write_csvs(tmp_path, ids, name='changed_', text='message {} edited')
+    df = pd.read_csv(changed[0])
+    df.loc[4:, 'message'] = ['message {}'.format(i) for i in ids[4:]]
+    df.to_csv(changed[0], index=False)
+    process_data.ingest_incremental(*changed, database_filepath, chunksize=7)
+
+    table = read_table(database_filepath)
+    assert sorted(table['id']) == ids
+    edited = table.set_index('id')['message']
+    assert edited[1] == 'message 1 edited' and edited[5] == 'message 5'
+
+
+def test_incremental_ingest_is_idempotent(tmp_path):
+    database_filepath = str(tmp_path / 'messages.db')
+    ordered = write_csvs(tmp_path, list(range(1, 21)))
+    first = process_data.ingest_incremental(*ordered, database_filepath, chunksize=6)
+    second = process_data.ingest_incremental(*ordered, database_filepath, chunksize=6)
+    assert first['inserted'] == 20
+    assert second == {'inserted': 0, 'unchanged': 20, 'deleted': 0}
+    assert len(read_table(database_filepath)) == 20
+
+
+def test_saved_database_holds_only_the_message_table(tmp_path):
+    database_filepath = str(tmp_path / 'messages.db')
+    df = process_data.clean_data(process_data.load_data(*write_csvs(tmp_path, list(range(1, 11)))))
+    assert (df[CATEGORIES].dtypes == 'uint8').all()
+    process_data.save_data(df, database_filepath)
+    engine = create_engine('sqlite:///{}'.format(database_filepath))
+    assert inspect(engine).get_table_names() == ['message_category']
+
+
+def test_chunked_etl_matches_the_plain_one(tmp_path):
+    # duplicated rows fall into other chunks than their first copy
+    ids = list(range(1, 31)) + [3, 17, 29, 3]
+    filepaths = write_csvs(tmp_path, ids)
+    plain_filepath, chunked_filepath = str(tmp_path / 'plain.db'), str(tmp_path / 'chunked.db')
+    process_data.save_data(process_data.clean_data(process_data.load_data(*filepaths)), plain_filepath)
+    n_rows = process_data.process_data_chunked(*filepaths, chunked_filepath, chunksize=8)
+    plain, chunked = read_table(plain_filepath), read_table(chunked_filepath)
+    assert n_rows == len(plain) == 30
+    pd.testing.assert_frame_equal(chunked, plain)
+
+
+def shuffle_csv(filepath, seed):
+    df = pd.read_csv(filepath)
+    df.sample(frac=1, random_state=seed).to_csv(filepath, index=False)
+
+
+@pytest.mark.parametrize('shuffled', ['messages', 'categories', 'both'])
+def test_chunked_etl_handles_unsorted_files(tmp_path, shuffled):
+    messages_filepath, categories_filepath = write_csvs(tmp_path, list(range(1, 61)))
+    # as in the Figure Eight export, some ids have two category rows
+    categories = pd.read_csv(categories_filepath)
+    extra = categories[categories['id'].isin([7, 42])].assign(categories=lambda df: df['categories'].str.replace(
+        'related-0', 'related-2').str.replace('related-1', 'related-0').str.replace('related-2', 'related-1'))
+    categories = pd.concat([categories, extra]).sort_values('id', kind='stable')
+    categories.to_csv(categories_filepath, index=False)
+    # and two messages, the plain merge keeps every pair of them
+    messages = pd.read_csv(messages_filepath)
+    again = messages[messages['id'].isin([7, 42])].assign(message=lambda df: df['message'] + ' again')
+    pd.concat([messages, again]).sort_values('id', kind='stable').to_csv(messages_filepath, index=False)
+    if shuffled in ('messages', 'both'):
+        shuffle_csv(messages_filepath, 0)
+    if shuffled in ('categories', 'both'):
+        shuffle_csv(categories_filepath, 1)
+    plain_filepath = str(tmp_path / 'plain.db')
+    process_data.save_data(process_data.clean_data(process_data.load_data(messages_filepath, categories_filepath)),
+                           plain_filepath)
+    plain = read_table(plain_filepath).sort_values(['id', 'message', 'related']).reset_index(drop=True)
+    assert len(plain) == 66
+
+    chunked_filepath = str(tmp_path / 'chunked.db')
+    assert process_data.process_data_chunked(messages_filepath, categories_filepath, chunked_filepath,
+                                             chunksize=8) == 66
+    chunked = read_table(chunked_filepath).sort_values(['id', 'message', 'related']).reset_index(drop=True)
+    pd.testing.assert_frame_equal(chunked, plain)
+
+    incremental_filepath = str(tmp_path / 'incremental.db')
+    process_data.ingest_incremental(messages_filepath, categories_filepath, incremental_filepath, chunksize=8)
+    incremental = read_table(incremental_filepath)
+    assert sorted(incremental['id']) == sorted(plain['id'])
+
+
+def test_ids_sorted_looks_across_chunks(tmp_path):
+    messages_filepath, _ = write_csvs(tmp_path, [1, 2, 3, 4, 5, 3, 6])
+    assert not process_data.ids_sorted(messages_filepath, chunksize=5)
+    sorted_filepath, _ = write_csvs(tmp_path, [1, 2, 2, 3, 4, 5, 5, 6], name='sorted_')
+    assert process_data.ids_sorted(sorted_filepath, chunksize=3)
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.metrics import classification_report, precision_recall_curve, precision_recall_fscore_support
+
+from model_io import DEFAULT_THRESHOLD, apply_thresholds
+
+
+def category_curve(y_true, proba):
+    """
+    This function computes the precision, recall and F1 score of one
+    category at every distinct probability taken as the decision threshold
+    INPUT:
+    y_true - 0/1 array of the true labels of the category
+    proba - float array of the predicted probabilities of the category
+    OUTPUT:
+    curve - dict of the arrays thresholds, precision, recall and f1, all of
+            the same length, thresholds ascending
+    """
+    precision, recall, thresholds = precision_recall_curve(y_true, proba)
+    # the last point of the curve (precision 1, recall 0) has no threshold
+    precision, recall = precision[:-1], recall[:-1]
+    total = precision + recall
+    f1 = np.divide(2 * precision * recall, total, out=np.zeros_like(total), where=total > 0)
+    return {'thresholds': thresholds, 'precision': precision, 'recall': recall, 'f1': f1}
+
+
+def tune_category(y_true, proba):
+    """
+    This function picks the decision threshold of one category maximizing
+    its F1 score, the highest one among ties so fewer messages are flagged.
+    A threshold flagging every message, or one no more precise than the
+    share of positive messages, is no better than guessing and is skipped,
+    although its F1 can be the highest for a frequent category.
+    OUTPUT:
+    curve - dict returned by category_curve, None without positive labels
+    threshold - float, DEFAULT_THRESHOLD when no threshold is left that
+                beats an F1 of 0
+    """
+    if not np.any(y_true):
+        return None, DEFAULT_THRESHOLD
+    curve = category_curve(y_true, proba)
+    informative = (curve['thresholds'] > np.min(proba)) & (curve['precision'] > np.mean(y_true))
+    f1 = np.where(informative, curve['f1'], 0)
+    if f1.max() <= 0:
+        return curve, DEFAULT_THRESHOLD
+    best = len(f1) - 1 - np.argmax(f1[::-1])
+    return curve, float(curve['thresholds'][best])
+
+
+def tune_thresholds(Y_true, probabilities, n_jobs=1):
+    """
+    This function tunes the decision threshold of every category for F1,
+    the categories in parallel
+    INPUT:
+    Y_true - 0/1 array of shape (n_messages, n_categories)
+    probabilities - float array of shape (n_messages, n_categories)
+    n_jobs - int - worker threads, -1 uses every core
+    OUTPUT:
+    thresholds - float array, one per category
+    curves - list of the precision, recall and F1 curves of the categories
+    """
+    # threads share the probabilities instead of copying them, sorting and
+    # cumulative sums release the GIL
+    results = Parallel(n_jobs=n_jobs, prefer='threads')(
+        delayed(tune_category)(Y_true[:, i], probabilities[:, i]) for i in range(probabilities.shape[1]))
+    return np.array([threshold for _, threshold in results]), [curve for curve, _ in results]
+
+
+def threshold_summary(Y_true, probabilities, thresholds, category_names):
+    """
+    This function compares the precision, recall and F1 score of every
+    category at the default and at the tuned thresholds
+    OUTPUT:
+    summary - dataframe with one row per category
+    """
+    default = precision_recall_fscore_support(
+        Y_true, apply_thresholds(probabilities, np.full(len(thresholds), DEFAULT_THRESHOLD)), zero_division=0)
+    tuned = precision_recall_fscore_support(Y_true, apply_thresholds(probabilities, thresholds), zero_division=0)
+    return pd.DataFrame({
+        'threshold': thresholds,
+        'precision': default[0], 'recall': default[1], 'f1': default[2],
+        'tuned precision': tuned[0], 'tuned recall': tuned[1], 'tuned f1': tuned[2],
+        'support': default[3]
+    }, index=list(category_names)).round(3)
+
+
+def holdout_halves(n_rows, random_state=0):
+    """
+    This function splits the rows of a hold-out set into two random halves,
+    one to tune the thresholds on and one to report them on
+    """
+    rows = np.random.RandomState(random_state).permutation(n_rows)
+    return np.sort(rows[:n_rows // 2]), np.sort(rows[n_rows // 2:])
+
+
+def evaluate_probabilities(Y_true, probabilities, category_names, tune=False, n_jobs=1):
+    """
+    This function prints the classification report of predicted
+    probabilities at the default threshold. With tune it also tunes the
+    thresholds on one half of the rows and reports both on the other half,
+    so the tuned scores are not measured on the rows they were tuned on.
+    All of it reuses the probabilities, the model is not called again.
+    INPUT:
+    Y_true - 0/1 array of shape (n_messages, n_categories)
+    probabilities - float array of shape (n_messages, n_categories)
+    category_names - labels of categories or output labels
+    tune - bool - tune per category thresholds
+    n_jobs - int - worker threads tuning the categories
+    OUTPUT:
+    thresholds - float array, one per category, None unless tune
+    """
+    Y_true = np.asarray(Y_true)
+    Y_pred = apply_thresholds(probabilities, np.full(probabilities.shape[1], DEFAULT_THRESHOLD))
+    if not tune:
+        print(classification_report(Y_true,Y_pred,target_names=category_names))
+        return None
+
+    tune_rows, report_rows = holdout_halves(len(Y_true))
+    thresholds, _ = tune_thresholds(Y_true[tune_rows], probabilities[tune_rows], n_jobs)
+    print('Default thresholds ({} messages):'.format(len(report_rows)))
+    print(classification_report(Y_true[report_rows],Y_pred[report_rows],target_names=category_names))
+    print('Tuned thresholds ({} messages):'.format(len(report_rows)))
+    print(classification_report(Y_true[report_rows],apply_thresholds(probabilities[report_rows], thresholds),
+                                target_names=category_names))
+    print(threshold_summary(Y_true[report_rows], probabilities[report_rows], thresholds, category_names).to_string())
+    return thresholds
@@ -0,0 +1,220 @@
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+
+def text_length_extractor(arr):
+    """
+    This function returns len of the text in an array
+    INPUT:
+    data - list of text
+    OUTPUT:
+    array of lens
+    """
+    return np.fromiter(map(len, arr), dtype=np.int64, count=len(arr)).reshape(-1,1)
+
+
+def log_text_length_extractor(arr):
+    """
+    This function returns log(1 + len) of the text in an array, a scale
+    linear models can use next to TF-IDF values
+    INPUT:
+    data - list of text
+    OUTPUT:
+    array of log lens
+    """
+    return np.log1p(text_length_extractor(arr))
+
+
+def pretokenized(tokens):
+    """
+    This function is the tokenizer and preprocessor of the vectorizers fed by
+    MessageTokenizer, whose documents are token lists already
+    """
+    return tokens
+
+
+def tokenized_length_extractor(messages):
+    """
+    This function returns the length of the raw text of tokenized messages,
+    the feature text_length_extractor computes from the text
+    INPUT:
+    messages - TokenizedMessages
+    OUTPUT:
+    array of lens
+    """
+    return messages.lengths.reshape(-1,1)
+
+
+class TokenizedMessages(object):
+    """
+    This class holds the tokens of a list of messages together with the
+    length of each raw text. Vectorizers iterate it like a list of documents.
+    INPUT:
+    tokens - list of token lists, one per message
+    lengths - int array of the number of characters of each message
+    """
+
+    def __init__(self, tokens, lengths):
+        self.tokens = tokens
+        self.lengths = lengths
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __iter__(self):
+        return iter(self.tokens)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return TokenizedMessages(self.tokens[item], self.lengths[item])
+        return self.tokens[item]
+
+
+def tokenize_messages(tokenizer, messages):
+    return [tokenizer(text) for text in messages]
+
+
+class MessageTokenizer(BaseEstimator, TransformerMixin):
+    """
+    This class tokenizes messages once for every feature that follows it, so
+    n-gram counts, lengths and any later features share one pass of the
+    tokenizer. Large inputs are split into chunks tokenized by n_jobs worker
+    processes.
+    INPUT:
+    tokenizer - function splitting a message into tokens
+    n_jobs - int - worker processes, -1 uses every core
+    chunksize - int - messages per task; inputs of fewer than two chunks,
+                like the requests of the web app, are tokenized in process
+    """
+
+    def __init__(self, tokenizer=None, n_jobs=1, chunksize=2000):
+        self.tokenizer = tokenizer
+        self.n_jobs = n_jobs
+        self.chunksize = chunksize
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        """
+        This function tokenizes messages
+        INPUT:
+        X - list of messages
+        OUTPUT:
+        TokenizedMessages
+        """
+        X = list(X)
+        lengths = np.fromiter(map(len, X), dtype=np.int64, count=len(X))
+        if self.n_jobs == 1 or len(X) < 2 * self.chunksize:
+            return TokenizedMessages(tokenize_messages(self.tokenizer, X), lengths)
+        chunks = Parallel(n_jobs=self.n_jobs)(
+            delayed(tokenize_messages)(self.tokenizer, X[start:start + self.chunksize])
+            for start in range(0, len(X), self.chunksize))
+        return TokenizedMessages([tokens for chunk in chunks for tokens in chunk], lengths)
+
+
+class HashingTfidfVectorizer(BaseEstimator, TransformerMixin):
+    """
+    This class computes TF-IDF features like CountVectorizer followed by
+    TfidfTransformer, but hashes the tokens into a fixed number of columns
+    instead of keeping a vocabulary, so its memory does not grow with the
+    corpus. Document frequencies are counted batch by batch, and partial_fit
+    can fold new messages into them.
+    INPUT:
+    tokenizer - function splitting a message into tokens
+    preprocessor - function applied to a message before the tokenizer, None
+                   lowercases it
+    ngram_range - tuple - smallest and largest n-grams to hash
+    n_features - int - number of hashed columns
+    norm - 'l2', 'l1' or None - normalization of each row
+    smooth_idf - bool - add one to document frequencies, like TfidfTransformer
+    sublinear_tf - bool - replace term counts by 1 + log(count)
+    batch_size - int - messages hashed at once by fit
+    drop_empty - bool - only output the columns some training message hashed
+                 to. Forests need this, they waste their feature draws on
+                 empty columns, but the number of columns then changes with
+                 every partial_fit.
+    """
+
+    def __init__(self, tokenizer=None, ngram_range=(1, 1), n_features=2 ** 20, norm='l2',
+                 smooth_idf=True, sublinear_tf=False, batch_size=10000, drop_empty=False, preprocessor=None):
+        self.tokenizer = tokenizer
+        self.preprocessor = preprocessor
+        self.ngram_range = ngram_range
+        self.n_features = n_features
+        self.norm = norm
+        self.smooth_idf = smooth_idf
+        self.sublinear_tf = sublinear_tf
+        self.batch_size = batch_size
+        self.drop_empty = drop_empty
+
+    def _hasher(self):
+        # models pickled before the preprocessor parameter lowercase the text
+        preprocessor = getattr(self, 'preprocessor', None)
+        return HashingVectorizer(tokenizer=self.tokenizer, token_pattern=None, ngram_range=self.ngram_range,
+                                 preprocessor=preprocessor, lowercase=preprocessor is None,
+                                 n_features=self.n_features, alternate_sign=False, norm=None)
+
+    def partial_fit(self, X, y=None):
+        """
+        This function adds the document frequencies of a batch of messages
+        INPUT:
+        X - list of messages
+        OUTPUT:
+        self
+        """
+        if not hasattr(self, 'df_'):
+            self.df_ = np.zeros(self.n_features, dtype=np.int32)
+            self.n_docs_ = 0
+        counts = self._hasher().transform(X)
+        self.df_ += np.bincount(counts.indices, minlength=self.n_features)
+        self.n_docs_ += counts.shape[0]
+        self._update_idf()
+        return self
+
+    def fit(self, X, y=None):
+        """
+        This function counts document frequencies from scratch, hashing
+        batch_size messages at a time
+        INPUT:
+        X - list of messages
+        OUTPUT:
+        self
+        """
+        for attr in ['df_', 'n_docs_']:
+            if hasattr(self, attr):
+                delattr(self, attr)
+        for start in range(0, len(X), self.batch_size):
+            self.partial_fit(X[start:start + self.batch_size])
+        return self
+
+    def _update_idf(self):
+        # same formula as TfidfTransformer
+        df = self.df_ + int(self.smooth_idf)
+        n_docs = self.n_docs_ + int(self.smooth_idf)
+        self.idf_ = np.log(n_docs / np.maximum(df, 1)) + 1
+        if self.drop_empty:
+            self.columns_ = np.flatnonzero(self.df_)
+
+    def transform(self, X):
+        """
+        This function returns the TF-IDF matrix of X
+        INPUT:
+        X - list of messages
+        OUTPUT:
+        sparse matrix of shape (n_messages, n_features), or of shape
+        (n_messages, len(columns_)) with drop_empty
+        """
+        counts = self._hasher().transform(X).astype(np.float64)
+        if self.sublinear_tf:
+            np.log(counts.data, counts.data)
+            counts.data += 1
+        counts.data *= self.idf_[counts.indices]
+        if self.norm is not None:
+            counts = normalize(counts, norm=self.norm, copy=False)
+        if self.drop_empty:
+            counts = counts[:, self.columns_]
+        return counts
@@ -0,0 +1,458 @@
+import os
+import copy
+import json
+import hashlib
+from contextlib import contextmanager
+
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+
+def serving_filepath(model_filepath):
+    """
+    This function returns where the slim serving artifact of a model lives
+    INPUT:
+    model_filepath - path of the pickled training model, e.g. classifier.pkl
+    OUTPUT:
+    path of the serving artifact, e.g. classifier.serving.joblib
+    """
+    return os.path.splitext(model_filepath)[0] + '.serving.joblib'
+
+
+def export_serving_model(model, model_filepath):
+    """
+    This function saves only what prediction needs next to the training
+    model: the best pipeline without the grid search bookkeeping. joblib
+    stores its numpy arrays uncompressed so they can be memory-mapped.
+    INPUT:
+    model - fitted GridSearchCV object or pipeline
+    model_filepath - path of the pickled training model
+    OUTPUT:
+    path of the serving artifact
+    """
+    estimator = sparse_linear_weights(getattr(model, 'best_estimator_', model))
+    path = serving_filepath(model_filepath)
+    joblib.dump(estimator, path)
+    return path
+
+
+def sparse_linear_weights(pipeline):
+    """
+    This function returns a copy of a pipeline whose linear classifiers keep
+    their weights as sparse matrices. Hashed columns that no message of the
+    training data used keep a weight of exactly 0 in SGDClassifier, so the
+    incremental model stores a small part of its n_categories * n_features
+    dense weights. The copies share everything else with the pipeline, which
+    keeps its dense weights for partial_fit.
+    INPUT:
+    pipeline - fitted pipeline
+    OUTPUT:
+    pipeline - the pipeline itself when it has no linear classifiers
+    """
+    clf = getattr(pipeline, 'steps', [(None, None)])[-1][1]
+    estimators = getattr(clf, 'estimators_', [])
+    if not any(hasattr(est, 'sparsify') and hasattr(est, 'coef_') for est in estimators):
+        return pipeline
+    slim = []
+    for est in estimators:
+        if hasattr(est, 'sparsify') and hasattr(est, 'coef_'):
+            # sparsify replaces coef_ on the copy only
+            est = copy.copy(est).sparsify()
+        slim.append(est)
+    clf = copy.copy(clf)
+    clf.estimators_ = slim
+    pipeline = copy.copy(pipeline)
+    pipeline.steps = pipeline.steps[:-1] + [(pipeline.steps[-1][0], clf)]
+    return pipeline
+
+
+def artifact_filepath(model_filepath):
+    """
+    This function returns which export of a model load_serving_model reads:
+    the compact directory, then the serving artifact, then the training pickle
+    INPUT:
+    model_filepath - path of the pickled training model
+    OUTPUT:
+    path of the export
+    """
+    if os.path.isdir(compact_filepath(model_filepath)):
+        return compact_filepath(model_filepath)
+    if os.path.exists(serving_filepath(model_filepath)):
+        return serving_filepath(model_filepath)
+    return model_filepath
+
+
+def artifact_version(model_filepath):
+    """
+    This function identifies the export load_serving_model reads by a short
+    hash of its path, size and modification time, which changes whenever the
+    model is saved again
+    INPUT:
+    model_filepath - path of the pickled training model
+    OUTPUT:
+    version - string of 12 hex digits
+    """
+    path = artifact_filepath(model_filepath)
+    files = [path]
+    if os.path.isdir(path):
+        files = sorted(os.path.join(path, name) for name in os.listdir(path))
+    signature = [os.path.abspath(path)]
+    for name in files:
+        stat = os.stat(name)
+        signature.append('{}:{}:{}'.format(os.path.basename(name), stat.st_size, stat.st_mtime_ns))
+    return hashlib.sha1('|'.join(signature).encode('utf-8')).hexdigest()[:12]
+
+
+def load_serving_model(model_filepath, mmap_mode='r'):
+    """
+    This function loads the fastest available export of a model: the compact
+    directory, then the serving artifact, then the full training pickle
+    INPUT:
+    model_filepath - path of the pickled training model
+    mmap_mode - memory-map mode for the arrays of the exports
+    OUTPUT:
+    model - fitted estimator or CompactForestModel
+    """
+    path = artifact_filepath(model_filepath)
+    if path == compact_filepath(model_filepath):
+        return load_compact_model(path, mmap_mode=mmap_mode)
+    if path == serving_filepath(model_filepath):
+        return joblib.load(path, mmap_mode=mmap_mode)
+    return joblib.load(model_filepath)
+
+
+# version of the compact model directory layout
+COMPACT_FORMAT_VERSION = 1
+
+# node arrays written to the compact model directory
+COMPACT_ARRAYS = ['left', 'right', 'feature', 'threshold', 'value', 'roots', 'used_features', 'classes']
+
+
+def compact_filepath(model_filepath):
+    """
+    This function returns where the compact export of a model lives
+    INPUT:
+    model_filepath - path of the pickled training model, e.g. classifier.pkl
+    OUTPUT:
+    path of the compact model directory, e.g. classifier.compact
+    """
+    return os.path.splitext(model_filepath)[0] + '.compact'
+
+
+def export_compact_model(model, directory, compress=False):
+    """
+    This function exports a pipeline ending in a MultiOutputClassifier of
+    random forests to a directory holding the nodes of every tree as a few
+    contiguous numpy arrays that can be memory-mapped, the vocabulary of the
+    count vectorizers as one sorted utf-8 buffer and the rest of the feature
+    stage as a small joblib file.
+    INPUT:
+    model - fitted GridSearchCV object or pipeline
+    directory - folder receiving the export
+    compress - bool - store the arrays zlib-compressed in one npz file,
+               which is smaller but cannot be memory-mapped
+    OUTPUT:
+    directory - the folder that was written
+    """
+    estimator = getattr(model, 'best_estimator_', model)
+    classifier = estimator.steps[-1][1]
+    forests = getattr(classifier, 'estimators_', [])
+    if not forests or not all(hasattr(forest, 'estimators_') for forest in forests):
+        raise TypeError('only a MultiOutputClassifier of fitted forests can be exported compactly')
+
+    # concatenate the nodes of all trees, output after output
+    n_classes = [len(forest.classes_) for forest in forests]
+    width = max(n_classes)
+    left, right, feature, threshold, value, roots, n_trees = [], [], [], [], [], [], []
+    offset = 0
+    for forest in forests:
+        n_trees.append(len(forest.estimators_))
+        for tree in forest.estimators_:
+            nodes = tree.tree_
+            is_leaf = nodes.children_left == -1
+            left.append(np.where(is_leaf, -1, nodes.children_left + offset))
+            right.append(np.where(is_leaf, -1, nodes.children_right + offset))
+            feature.append(np.where(is_leaf, 0, nodes.feature))
+            threshold.append(nodes.threshold)
+            # normalize the leaf values exactly as DecisionTreeClassifier does
+            proba = nodes.value[:, 0, :].copy()
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            proba /= normalizer
+            value.append(np.pad(proba, ((0, 0), (0, width - proba.shape[1]))))
+            roots.append(offset)
+            offset += nodes.node_count
+
+    # only the columns some tree splits on are needed at prediction time
+    feature = np.concatenate(feature)
+    used_features, feature = np.unique(feature, return_inverse=True)
+
+    classes = np.zeros((len(forests), width), dtype=np.int64)
+    for i, forest in enumerate(forests):
+        classes[i, :n_classes[i]] = forest.classes_
+
+    arrays = {
+        'left': np.concatenate(left).astype(np.int64),
+        'right': np.concatenate(right).astype(np.int64),
+        'feature': feature.astype(np.int32),
+        'threshold': np.concatenate(threshold),
+        'value': np.concatenate(value),
+        'roots': np.array(roots, dtype=np.int64),
+        'used_features': used_features.astype(np.int64),
+        'classes': classes
+    }
+
+    # strip the vocabularies from a copy of the feature stage
+    features = copy.deepcopy(estimator[:-1])
+    vocabularies = {}
+    for name, step in features.get_params().items():
+        if isinstance(step, CountVectorizer) and hasattr(step, 'vocabulary_'):
+            terms = sorted(step.vocabulary_, key=step.vocabulary_.get)
+            if any('\x00' in term for term in terms):
+                raise ValueError('vocabulary terms may not contain NUL characters')
+            arrays['vocabulary__' + name] = np.frombuffer('\x00'.join(terms).encode('utf-8'), dtype=np.uint8)
+            vocabularies[name] = len(terms)
+            del step.vocabulary_
+            # stop_words_ only serves introspection and can be large
+            if hasattr(step, 'stop_words_'):
+                del step.stop_words_
+
+    os.makedirs(directory, exist_ok=True)
+    joblib.dump(features, os.path.join(directory, 'features.joblib'))
+    if compress:
+        np.savez_compressed(os.path.join(directory, 'arrays.npz'), **arrays)
+    else:
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, name + '.npy'), array)
+    meta = {
+        'version': COMPACT_FORMAT_VERSION,
+        'compressed': compress,
+        'n_classes': n_classes,
+        'n_trees': n_trees,
+        'vocabularies': vocabularies,
+        'thresholds': None if decision_thresholds(model) is None else decision_thresholds(model).tolist()
+    }
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    return directory
+
+
+class CompactForestModel(object):
+    """
+    This class predicts with a model exported by export_compact_model. The
+    trees are walked level by level for all messages and trees at once, and
+    the leaf probabilities are summed in the same order as scikit-learn so
+    predictions match the original model exactly.
+    INPUT:
+    features - fitted feature stage of the pipeline
+    arrays - dict of node arrays, possibly memory-mapped
+    meta - dict read from meta.json
+    batch_size - int - messages walked through the trees at once
+    """
+
+    def __init__(self, features, arrays, meta, batch_size=256):
+        self.features = features
+        self.arrays = arrays
+        self.meta = meta
+        self.batch_size = batch_size
+        self.n_classes = meta['n_classes']
+        self.classes_ = [arrays['classes'][i, :n] for i, n in enumerate(self.n_classes)]
+        self.thresholds_ = None if meta.get('thresholds') is None else np.array(meta['thresholds'])
+        # tree index range of every output
+        self.tree_bounds = np.concatenate([[0], np.cumsum(meta['n_trees'])])
+
+    def _leaf_values(self, X):
+        # X holds only the used feature columns as float32, like sklearn's trees
+        left, right = self.arrays['left'], self.arrays['right']
+        feature, threshold = self.arrays['feature'], self.arrays['threshold']
+        roots = self.arrays['roots']
+        n_samples, n_trees = X.shape[0], len(roots)
+
+        node = np.tile(roots, n_samples)
+        sample = np.repeat(np.arange(n_samples), n_trees)
+        active = np.flatnonzero(left[node] != -1)
+        while active.size:
+            current = node[active]
+            go_left = X[sample[active], feature[current]] <= threshold[current]
+            node[active] = np.where(go_left, left[current], right[current])
+            active = active[left[node[active]] != -1]
+        return self.arrays['value'][node].reshape(n_samples, n_trees, -1)
+
+    def _predict_proba_batch(self, X):
+        X = X.tocsr()[:, self.arrays['used_features']].astype(np.float32).toarray()
+        values = self._leaf_values(X)
+        probas = []
+        for i, n in enumerate(self.n_classes):
+            start, end = self.tree_bounds[i], self.tree_bounds[i + 1]
+            proba = np.zeros((X.shape[0], n))
+            for t in range(start, end):
+                proba += values[:, t, :n]
+            proba /= end - start
+            probas.append(proba)
+        return probas
+
+    def predict_proba(self, X):
+        """
+        This function returns one (n_messages, n_classes) array per category,
+        like MultiOutputClassifier.predict_proba
+        """
+        return self.predict_proba_features(self.features.transform(X))
+
+    def predict_proba_features(self, Xt):
+        """
+        This function is predict_proba for messages already turned into
+        features by the feature stage
+        """
+        batches = [self._predict_proba_batch(Xt[start:start + self.batch_size])
+                   for start in range(0, Xt.shape[0], self.batch_size)]
+        return [np.vstack([batch[i] for batch in batches]) for i in range(len(self.n_classes))]
+
+    def predict(self, X):
+        """
+        This function returns the predicted labels, shape (n_messages, n_categories)
+        """
+        probas = self.predict_proba(X)
+        return np.column_stack([classes.take(np.argmax(proba, axis=1))
+                                for classes, proba in zip(self.classes_, probas)])
+
+
+def load_compact_model(directory, mmap_mode='r'):
+    """
+    This function loads a model exported by export_compact_model
+    INPUT:
+    directory - folder holding the export
+    mmap_mode - memory-map mode of the node arrays, None reads them into memory
+    OUTPUT:
+    model - CompactForestModel
+    """
+    with open(os.path.join(directory, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta['version'] != COMPACT_FORMAT_VERSION:
+        raise ValueError('unsupported compact model version {}'.format(meta['version']))
+
+    if meta['compressed']:
+        with np.load(os.path.join(directory, 'arrays.npz')) as npz:
+            arrays = {name: npz[name] for name in npz.files}
+    else:
+        names = COMPACT_ARRAYS + ['vocabulary__' + name for name in meta['vocabularies']]
+        arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+                  for name in names}
+
+    # rebuild the vocabulary dicts, term i of the sorted buffer is column i
+    features = joblib.load(os.path.join(directory, 'features.joblib'))
+    steps = features.get_params()
+    for name in meta['vocabularies']:
+        terms = bytes(arrays.pop('vocabulary__' + name)).decode('utf-8').split('\x00')
+        steps[name].vocabulary_ = dict(zip(terms, range(len(terms))))
+    return CompactForestModel(features, arrays, meta)
+
+
+def output_classes(model):
+    """
+    This function returns the array of classes of every category of a
+    MultiOutputClassifier pipeline or a CompactForestModel
+    """
+    if isinstance(model, CompactForestModel):
+        return model.classes_
+    estimator = getattr(model, 'best_estimator_', model)
+    return [clf.classes_ for clf in estimator.steps[-1][1].estimators_]
+
+
+# p >= DEFAULT_THRESHOLD is p > 0.5, the class argmax picks out of [0, 1]
+DEFAULT_THRESHOLD = float(np.nextafter(0.5, 1))
+
+
+def decision_thresholds(model):
+    """
+    This function returns the per category decision thresholds tuned when
+    the model was trained, or None when it predicts the most likely class
+    """
+    if isinstance(model, CompactForestModel):
+        return model.thresholds_
+    return getattr(getattr(model, 'best_estimator_', model), 'thresholds_', None)
+
+
+def set_decision_thresholds(model, thresholds):
+    """
+    This function stores per category decision thresholds in a model, where
+    the exports and predict_with_proba find them
+    INPUT:
+    model - fitted GridSearchCV object or pipeline
+    thresholds - one probability per category, None removes them
+    """
+    estimator = getattr(model, 'best_estimator_', model)
+    estimator.thresholds_ = None if thresholds is None else np.asarray(thresholds, dtype=float)
+
+
+def apply_thresholds(probabilities, thresholds):
+    """
+    This function turns the probabilities of the categories into labels, 1
+    where a probability reaches the threshold of its category
+    INPUT:
+    probabilities - float array of shape (n_messages, n_categories)
+    thresholds - one probability per category
+    OUTPUT:
+    labels - int array of shape (n_messages, n_categories)
+    """
+    return (probabilities >= np.asarray(thresholds)).astype(int)
+
+
+@contextmanager
+def no_timer(stage):
+    yield
+
+
+def model_stages(model):
+    """
+    This function splits a pipeline or a CompactForestModel into its feature
+    stage and its classifier, so both can be timed apart
+    INPUT:
+    model - fitted GridSearchCV object, pipeline or CompactForestModel
+    OUTPUT:
+    transform - function turning messages into the feature matrix
+    predict_proba - function turning the feature matrix into one
+                    (n_messages, n_classes) array per category
+    """
+    if isinstance(model, CompactForestModel):
+        return model.features.transform, model.predict_proba_features
+    estimator = getattr(model, 'best_estimator_', model)
+
+    def transform(X):
+        for _, step in estimator.steps[:-1]:
+            X = step.transform(X)
+        return X
+    return transform, estimator.steps[-1][1].predict_proba
+
+
+def predict_with_proba(model, X, timer=no_timer):
+    """
+    This function classifies X with a single predict_proba call and returns
+    hard labels together with the probability of each category being present.
+    The labels use the decision thresholds stored in the model, if any.
+    INPUT:
+    model - fitted pipeline or CompactForestModel
+    X - list of messages
+    timer - function taking a stage name ('features' or 'classify') and
+            returning a context manager that times the stage
+    OUTPUT:
+    labels - int array of shape (n_messages, n_categories)
+    probabilities - float array of shape (n_messages, n_categories)
+    """
+    transform, predict_proba = model_stages(model)
+    with timer('features'):
+        Xt = transform(X)
+    # every output returns its own (n, n_classes) array
+    with timer('classify'):
+        proba_list = predict_proba(Xt)
+    labels = np.zeros((len(X), len(proba_list)), dtype=int)
+    probabilities = np.zeros((len(X), len(proba_list)))
+    for i, (proba, classes) in enumerate(zip(proba_list, output_classes(model))):
+        labels[:, i] = classes.take(np.argmax(proba, axis=1))
+        # categories never seen as positive in training have no class 1 column
+        if 1 in classes:
+            probabilities[:, i] = proba[:, list(classes).index(1)]
+    thresholds = decision_thresholds(model)
+    if thresholds is not None:
+        labels = apply_thresholds(probabilities, thresholds)
+    return labels, probabilities
@@ -0,0 +1,197 @@
+import os
+import json
+import shutil
+
+import numpy as np
+from scipy import sparse as sp
+from sklearn.preprocessing import normalize
+
+from model_io import CompactForestModel
+
+# version of the similarity index directory layout, 1 was keyed on rowids
+SIMILAR_FORMAT_VERSION = 2
+
+
+def similar_filepath(model_filepath):
+    """
+    This function returns where the similarity index of a model lives
+    INPUT:
+    model_filepath - path of the pickled training model, e.g. classifier.pkl
+    OUTPUT:
+    path of the index directory, e.g. classifier.similar
+    """
+    return os.path.splitext(model_filepath)[0] + '.similar'
+
+
+def tfidf_stage(model):
+    """
+    This function returns the TF-IDF part of the features of a model: the
+    steps before the FeatureUnion and its nlp_pipeline, without the length
+    feature, rows normalized to unit length so dot products are cosines
+    INPUT:
+    model - fitted GridSearchCV object, pipeline or CompactForestModel
+    OUTPUT:
+    transform - function turning messages into a sparse TF-IDF matrix
+    """
+    if isinstance(model, CompactForestModel):
+        steps = [step for _, step in model.features.steps]
+    else:
+        steps = [step for _, step in getattr(model, 'best_estimator_', model).steps[:-1]]
+    nlp_pipeline = dict(steps[-1].transformer_list)['nlp_pipeline']
+
+    def transform(X):
+        for step in steps[:-1]:
+            X = step.transform(X)
+        return normalize(nlp_pipeline.transform(X)).astype(np.float32)
+    return transform
+
+
+def impact_ordered(vectors):
+    """
+    This function turns the rows of a matrix into one posting list per
+    feature, the messages using the feature sorted by its weight in them,
+    heaviest first
+    INPUT:
+    vectors - CSR matrix of shape (n_messages, n_features)
+    OUTPUT:
+    postings - CSC matrix whose columns list the messages by falling weight
+    """
+    postings = vectors.tocsc()
+    columns = np.repeat(np.arange(postings.shape[1]), np.diff(postings.indptr))
+    order = np.lexsort((-postings.data, columns))
+    return sp.csc_matrix((postings.data[order], postings.indices[order], postings.indptr), shape=postings.shape)
+
+
+class SimilarityIndex(object):
+    """
+    This class finds the messages whose TF-IDF vectors are closest to a
+    query by cosine similarity, without scoring every message. It keeps an
+    inverted index whose posting lists are sorted by weight: a query reads
+    only the heaviest postings of its heaviest terms, ranks the messages
+    found by the partial dot products, and scores a shortlist of them
+    exactly. The work per query is bounded by these limits rather than by
+    the number of messages, and the arrays are memory-mapped, so lookups
+    stay in the milliseconds at millions of messages.
+    INPUT:
+    vectors - CSR matrix of the unit length TF-IDF vectors of the messages
+    postings - CSC matrix of the same vectors returned by impact_ordered
+    ids - int array, the id of every message in message_category, which
+          unlike its rowid survives rebuilding the database
+    """
+
+    def __init__(self, vectors, postings, ids):
+        self.vectors = vectors
+        self.postings = postings
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def candidates(self, vector, max_terms=32, max_postings=2000):
+        """
+        This function returns the messages sharing one of the heaviest terms
+        of a query, with their partial dot products over those terms
+        """
+        vector = sp.csr_matrix(vector)
+        heaviest = np.argsort(-vector.data, kind='stable')[:max_terms]
+        indptr, indices, data = self.postings.indptr, self.postings.indices, self.postings.data
+        messages, weights = [], []
+        for term, weight in zip(vector.indices[heaviest], vector.data[heaviest]):
+            start = indptr[term]
+            end = min(start + max_postings, indptr[term + 1])
+            messages.append(indices[start:end])
+            weights.append(data[start:end] * weight)
+        if not messages:
+            return np.array([], dtype=np.int64), np.array([])
+        found, inverse = np.unique(np.concatenate(messages), return_inverse=True)
+        return found, np.bincount(inverse, weights=np.concatenate(weights))
+
+    def query(self, vector, k=10, max_terms=32, max_postings=2000, shortlist=1000):
+        """
+        This function returns the k messages most similar to a query
+        INPUT:
+        vector - sparse (1, n_features) unit length TF-IDF vector of the query
+        k - int - number of messages returned
+        max_terms - int - heaviest terms of the query looked up
+        max_postings - int - heaviest postings read per term
+        shortlist - int - messages with the best partial scores scored exactly
+        OUTPUT:
+        ids - int array of the ids of the messages, most similar first
+        scores - float array of their cosine similarity to the query
+        """
+        if vector.shape[1] != self.vectors.shape[1]:
+            raise ValueError('the index was built for {} features, the query has {}'.format(
+                self.vectors.shape[1], vector.shape[1]))
+        found, partial = self.candidates(vector, max_terms, max_postings)
+        shortlist = max(shortlist, k)
+        if len(found) > shortlist:
+            found = found[np.argpartition(-partial, shortlist)[:shortlist]]
+        if len(found) == 0:
+            return np.array([], dtype=np.int64), np.array([])
+
+        scores = (self.vectors[found] @ sp.csr_matrix(vector).T).toarray().ravel()
+        top = np.argsort(-scores, kind='stable')[:k]
+        return np.asarray(self.ids)[found[top]], scores[top]
+
+    def save(self, directory):
+        """
+        This function writes the index as numpy arrays that load_similarity_index
+        can memory-map, replacing an earlier index only once it is complete
+        """
+        tmp = directory + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        arrays = {'ids': self.ids}
+        for name, matrix in [('vectors', self.vectors), ('postings', self.postings)]:
+            arrays.update({name + '_data': matrix.data, name + '_indices': matrix.indices,
+                           name + '_indptr': matrix.indptr})
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp, name + '.npy'), array)
+        meta = {'version': SIMILAR_FORMAT_VERSION, 'shape': list(self.vectors.shape)}
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.rename(tmp, directory)
+        return directory
+
+
+def load_similarity_index(directory, mmap_mode='r'):
+    """
+    This function loads an index written by SimilarityIndex.save
+    INPUT:
+    directory - folder holding the index
+    mmap_mode - memory-map mode of the arrays, None reads them into memory
+    OUTPUT:
+    index - SimilarityIndex
+    """
+    with open(os.path.join(directory, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta['version'] != SIMILAR_FORMAT_VERSION:
+        raise ValueError('unsupported similarity index version {}'.format(meta['version']))
+
+    def load(name):
+        return np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+
+    shape = tuple(meta['shape'])
+    vectors = sp.csr_matrix((load('vectors_data'), load('vectors_indices'), load('vectors_indptr')), shape=shape)
+    postings = sp.csc_matrix((load('postings_data'), load('postings_indices'), load('postings_indptr')),
+                             shape=shape)
+    return SimilarityIndex(vectors, postings, load('ids'))
+
+
+def build_similarity_index(transform, batches):
+    """
+    This function indexes messages by their TF-IDF vectors
+    INPUT:
+    transform - function returned by tfidf_stage
+    batches - iterable of (ids, messages) tuples, e.g. chunks of the database
+    OUTPUT:
+    index - SimilarityIndex
+    """
+    all_ids, parts = [], []
+    for ids, messages in batches:
+        all_ids.append(np.asarray(ids, dtype=np.int64))
+        parts.append(transform(messages))
+    vectors = sp.vstack(parts).tocsr()
+    vectors.sort_indices()
+    return SimilarityIndex(vectors, impact_ordered(vectors), np.concatenate(all_ids))
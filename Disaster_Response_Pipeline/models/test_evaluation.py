@@ -0,0 +1,31 @@
+import numpy as np
+
+from evaluation import tune_category, tune_thresholds
+from model_io import DEFAULT_THRESHOLD, apply_thresholds
+
+
+def test_separable_category_gets_the_separating_threshold():
+    _, threshold = tune_category(np.array([0, 0, 1, 1]), np.array([0.1, 0.2, 0.3, 0.4]))
+    assert threshold == 0.3
+
+
+def test_threshold_flagging_every_message_is_never_picked():
+    # flagging all six messages has the best F1 (0.667), but says nothing
+    y_true = np.array([1, 0, 1, 0, 1, 0])
+    proba = np.array([0.2, 0.3, 0.4, 0.5, 0.6, 0.7])
+    _, threshold = tune_category(y_true, proba)
+    assert threshold == DEFAULT_THRESHOLD
+
+
+def test_frequent_category_with_constant_probabilities_keeps_the_default():
+    _, threshold = tune_category(np.array([1, 1, 1, 0]), np.full(4, 0.1))
+    assert threshold == DEFAULT_THRESHOLD
+
+
+def test_tuned_thresholds_never_flag_every_message():
+    rng = np.random.RandomState(0)
+    Y = (rng.rand(400, 5) < [0.05, 0.3, 0.6, 0.9, 0.5]).astype(int)
+    # probabilities unrelated to the labels
+    P = rng.rand(400, 5)
+    thresholds, _ = tune_thresholds(Y, P)
+    assert not apply_thresholds(P, thresholds).all(axis=0).any()
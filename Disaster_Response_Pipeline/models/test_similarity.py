@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from scipy import sparse as sp
+from sklearn.preprocessing import normalize
+
+from similarity import build_similarity_index, load_similarity_index, similar_filepath
+
+
+def random_vectors(n_rows, n_features=200, density=0.05, seed=0):
+    return normalize(sp.random(n_rows, n_features, density=density, format='csr',
+                               random_state=seed, dtype=np.float32))
+
+
+@pytest.fixture
+def index():
+    vectors = random_vectors(500)
+    # ids need not follow the order of the rows
+    ids = np.arange(1000, 500, -1)
+    batches = [(ids[:200], vectors[:200]), (ids[200:], vectors[200:])]
+    return build_similarity_index(lambda X: X, batches), vectors, ids
+
+
+def test_query_returns_the_exact_neighbors(index):
+    index, vectors, ids = index
+    for row in (0, 123, 499):
+        query = vectors[row]
+        found, scores = index.query(query, k=5, max_postings=10000, shortlist=500)
+        exact = (vectors @ query.T).toarray().ravel()
+        assert found[0] == ids[row]
+        assert np.allclose(scores, np.sort(exact)[::-1][:5], atol=1e-6)
+
+
+def test_save_and_load_keep_the_answers(index, tmp_path):
+    index, vectors, ids = index
+    directory = index.save(similar_filepath(str(tmp_path / 'classifier.pkl')))
+    loaded = load_similarity_index(directory)
+    assert len(loaded) == len(ids)
+    found, scores = index.query(vectors[42], k=10)
+    loaded_found, loaded_scores = loaded.query(vectors[42], k=10)
+    assert np.array_equal(found, loaded_found) and np.allclose(scores, loaded_scores)
+
+
+def test_query_rejects_other_features(index):
+    index, _, _ = index
+    with pytest.raises(ValueError):
+        index.query(random_vectors(1, n_features=10), k=3)
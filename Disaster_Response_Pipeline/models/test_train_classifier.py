@@ -0,0 +1,100 @@
+import numpy as np
+from scipy import sparse as sp
+from joblib import parallel_backend
+
+import model_io
+import train_classifier
+
+
+def test_parallel_search_fits_candidates_serially():
+    model = train_classifier.build_model(n_jobs=4)
+    params = model.estimator.get_params()
+    assert model.n_jobs == 4 and model.refit is False
+    assert params['tokens__n_jobs'] == 1 and params['clf__n_jobs'] in (None, 1)
+
+
+def test_fit_search_refits_the_best_candidate_with_every_worker(monkeypatch):
+    fitted = []
+    fit = train_classifier.Pipeline.fit
+
+    def recording_fit(self, X, Y):
+        fitted.append((len(X), self.get_params()['tokens__n_jobs'], self.get_params()['clf__n_jobs']))
+        return fit(self, X, Y)
+
+    monkeypatch.setattr(train_classifier.Pipeline, 'fit', recording_fit)
+    model = train_classifier.build_model(n_jobs=2)
+    model.param_grid = {'clf__estimator__n_estimators': [2, 3]}
+    rng = np.random.RandomState(0)
+    words = np.array(['water', 'food', 'fire', 'storm', 'help'])
+    X = np.array([' '.join(rng.choice(words, 4)) for _ in range(30)], dtype=object)
+    Y = np.array([[int('water' in x), int('fire' in x)] for x in X])
+    # threads see the patched fit, the search still runs two candidates at once
+    with parallel_backend('threading'):
+        best = train_classifier.fit_search(model, X, Y, n_jobs=2)
+    # the candidates fit serially on the folds, the refit on all of X with both workers
+    assert {(tokens, clf) for n, tokens, clf in fitted if n < len(X)} == {(1, None)}
+    assert fitted[-1] == (len(X), 2, 2)
+    assert best.best_params_ in [{'clf__estimator__n_estimators': n} for n in (2, 3)]
+    assert best.get_params()['tokens__n_jobs'] == 1 and best.get_params()['clf__n_jobs'] == 1
+    assert best.predict(X).shape == Y.shape
+
+
+def test_resumable_search_refits_with_every_worker(tmp_path, monkeypatch):
+    fitted = []
+
+    def cross_val_score(estimator, X, Y, cv):
+        fitted.append(estimator.get_params())
+        return np.array([0.5])
+
+    fitted_jobs = []
+
+    def fit(self, X, Y):
+        fitted_jobs.append((self.get_params()['tokens__n_jobs'], self.get_params()['clf__n_jobs']))
+        return self
+
+    monkeypatch.setattr(train_classifier, 'cross_val_score', cross_val_score)
+    monkeypatch.setattr(train_classifier.Pipeline, 'fit', fit)
+    model = train_classifier.build_model(n_jobs=1)
+    model.param_grid = {'clf__estimator__n_estimators': [2]}
+    X, Y = np.array(['water', 'food'] * 5, dtype=object), np.zeros((10, 2), dtype=int)
+    # threads see the patched functions
+    with parallel_backend('threading'):
+        best = train_classifier.resumable_search(model, X, Y, str(tmp_path), n_jobs=3)
+    assert [(p['tokens__n_jobs'], p['clf__n_jobs']) for p in fitted] == [(1, 1)]
+    assert fitted_jobs == [(3, 3)]
+
+
+def test_serving_export_of_incremental_model_keeps_sparse_weights(tmp_path):
+    model = train_classifier.build_incremental_model(n_features=2**12)
+    X = np.array(['need water and food', 'roads are blocked', 'we need a doctor', 'storm is over'] * 5,
+                 dtype=object)
+    Y = np.array([[1, 0], [0, 1], [1, 1], [0, 0]] * 5)
+    train_classifier.partial_fit_model(model, X, Y)
+    model_filepath = str(tmp_path / 'classifier.pkl')
+    model_io.export_serving_model(model, model_filepath)
+    serving = model_io.load_serving_model(model_filepath)
+    assert all(sp.issparse(est.coef_) for est in serving.named_steps['clf'].estimators_)
+    # the training model keeps the dense weights partial_fit updates
+    assert not any(sp.issparse(est.coef_) for est in model.named_steps['clf'].estimators_)
+    assert np.array_equal(serving.predict_proba(X)[0], model.predict_proba(X)[0])
+
+
+def test_resumable_search_skips_checkpointed_candidates(tmp_path, monkeypatch):
+    scored = []
+
+    def cross_val_score(estimator, X, Y, cv):
+        n_estimators = estimator.get_params()['clf__estimator__n_estimators']
+        scored.append(n_estimators)
+        return np.array([n_estimators / 10.0])
+
+    monkeypatch.setattr(train_classifier, 'cross_val_score', cross_val_score)
+    monkeypatch.setattr(train_classifier.Pipeline, 'fit', lambda self, X, Y: self)
+    model = train_classifier.build_model(n_jobs=1)
+    model.param_grid = {'clf__estimator__n_estimators': [2, 5, 3]}
+    X, Y = np.array(['water', 'food'] * 5, dtype=object), np.zeros((10, 2), dtype=int)
+    with parallel_backend('threading'):
+        first = train_classifier.resumable_search(model, X, Y, str(tmp_path))
+        # a rerun finds every candidate checkpointed
+        second = train_classifier.resumable_search(model, X, Y, str(tmp_path))
+    assert sorted(scored) == [2, 3, 5]
+    assert first.best_params_ == second.best_params_ == {'clf__estimator__n_estimators': 5}
@@ -0,0 +1,53 @@
+import re
+from functools import lru_cache
+
+from nltk.corpus import stopwords
+from nltk.tokenize import word_tokenize
+from nltk.stem import WordNetLemmatizer
+
+# anything that is not a letter or a digit is replaced by a space
+NON_ALPHANUMERIC = re.compile(r"[^a-zA-Z0-9]")
+
+# number of distinct words whose lemma is remembered
+LEMMA_CACHE_SIZE = 2 ** 17
+
+lemmatizer = WordNetLemmatizer()
+
+
+@lru_cache(maxsize=None)
+def stop_words():
+    """
+    This function returns the english stopwords as a frozenset, reading the
+    nltk corpus only on the first call
+    """
+    return frozenset(stopwords.words('english'))
+
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize(word):
+    """
+    This function returns the lemma of a word, remembering recent words
+    """
+    return lemmatizer.lemmatize(word)
+
+
+def tokenize(text):
+    """
+    This function takes a text as input, normalizes case, removes whitespace, tokenizes word, removes stop words and lemmatizes it.
+    It is shared by the training pipeline and the web app so both see the same tokens.
+    INPUT:
+    text - string of text to be cleaned
+    OUTPUT:
+    lemmed - list of cleaned tokens
+    """
+    # normalize case and clean text
+    text = NON_ALPHANUMERIC.sub(" ", text.lower()).strip()
+
+    # create tokens
+    tokens = word_tokenize(text)
+
+    # remove stopwords and lemmatize
+    stop = stop_words()
+    lemmed = [lemmatize(word) for word in tokens if word not in stop]
+
+    return lemmed
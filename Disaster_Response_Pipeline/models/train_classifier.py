@@ -1,112 +1,249 @@
 # import libraries
+import os
 import sys
+import argparse
+import shutil
 import pandas as pd
 import numpy as np
-from sqlalchemy import create_engine
-import re
+from scipy import sparse as sp
+from sqlalchemy import create_engine, inspect, text
 import pickle
 import warnings
 
 import nltk
 nltk.download(['punkt','wordnet','stopwords'])
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
+from tokenizer import tokenize
+from features import text_length_extractor, log_text_length_extractor, HashingTfidfVectorizer
+from features import MessageTokenizer, pretokenized, tokenized_length_extractor
+from model_io import export_serving_model, serving_filepath, export_compact_model, compact_filepath
+from model_io import predict_with_proba, set_decision_thresholds
+from evaluation import evaluate_probabilities
+from similarity import build_similarity_index, similar_filepath, tfidf_stage
 
-from sklearn.model_selection import train_test_split,GridSearchCV
+from joblib import Parallel, delayed, dump, load, hash as joblib_hash
+from sklearn.model_selection import train_test_split,GridSearchCV,ParameterGrid,check_cv,cross_val_score
+from sklearn.base import clone
 from sklearn.pipeline import Pipeline
 from sklearn.feature_extraction.text import CountVectorizer,TfidfTransformer
 from sklearn.multioutput import MultiOutputClassifier
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import classification_report
+from sklearn.linear_model import SGDClassifier
 from sklearn.pipeline import FeatureUnion
 from sklearn.preprocessing import FunctionTransformer
 from sklearn.base import BaseEstimator, TransformerMixin
 
-def load_data(database_filepath):
+def load_data(database_filepath, sparse=False):
     """
     This function takes database filepath, loads the file as dataframe
     and splits it into feature matrix (X)and target vector (y)
     INPUT:
     database_filepath - path to the file in the database
+    sparse - bool - return Y as a scipy CSR matrix instead of a dense array
     OUTPUT:
     X - Feature matrix
-    y - Target vector
+    y - Target vector, uint8
     label - column names (36 categories)
     """
     # load data from database
     engine = create_engine('sqlite:///{}'.format(database_filepath))
-    df = pd.read_sql_table('message_category', con=engine)
+    label = pd.Index([col['name'] for col in inspect(engine).get_columns('message_category')][4:])
+
+    # only the messages and the category columns
+    columns = ', '.join('"{}"'.format(col) for col in ['message'] + list(label))
+    df = pd.read_sql_query('SELECT {} FROM message_category'.format(columns), engine)
     
     # split dataframe into features and target 
     X = df['message'].values
-    Y = df[df.columns[4:]].values
-    label = df.columns[4:]
+    Y = df[label].values.astype(np.uint8)
+    if sparse:
+        Y = sp.csr_matrix(Y)
     
     return X,Y,label
 
-
-def tokenize(text):
+def build_nlp_pipeline(features='count', n_features=2**20, tokenized=False):
     """
-    This function takes a text as input, normalizes case, removes whitespace, tokenizes word, removes stop words and lemmatizes it.
+    This function builds the text feature pipeline
     INPUT:
-    text - string of text to be cleaned
+    features - 'count' for a vocabulary based TF-IDF, 'hashing' for a TF-IDF
+               over a fixed number of hashed columns
+    n_features - int - number of hashed columns of the 'hashing' backend
+    tokenized - bool - the pipeline gets the output of MessageTokenizer
+                instead of raw messages
     OUTPUT:
-    text - cleaned text
+    pipeline - text to TF-IDF pipeline whose first step is named vect
     """
-    # normalize case and clean text
-    text = re.sub(r"[^a-zA-Z0-9]"," ",text.lower()).strip()
-    
-    # create tokens
-    tokens = word_tokenize(text)
-    
-    # remove stopwords and lemmatize
-    lemmed = [WordNetLemmatizer().lemmatize(word) for word in tokens if word not in stopwords.words('english')]
-    
-    return lemmed
+    tokenizer = pretokenized if tokenized else tokenize
+    preprocessor = pretokenized if tokenized else None
+    if features == 'hashing':
+        return Pipeline([
+            # the forests only get the columns seen in training
+            ('vect',HashingTfidfVectorizer(tokenizer=tokenizer,preprocessor=preprocessor,
+                                           n_features=n_features,drop_empty=True))
+        ])
+    if features != 'count':
+        raise ValueError('unknown feature backend {!r}'.format(features))
+    if tokenized:
+        vect = CountVectorizer(tokenizer=pretokenized,preprocessor=pretokenized,lowercase=False,token_pattern=None)
+    else:
+        vect = CountVectorizer(tokenizer=tokenize)
+    return Pipeline([
+        ('vect',vect),
+        ('tfidf',TfidfTransformer())
+    ])
 
-def text_length_extractor(arr):
-    """
-    This function returns len of the text in an array
-    INPUT:
-    data - list of text
-    OUTPUT:
-    array of lens
-    """
-    return np.array([len(text) for text in arr]).reshape(-1,1)
 
-def build_model():
+def build_model(n_jobs=1, cache_dir=None, features='count', n_features=2**20):
     """
     This function builds a model by creating pipeline and using Gridsearchcv
     INPUT:
-    None
+    n_jobs - int - number of worker processes of the grid search, -1 uses
+             every core. The candidates get a serial tokenizer and forests,
+             fit_search or resumable_search refit the best one with n_jobs
+             processes
+    cache_dir - string - folder where the pipeline caches the fitted text
+                features, so candidates sharing them do not re-tokenize
+    features - 'count' or 'hashing', see build_nlp_pipeline
+    n_features - int - number of hashed columns of the 'hashing' backend
     OUPUT:
-    prints evaluation metrics
+    model - GridSearchCV object wrapping the pipeline, without refit
     """
-    # Build pipeline
+    # Build pipeline, every feature reads the tokens of one shared pass
     pipeline = Pipeline([
+    ('tokens',MessageTokenizer(tokenize)),
     ('features',FeatureUnion([
-        ('nlp_pipeline',Pipeline([
-            ('vect',CountVectorizer(tokenizer=tokenize)),
-            ('tfidf',TfidfTransformer())
-        ])),
-        ('txt_len',FunctionTransformer(text_length_extractor, validate=False))
+        ('nlp_pipeline',build_nlp_pipeline(features, n_features, tokenized=True)),
+        ('txt_len',FunctionTransformer(tokenized_length_extractor, validate=False))
     ])),
     ('clf',MultiOutputClassifier(RandomForestClassifier()))
     
-])
+], memory=cache_dir)
     # gridsearch to find better parameters
     parameters = {
     'features__nlp_pipeline__vect__ngram_range':[(1,2)],
     'clf__estimator__n_estimators':[10,20],
     'clf__estimator__min_samples_split':[3,5]
 }
-    # create model
-    model = GridSearchCV(pipeline,parameters)
+    # create model, the search runs the candidates in parallel and
+    # refit_best refits the winner with every worker
+    model = GridSearchCV(pipeline,parameters,cv=3,n_jobs=n_jobs,refit=False)
     
     return model
 
-def evaluate_model(model, X_test, Y_test, category_names):
+def set_pipeline_jobs(pipeline, n_jobs=1):
+    """
+    This function sets the worker processes of the tokenizer and of the
+    forests of a pipeline. A candidate fitted in a worker of a parallel
+    search gets 1, else every worker would start its own pools and n_jobs
+    workers would run n_jobs**2 processes.
+    INPUT:
+    pipeline - pipeline built by build_model
+    n_jobs - int - processes of the tokenizer and the forests
+    OUTPUT:
+    pipeline - the same pipeline
+    """
+    # the FeatureUnion stays serial: next to the TF-IDF it only sums the
+    # lengths of the token lists, a process per branch costs more than that
+    return pipeline.set_params(tokens__n_jobs=n_jobs, clf__n_jobs=n_jobs)
+
+def refit_best(model, X, Y, best_params, best_score, n_jobs=1):
+    """
+    This function fits the pipeline of a grid search with the best
+    parameters found, the tokenizer and the forests using n_jobs processes
+    INPUT:
+    model - GridSearchCV object returned by build_model
+    X, Y - training data
+    best_params - dict of the parameters of the best candidate
+    best_score - float - its mean cross validation score
+    n_jobs - int - number of worker processes
+    OUTPUT:
+    best_model - fitted pipeline with best_params_ and best_score_, which
+                 predicts in process like the web app needs
+    """
+    best_model = set_pipeline_jobs(clone(model.estimator).set_params(**best_params), n_jobs)
+    best_model.fit(X, Y)
+    # requests are too small to pay for starting a pool of processes
+    set_pipeline_jobs(best_model)
+    best_model.best_params_ = best_params
+    best_model.best_score_ = best_score
+    return best_model
+
+def fit_search(model, X, Y, n_jobs=1):
+    """
+    This function runs the grid search of model with n_jobs candidates at a
+    time, then refits the best one with n_jobs processes
+    INPUT:
+    model - GridSearchCV object returned by build_model
+    X, Y - training data
+    n_jobs - int - number of worker processes
+    OUTPUT:
+    best_model - pipeline refitted on X, Y with the best parameters
+    """
+    model.fit(X, Y)
+    return refit_best(model, X, Y, model.best_params_, model.best_score_, n_jobs)
+
+def score_candidate(pipeline, params, X, Y, cv, checkpoint_path):
+    """
+    This function cross validates one grid search candidate and checkpoints
+    its scores to disk as soon as it is done
+    INPUT:
+    pipeline - unfitted pipeline
+    params - dict of parameters of the candidate
+    X, Y - training data
+    cv - cross validation splitter
+    checkpoint_path - path of the file receiving the result
+    OUTPUT:
+    result - dict with params, fold scores and their mean
+    """
+    # one candidate stays in its worker, the pool is already busy
+    estimator = set_pipeline_jobs(clone(pipeline).set_params(**params))
+    scores = cross_val_score(estimator, X, Y, cv=cv)
+    result = {'params': params, 'scores': scores, 'mean_score': scores.mean()}
+    # write to a temporary name first so an interrupted dump never looks finished
+    dump(result, checkpoint_path + '.tmp')
+    os.replace(checkpoint_path + '.tmp', checkpoint_path)
+    return result
+
+def resumable_search(model, X, Y, checkpoint_dir, n_jobs=1):
+    """
+    This function runs the grid search of model across a process pool,
+    checkpointing every finished candidate to checkpoint_dir. Candidates
+    already checkpointed for the same data are loaded instead of refitted,
+    so an interrupted search resumes where it stopped.
+    INPUT:
+    model - GridSearchCV object returned by build_model
+    X, Y - training data
+    checkpoint_dir - folder holding one file per finished candidate
+    n_jobs - int - number of worker processes
+    OUTPUT:
+    best_model - pipeline refitted on X, Y with the best parameters
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    cv = check_cv(model.cv, Y, classifier=True)
+    # checkpoints are only valid for the same data, folds and pipeline,
+    # whatever the number of workers
+    template = set_pipeline_jobs(clone(model.estimator))
+    search_key = joblib_hash((X, Y, cv, template.steps))
+
+    results, pending = [], []
+    for params in ParameterGrid(model.param_grid):
+        path = os.path.join(checkpoint_dir, joblib_hash((search_key, params)) + '.pkl')
+        if os.path.exists(path):
+            results.append(load(path))
+        else:
+            pending.append((params, path))
+    print('    {} candidates checkpointed, {} to fit'.format(len(results), len(pending)))
+
+    results += Parallel(n_jobs=n_jobs, verbose=5)(
+        delayed(score_candidate)(model.estimator, params, X, Y, cv, path)
+        for params, path in pending)
+
+    best = max(results, key=lambda result: result['mean_score'])
+    print('    best score {:.4f} with {}'.format(best['mean_score'], best['params']))
+
+    # the refit has every core to itself
+    return refit_best(model, X, Y, best['params'], best['mean_score'], n_jobs)
+
+def evaluate_model(model, X_test, Y_test, category_names, tune_thresholds=False, n_jobs=1):
     """
     This function takes a model and evaluates its performance based on precision, recall and f1-score on test set
     INPUT:
@@ -114,18 +251,159 @@ def evaluate_model(model, X_test, Y_test, category_names):
     X_test - test matrix
     Y_test - test vector
     category_names - labels of categories or output labels
+    tune_thresholds - bool - also tune a decision threshold per category
+    n_jobs - int - worker threads tuning the categories
     OUTPUT:
     print the classification report on test set
+    thresholds - tuned thresholds, None unless tune_thresholds
     """
-    # make prediction on test set
-    Y_pred = model.predict(X_test)
+    # a single predict_proba call, every report and curve reuses it
+    # (the labels at the default threshold are those of model.predict)
+    _, probabilities = predict_with_proba(model, X_test)
     
     # print evaluation metrics 
-    print(classification_report(Y_test,Y_pred,target_names=category_names))
+    return evaluate_probabilities(Y_test, probabilities, category_names, tune_thresholds, n_jobs)
+
+def load_data_chunks(database_filepath, chunksize=10000, after_rowid=0):
+    """
+    This function streams the message_category table in chunks, oldest rows
+    first, so training never holds the whole table in memory
+    INPUT:
+    database_filepath - path to the file in the database
+    chunksize - number of rows per chunk
+    after_rowid - only rows with a larger rowid are read
+    OUTPUT:
+    generator of (row_ids, ids, X, Y, label) per chunk
+    """
+    engine = create_engine('sqlite:///{}'.format(database_filepath))
+    query = text('SELECT rowid AS row_id, * FROM message_category WHERE rowid > :after ORDER BY rowid')
+    with engine.connect() as connection:
+        for df in pd.read_sql_query(query, connection, params={'after': int(after_rowid)}, chunksize=chunksize):
+            # pandas yields an empty frame when no row matches
+            if df.empty:
+                continue
+            yield (df['row_id'].values, df['id'].values, df['message'].values,
+                   df[df.columns[5:]].values.astype(np.uint8), df.columns[5:])
+
+
+def is_holdout(ids, test_percent=20):
+    """
+    This function puts a message in the holdout set based on its id only, so
+    every run and every update agrees on which messages are never trained on
+    INPUT:
+    ids - int array of message ids
+    test_percent - int - share of messages held out
+    OUTPUT:
+    bool array, True for holdout messages
+    """
+    # Knuth's multiplicative hash spreads consecutive ids evenly
+    return (np.asarray(ids, dtype=np.uint64) * np.uint64(2654435761)) % np.uint64(2 ** 32) % np.uint64(100) < test_percent
+
+
+def build_incremental_model(n_features=2**18, random_state=42):
+    """
+    This function builds a pipeline of hashed TF-IDF features and one linear
+    classifier per category that can all be updated with partial_fit_model
+    INPUT:
+    n_features - int - number of hashed columns; every category keeps a
+                 dense float64 weight per column, 2**18 columns make 75 MB
+    random_state - int - seed of the classifiers
+    OUTPUT:
+    model - pipeline
+    """
+    pipeline = Pipeline([
+    ('features',FeatureUnion([
+        ('nlp_pipeline',Pipeline([
+            ('vect',HashingTfidfVectorizer(tokenizer=tokenize,ngram_range=(1,2),n_features=n_features))
+        ])),
+        ('txt_len',FunctionTransformer(log_text_length_extractor, validate=False))
+    ])),
+    ('clf',MultiOutputClassifier(SGDClassifier(loss='log_loss',alpha=1e-5,random_state=random_state)))
+])
+    return pipeline
+
+
+def partial_fit_model(model, X, Y, update_idf=True):
+    """
+    This function updates the document frequencies and the classifiers of a
+    model built by build_incremental_model with one chunk of messages
+    INPUT:
+    model - pipeline
+    X - messages of the chunk
+    Y - labels of the chunk
+    update_idf - bool - count the chunk in the document frequencies, off when
+                 the chunk was already counted in an earlier epoch
+    OUTPUT:
+    model - the updated pipeline
+    """
+    features = model.named_steps['features']
+    vect = model.get_params()['features__nlp_pipeline__vect']
+    if hasattr(vect, 'df_'):
+        if update_idf:
+            vect.partial_fit(X)
+    else:
+        features.fit(X)
+    # every category is binary, even when a chunk only holds one class
+    model.named_steps['clf'].partial_fit(features.transform(X), Y, classes=[np.array([0, 1])] * Y.shape[1])
+    return model
+
+
+def train_incremental(model, database_filepath, chunksize=10000, epochs=1, after_rowid=0):
+    """
+    This function streams the training messages of the database through
+    partial_fit_model, skipping the holdout messages
+    INPUT:
+    model - pipeline built by build_incremental_model, fitted or not
+    database_filepath - path to the file in the database
+    chunksize - number of rows per chunk
+    epochs - int - passes over the rows
+    after_rowid - only rows with a larger rowid are trained on
+    OUTPUT:
+    model - the updated pipeline, last_rowid_ holds the newest row trained on
+    """
+    last_rowid = after_rowid
+    for epoch in range(epochs):
+        n_rows = 0
+        for row_ids, ids, X, Y, _ in load_data_chunks(database_filepath, chunksize, after_rowid):
+            last_rowid = max(last_rowid, int(row_ids.max()))
+            train = ~is_holdout(ids)
+            if train.any():
+                partial_fit_model(model, X[train], Y[train], update_idf=epoch == 0)
+                n_rows += train.sum()
+        print('    epoch {}: trained on {} messages'.format(epoch + 1, n_rows))
+    model.last_rowid_ = last_rowid
+    return model
+
+
+def evaluate_model_chunks(model, database_filepath, chunksize=10000, tune_thresholds=False, n_jobs=1):
+    """
+    This function prints the same report as evaluate_model for the holdout
+    messages of the database, predicting them chunk by chunk
+    INPUT:
+    model - model to be evaluated
+    database_filepath - path to the file in the database
+    chunksize - number of rows per chunk
+    tune_thresholds - bool - also tune a decision threshold per category
+    n_jobs - int - worker threads tuning the categories
+    OUTPUT:
+    print the classification report on the holdout set
+    thresholds - tuned thresholds, None unless tune_thresholds
+    """
+    Y_test, probabilities = [], []
+    for _, ids, X, Y, category_names in load_data_chunks(database_filepath, chunksize):
+        test = is_holdout(ids)
+        if test.any():
+            Y_test.append(Y[test])
+            probabilities.append(predict_with_proba(model, X[test])[1])
+    return evaluate_probabilities(np.vstack(Y_test), np.vstack(probabilities), category_names,
+                                  tune_thresholds, n_jobs)
+
 
 def save_model(model, model_filepath):
     """
-    This function takes a model, pickle it and save to model_filepath
+    This function takes a model, pickle it and save to model_filepath. It also
+    exports the slim serving artifact and, for forests, the compact model the
+    web app loads.
     INPUT:
     model - model to be saved
     model_filepath - path where pickled model is to be saved
@@ -133,33 +411,149 @@ def save_model(model, model_filepath):
     # pickle model to the path
     pickle.dump(model,open(model_filepath,'wb'))
 
+    # export only the best estimator for serving
+    export_serving_model(model, model_filepath)
+    try:
+        export_compact_model(model, compact_filepath(model_filepath))
+    except TypeError as exc:
+        # a stale export of an earlier model would be loaded before this one
+        shutil.rmtree(compact_filepath(model_filepath), ignore_errors=True)
+        print('Skipping compact export: {}'.format(exc))
 
-def main():
-    if len(sys.argv) == 3:
-        database_filepath, model_filepath = sys.argv[1:]
-        print('Loading data...\n    DATABASE: {}'.format(database_filepath))
-        X, Y, category_names = load_data(database_filepath)
-        X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.2)
-        
+
+def save_similarity_index(model, database_filepath, model_filepath, chunksize=10000):
+    """
+    This function indexes every message of the database by the TF-IDF
+    features of the model, for the /similar lookup of the web app, and saves
+    the index next to the pickled model
+    INPUT:
+    model - fitted model whose features are indexed
+    database_filepath - path to the file in the database
+    model_filepath - path of the pickled model
+    chunksize - number of messages read and vectorized at a time
+    """
+    transform = tfidf_stage(model)
+    # keyed on the message ids, which a rebuilt database keeps but not its rowids
+    batches = ((ids, X) for _, ids, X, _, _ in load_data_chunks(database_filepath, chunksize))
+    index = build_similarity_index(transform, batches)
+    index.save(similar_filepath(model_filepath))
+    return index
+
+
+def parse_args(argv):
+    """
+    This function parses the command line arguments of the script
+    """
+    parser = argparse.ArgumentParser(
+        description='Train the disaster messages classifier and save it as a pickle file.',
+        epilog='Example: python train_classifier.py ../data/DisasterResponse.db classifier.pkl --n-jobs 4')
+    parser.add_argument('database_filepath', help='filepath of the disaster messages database')
+    parser.add_argument('model_filepath', help='filepath of the pickle file to save the model to')
+    parser.add_argument('--n-jobs', type=int, default=1,
+                        help='worker processes for the grid search and the forests, -1 uses every core')
+    parser.add_argument('--cache-dir', default=None,
+                        help='folder caching the fitted text features across candidates')
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help='folder checkpointing finished candidates, rerun to resume an interrupted search')
+    parser.add_argument('--features', choices=['count', 'hashing'], default='count',
+                        help='text features: vocabulary based TF-IDF or TF-IDF over hashed columns')
+    parser.add_argument('--n-features', type=int, default=None,
+                        help='number of hashed columns of the hashing features (default: 2**20, '
+                             '2**18 in incremental mode)')
+    parser.add_argument('--tune-thresholds', action='store_true',
+                        help='tune a decision threshold per category for F1 on the hold-out set and save them '
+                             'with the model, the web app applies them')
+    parser.add_argument('--random-state', type=int, default=42,
+                        help='seed of the train/test split, keep it fixed to resume a search')
+    parser.add_argument('--incremental', action='store_true',
+                        help='stream the database in chunks into linear classifiers instead of the forest search')
+    parser.add_argument('--update', action='store_true',
+                        help='fold the rows added since model_filepath was trained into that incremental model')
+    parser.add_argument('--chunksize', type=int, default=10000,
+                        help='rows read from the database at a time in incremental mode and when indexing')
+    parser.add_argument('--epochs', type=int, default=1,
+                        help='passes over the rows in incremental mode')
+    parser.add_argument('--no-similar-index', action='store_true',
+                        help='skip indexing the messages for the similar messages lookup of the web app')
+    return parser.parse_args(argv)
+
+
+def index_similar_messages(model, args):
+    """
+    This function saves the similarity index of a trained model unless
+    --no-similar-index is given, then it removes a stale index instead
+    """
+    directory = similar_filepath(args.model_filepath)
+    if args.no_similar_index:
+        # an index of an earlier model does not match the new features
+        shutil.rmtree(directory, ignore_errors=True)
+        return
+    print('Indexing messages...\n    SIMILARITY INDEX: {}'.format(directory))
+    save_similarity_index(model, args.database_filepath, args.model_filepath, args.chunksize)
+
+
+def main_incremental(args):
+    """
+    This function trains, evaluates and saves the incremental model
+    """
+    database_filepath, model_filepath = args.database_filepath, args.model_filepath
+    if args.update:
+        print('Loading model...\n    MODEL: {}'.format(model_filepath))
+        model = pickle.load(open(model_filepath, 'rb'))
+        if not hasattr(model, 'last_rowid_'):
+            raise ValueError('{} was not trained with --incremental'.format(model_filepath))
+        after_rowid = model.last_rowid_
+    else:
         print('Building model...')
-        model = build_model()
-        
-        print('Training model...')
-        model.fit(X_train, Y_train)
-        
-        print('Evaluating model...')
-        evaluate_model(model, X_test, Y_test, category_names)
+        model = build_incremental_model(n_features=args.n_features or 2**18, random_state=args.random_state)
+        after_rowid = 0
+
+    print('Training model...\n    DATABASE: {} (rows after {})'.format(database_filepath, after_rowid))
+    model = train_incremental(model, database_filepath, args.chunksize, args.epochs, after_rowid)
+
+    print('Evaluating model...')
+    thresholds = evaluate_model_chunks(model, database_filepath, args.chunksize, args.tune_thresholds, args.n_jobs)
+    if thresholds is not None:
+        set_decision_thresholds(model, thresholds)
 
-        print('Saving model...\n    MODEL: {}'.format(model_filepath))
-        save_model(model, model_filepath)
+    print('Saving model...\n    MODEL: {}\n    SERVING MODEL: {}'.format(model_filepath, serving_filepath(model_filepath)))
+    save_model(model, model_filepath)
+    index_similar_messages(model, args)
 
-        print('Trained model saved!')
+    print('Trained model saved!')
 
+
+def main():
+    args = parse_args(sys.argv[1:])
+    if args.incremental or args.update:
+        main_incremental(args)
+        return
+    database_filepath, model_filepath = args.database_filepath, args.model_filepath
+    print('Loading data...\n    DATABASE: {}'.format(database_filepath))
+    X, Y, category_names = load_data(database_filepath)
+    X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.2, random_state=args.random_state)
+    
+    print('Building model...')
+    model = build_model(n_jobs=args.n_jobs, cache_dir=args.cache_dir,
+                        features=args.features, n_features=args.n_features or 2**20)
+    
+    print('Training model...')
+    if args.checkpoint_dir:
+        model = resumable_search(model, X_train, Y_train, args.checkpoint_dir, n_jobs=args.n_jobs)
     else:
-        print('Please provide the filepath of the disaster messages database '\
-              'as the first argument and the filepath of the pickle file to '\
-              'save the model to as the second argument. \n\nExample: python '\
-              'train_classifier.py ../data/DisasterResponse.db classifier.pkl')
+        model = fit_search(model, X_train, Y_train, n_jobs=args.n_jobs)
+    
+    print('Evaluating model...')
+    thresholds = evaluate_model(model, X_test, Y_test, category_names, args.tune_thresholds, args.n_jobs)
+    if thresholds is not None:
+        set_decision_thresholds(model, thresholds)
+
+    print('Saving model...\n    MODEL: {}\n    SERVING MODEL: {}\n    COMPACT MODEL: {}'.format(
+        model_filepath, serving_filepath(model_filepath), compact_filepath(model_filepath)))
+    save_model(model, model_filepath)
+    index_similar_messages(model, args)
+
+    print('Trained model saved!')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,176 @@
+import numpy as np
+import pandas as pd
+
+CHANNELS = ['email','mobile','social','web']
+
+# inclusive (start, end) ranges of the age and income group columns of the notebook
+AGE_GROUPS = [(i, i + 9) for i in range(10,120,10)]
+INCOME_GROUPS = list(zip(range(21000,111001,10000),range(30000,120001,10000)))
+
+
+def multi_label_binarize(values, classes, dtype=int):
+    '''
+    This function one hot encodes a column of lists, one column per class,
+    with exact matching of the items: int(class in items) for every row.
+
+    INPUT:
+    values: Series - lists (or other iterables) of items, one per row
+    classes: list - the items to encode, one output column each
+    dtype: type - type of the indicator columns
+
+    OUTPUT:
+    indicators: dataframe - with one column per class and the index of values
+    '''
+    items = [list(x) if isinstance(x, (list, tuple, set, np.ndarray)) else [] for x in values]
+    rows = np.repeat(np.arange(len(items)), [len(x) for x in items])
+    codes = pd.Index(classes).get_indexer(pd.Series([item for x in items for item in x], dtype=object))
+    known = codes >= 0
+    out = np.zeros((len(items), len(classes)), dtype=dtype)
+    out[rows[known], codes[known]] = 1
+    return pd.DataFrame(out, index=values.index, columns=list(classes))
+
+
+def bin_indicators(values, bins, fmt='{}_{}_{}', prefix=None, dtype=int):
+    '''
+    This function one hot encodes a numeric column into range groups in one
+    pass, like calling add_group once per group: a row is 1 in the group whose
+    inclusive (start, end) range holds its value. Values outside every range,
+    in the gaps between ranges, or missing are 0 in every group.
+
+    INPUT:
+    values: Series - numeric values to encode
+    bins: list - non overlapping inclusive (start, end) ranges sorted by start
+    fmt: string - name of a group column, formatted with prefix, start and end
+    prefix: string - first part of the column names, None uses the name of values
+    dtype: type - type of the indicator columns
+
+    OUTPUT:
+    indicators: dataframe - with one column per range and the index of values
+    '''
+    prefix = values.name if prefix is None else prefix
+    starts = np.array([start for start, _ in bins], dtype=float)
+    ends = np.array([end for _, end in bins], dtype=float)
+    x = values.to_numpy(dtype=float, na_value=np.nan)
+    # the last range starting at or below the value, like the edges of pd.cut
+    group = np.searchsorted(starts, x, side='right') - 1
+    inside = np.flatnonzero((group >= 0) & (x <= ends[np.maximum(group, 0)]))
+    out = np.zeros((len(x), len(bins)), dtype=dtype)
+    out[inside, group[inside]] = 1
+    return pd.DataFrame(out, index=values.index, columns=[fmt.format(prefix, start, end) for start, end in bins])
+
+
+def map_offers(portfolio, id_col='id'):
+    '''
+    This function maps offer_ids to offer names created by offertype_difficulty_duration
+
+    INPUT:
+    portfolio: dataframe - portfolio dataframe with columns containing id, offer_type, difficulty and duration
+    id_col: string - name of the offer id column
+
+    OUTPUT:
+    offer_mapper: dictionary - containing offer_id mapped to offer_names
+    '''
+    names = (portfolio['offer_type'].astype(str) + '_' + portfolio['difficulty'].astype(str) + '_' +
+             portfolio['duration'].astype(str))
+    return dict(zip(portfolio[id_col], names))
+
+
+def one_hot(portfolio, channels=CHANNELS):
+    '''
+    This function takes the portfolio dataframe and one hot encodes the channels
+    column into one column per channel, dropping the channels column.
+    '''
+    portfolio = portfolio.drop('channels', axis=1).join(multi_label_binarize(portfolio['channels'], channels))
+    return portfolio
+
+
+def hours_to_days(time):
+    '''
+    This function converts the time column of the transcript from hours to days.
+    '''
+    return time / 24
+
+
+def offer_used(completed, reward):
+    '''
+    This function flags the events that completed an offer with a reward,
+    1 where completed + reward > 1 and 0 elsewhere, missing rewards included.
+    '''
+    return ((completed + reward) > 1).astype(int)
+
+
+def sorted_categories(values):
+    '''
+    This function sorts the categories of a categorical column and drops the unused
+    ones, so sorting and pd.get_dummies give the rows and columns of the plain values.
+    Other columns are returned as they are.
+    '''
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        return values
+    values = values.cat.remove_unused_categories()
+    return values.cat.reorder_categories(sorted(values.cat.categories))
+
+
+def preprocess_portfolio(portfolio):
+    '''
+    This function is the preprocessing pipeline of the notebook for the portfolio
+    dataframe: it one hot encodes the channels column, creates the offer names and
+    renames the id column to port_id.
+
+    OUTPUT:
+    portfolio: dataframe - processed portfolio dataframe
+    offer_mapper: dictionary - containing offer_ids as keys and generated offer_names as values
+    '''
+    portfolio = one_hot(portfolio)
+    offer_mapper = map_offers(portfolio)
+    portfolio = portfolio.rename(columns={'id':'port_id'})
+    return portfolio, offer_mapper
+
+
+def preprocess_profile(profile):
+    '''
+    This function is the preprocessing pipeline of the notebook for the profile
+    dataframe: it creates the year and member_since columns and one hot encodes
+    the gender, age and income columns.
+    '''
+    became_member_on = pd.to_datetime(profile['became_member_on'].astype(str),format='%Y%m%d')
+    profile = profile.drop('became_member_on',axis=1)
+    profile['year'] = became_member_on.dt.year
+    mem_last_date = pd.to_datetime(20180731,format='%Y%m%d')
+    profile['member_since'] = (mem_last_date - became_member_on).dt.days
+    profile = pd.get_dummies(profile,columns=['gender'])
+    profile = profile.rename(columns={'gender_F':'female','gender_M':'male','gender_O':'other','id':'person_id'})
+    profile = profile.join(bin_indicators(profile['age'],AGE_GROUPS))
+    profile = profile.join(bin_indicators(profile['income'],INCOME_GROUPS))
+    profile.drop(['age','income'],axis=1,inplace=True)
+    return profile
+
+
+def preprocess_transcript(transcript):
+    '''
+    This function is the preprocessing pipeline of the notebook for the transcript
+    dataframe. It takes the dataframe of pd.read_json, with the value column, or
+    of load.load_data, with the value column already flattened.
+
+    OUTPUT:
+    transcript: dataframe - with event and offer_id one hot encoded, time in days
+                and the offer_used column, sorted by person and time
+    '''
+    if 'value' in transcript:
+        values = pd.DataFrame(transcript['value'].values.tolist(),index=transcript.index)
+    else:
+        # the value dictionaries of completed offers name their offer offer_id, the others offer id
+        completed = (transcript['event'] == 'offer completed').values
+        values = pd.DataFrame({'offer id':transcript['offer_id'].where(~completed),'amount':transcript['amount'],
+                               'offer_id':transcript['offer_id'].where(completed),'reward':transcript['reward']})
+    transcript = transcript[['person','event','time']].copy()
+    transcript['time'] = hours_to_days(transcript['time'])
+    transcript['person'] = sorted_categories(transcript['person'])
+    transcript['event'] = sorted_categories(transcript['event'])
+    values['offer_id'] = sorted_categories(values['offer_id'])
+    transcript = pd.get_dummies(transcript,columns=['event'])
+    transcript = transcript.join(values)
+    transcript['offer_used'] = offer_used(transcript['event_offer completed'],transcript['reward'])
+    transcript = transcript.sort_values(by=['person','time'])
+    transcript = pd.get_dummies(transcript,columns=['offer_id'])
+    return transcript
@@ -0,0 +1,197 @@
+import os
+import sys
+import json
+from array import array
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'shared'))
+import column_cache
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+PORTFOLIO_FILE = os.path.join(DATA_DIR, 'portfolio.json')
+PROFILE_FILE = os.path.join(DATA_DIR, 'profile.json')
+TRANSCRIPT_FILE = os.path.join(DATA_DIR, 'transcript.json')
+
+# text columns stored as categoricals, categories in order of first appearance
+CATEGORY_COLS = {'portfolio': ['offer_type'], 'profile': ['gender']}
+# columns written as floats or text that pd.read_json turns into integers
+INTEGER_COLS = {'portfolio': ['duration'], 'profile': ['became_member_on']}
+# raise when a parser returns other columns or dtypes, so cached files are parsed again
+CACHE_VERSION = 1
+
+
+def iter_records(file):
+    '''
+    This function reads a json lines file one record at a time.
+
+    INPUT:
+    file: string - path of the json lines file
+
+    OUTPUT:
+    yields one dictionary per non empty line
+    '''
+    with open(file) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def codes_array(values):
+    '''
+    This function returns an array module array as a numpy array without copying it
+    '''
+    return np.frombuffer(values, dtype='i{}'.format(values.itemsize)) if len(values) else np.array([], dtype=int)
+
+
+def typed_frame(records, category_cols=(), integer_cols=()):
+    '''
+    This function builds a dataframe from records with the types of pd.read_json,
+    integer columns downcast and the given text columns as categoricals.
+
+    INPUT:
+    records: iterable - dictionaries, one per row
+    category_cols: list - names of the columns to store as categoricals
+    integer_cols: list - names of the columns to convert to integers
+
+    OUTPUT:
+    df: dataframe - one row per record
+    '''
+    df = pd.DataFrame.from_records(list(records))
+    for col in df.columns:
+        if col in integer_cols:
+            df[col] = pd.to_numeric(df[col].astype('int64'), downcast='integer')
+        elif col in category_cols:
+            df[col] = df[col].astype(pd.CategoricalDtype(df[col].dropna().unique()))
+        elif pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+
+def parse_portfolio(file=PORTFOLIO_FILE):
+    '''
+    This function parses portfolio.json, channels stay lists of channel names.
+    '''
+    return typed_frame(iter_records(file), CATEGORY_COLS['portfolio'], INTEGER_COLS['portfolio'])
+
+
+def parse_profile(file=PROFILE_FILE):
+    '''
+    This function parses profile.json, became_member_on stays an integer like 20170715.
+    '''
+    return typed_frame(iter_records(file), CATEGORY_COLS['profile'], INTEGER_COLS['profile'])
+
+
+def parse_transcript(file=TRANSCRIPT_FILE):
+    '''
+    This function parses transcript.json line by line and flattens the value
+    dictionary of every event into typed columns as it goes, so neither the
+    dictionaries nor a frame of them are kept in memory.
+
+    received and viewed offers store their offer under the 'offer id' key and
+    completed offers under 'offer_id'; both end up in the offer_id column.
+    offer_id.where(event == 'offer completed') gives the column that
+    pd.DataFrame(transcript['value'].values.tolist()) calls offer_id.
+
+    INPUT:
+    file: string - path of transcript.json
+
+    OUTPUT:
+    transcript: dataframe - with person, event and offer_id as categoricals
+                (categories in order of first appearance), time as integer hours,
+                amount and reward as floats, NaN where an event has none
+    '''
+    persons, events, offers = {}, {}, {}
+    person, event, offer = array('i'), array('i'), array('i')
+    time, amount, reward = array('i'), array('d'), array('d')
+    for record in iter_records(file):
+        value = record['value']
+        offer_id = value.get('offer_id', value.get('offer id'))
+        person.append(persons.setdefault(record['person'], len(persons)))
+        event.append(events.setdefault(record['event'], len(events)))
+        offer.append(-1 if offer_id is None else offers.setdefault(offer_id, len(offers)))
+        time.append(record['time'])
+        amount.append(value.get('amount', np.nan))
+        reward.append(value.get('reward', np.nan))
+
+    transcript = pd.DataFrame({
+        'person': pd.Categorical.from_codes(codes_array(person), list(persons)),
+        'event': pd.Categorical.from_codes(codes_array(event), list(events)),
+        'time': pd.to_numeric(codes_array(time), downcast='integer'),
+        'offer_id': pd.Categorical.from_codes(codes_array(offer), list(offers)),
+        'amount': np.array(amount),
+        'reward': np.array(reward)
+    })
+    return transcript
+
+
+PARSERS = {'portfolio.json': parse_portfolio, 'profile.json': parse_profile, 'transcript.json': parse_transcript}
+
+
+def build_cache(file, parse=None):
+    '''
+    This function parses a json file once into its columnar cache, see shared/column_cache.py.
+
+    INPUT:
+    file: string - path of the json file
+    parse: function - parses the file into a dataframe, None picks it by file name
+
+    OUTPUT:
+    manifest: dictionary - with the source file signature and the cached column names
+    '''
+    return column_cache.build_cache(file, parse or PARSERS[os.path.basename(file)], CACHE_VERSION)
+
+
+def load_data(file, columns=None, cache=True, parse=None):
+    '''
+    This function loads one of the json files of the project into a typed dataframe.
+
+    INPUT:
+    file: string - path of portfolio.json, profile.json or transcript.json
+    columns: list - names of the columns to load, None loads every column
+    cache: bool - read from the columnar cache of the file, parsing the json
+           only the first time and whenever it changes
+    parse: function - parses the file into a dataframe, None picks it by file name
+
+    OUTPUT:
+    df: dataframe - typed dataframe of the file
+    '''
+    if not cache:
+        df = (parse or PARSERS[os.path.basename(file)])(file)
+        return df if columns is None else df[list(columns)]
+
+    return column_cache.load_columns(file, parse or PARSERS[os.path.basename(file)], columns, CACHE_VERSION)
+
+
+def load_all(data_dir=DATA_DIR, cache=True):
+    '''
+    This function loads portfolio, profile and transcript.
+
+    INPUT:
+    data_dir: string - folder holding the three json files
+    cache: bool - read from the columnar caches of the files
+
+    OUTPUT:
+    portfolio, profile, transcript: dataframes - typed dataframes of the three files
+    '''
+    return tuple(load_data(os.path.join(data_dir, name), cache=cache)
+                 for name in ['portfolio.json', 'profile.json', 'transcript.json'])
+
+
+def count_transact_vals(transcript):
+    '''
+    This function counts the events of a transcript loaded by load_data that
+    carry an offer, an amount or anything else, like the notebook's
+    count_transact_vals does by looking at the keys of every value dictionary.
+
+    OUTPUT:
+    off_sum: int - count of offers
+    amt_sum: int - count of amounts
+    oth_sum: int - count of others
+    '''
+    has_offer = transcript['offer_id'].notna().values
+    has_amount = transcript['amount'].notna().values & ~has_offer
+    off_sum = int(has_offer.sum())
+    amt_sum = int(has_amount.sum())
+    return off_sum, amt_sum, len(transcript) - off_sum - amt_sum
@@ -0,0 +1,79 @@
+"""
+Compares the one-message /go route with the batched /classify endpoint.
+
+Usage: python benchmarks/bench_classify.py [n_requests] [concurrency]
+"""
+import os
+import sys
+import json
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import add_path, latency_summary
+import synthetic
+
+
+def run_requests(send, messages, concurrency):
+    """
+    This function sends every message from a thread pool and returns the
+    throughput in messages per second and the per-request latencies
+    """
+    def one(msg):
+        start = time.perf_counter()
+        send(msg)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(one, messages))
+    elapsed = time.perf_counter() - start
+    return len(messages) / elapsed, latencies
+
+
+def main():
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+    directory = tempfile.mkdtemp()
+    database_filepath, model_filepath = synthetic.disaster_artifacts(directory, 2000)
+    os.environ['DISASTER_DATABASE'] = database_filepath
+    os.environ['DISASTER_MODEL'] = model_filepath
+    add_path('Disaster_Response_Pipeline', 'app')
+    import run
+
+    client = run.app.test_client()
+    messages = synthetic.disaster_messages(n_requests, seed=1)
+
+    def go(msg):
+        assert client.get('/go', query_string={'query': msg}).status_code == 200
+
+    def classify(msg):
+        assert client.post('/classify', json={'messages': [msg]}).status_code == 200
+
+    def classify_ndjson(msgs):
+        body = ''.join(json.dumps(m) + '\n' for m in msgs)
+        resp = client.post('/classify', data=body, content_type='application/x-ndjson')
+        assert len(resp.get_data().splitlines()) == len(msgs)
+
+    # warm up the model and the batcher thread
+    go(messages[0])
+    classify(messages[0])
+
+    report = {}
+    for name, send, workers in [('/go sequential', go, 1),
+                                ('/go concurrent', go, concurrency),
+                                ('/classify concurrent', classify, concurrency)]:
+        throughput, latencies = run_requests(send, messages, workers)
+        report[name] = dict(msgs_per_sec=throughput, **latency_summary(latencies))
+
+    start = time.perf_counter()
+    classify_ndjson(messages)
+    report['/classify ndjson'] = {'msgs_per_sec': n_requests / (time.perf_counter() - start)}
+
+    for name, row in report.items():
+        print('{:<22} '.format(name) + '  '.join('{}={:.1f}'.format(k, v) for k, v in row.items()))
+
+
+if __name__ == '__main__':
+    main()
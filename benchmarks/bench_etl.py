@@ -0,0 +1,66 @@
+"""
+Compares the in-memory ETL of process_data.py with its chunked streaming
+mode. Each mode runs in its own process so peak RSS is measured separately.
+
+Usage: python benchmarks/bench_etl.py [n_rows] [chunksize]
+"""
+import os
+import sys
+import json
+import tempfile
+import subprocess
+
+from common import add_path, peak_rss_mb, timed
+import synthetic
+
+
+def run_mode(mode, messages_filepath, categories_filepath, database_filepath, chunksize):
+    """
+    This function runs one ETL mode in the current process and returns its
+    elapsed seconds and peak RSS
+    """
+    add_path('Disaster_Response_Pipeline', 'data')
+    import process_data
+
+    def in_memory():
+        df = process_data.clean_data(process_data.load_data(messages_filepath, categories_filepath))
+        process_data.save_data(df, database_filepath)
+        return len(df)
+
+    def chunked():
+        return process_data.process_data_chunked(messages_filepath, categories_filepath,
+                                                 database_filepath, chunksize)
+
+    n_rows, elapsed = timed(in_memory if mode == 'in-memory' else chunked)
+    return {'rows': n_rows, 'seconds': elapsed, 'peak_rss_mb': peak_rss_mb()}
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        print(json.dumps(run_mode(*sys.argv[2:6], chunksize=int(sys.argv[6]))))
+        return
+
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    chunksize = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+
+    directory = tempfile.mkdtemp()
+    messages_filepath = os.path.join(directory, 'messages.csv')
+    categories_filepath = os.path.join(directory, 'categories.csv')
+    messages, categories = synthetic.disaster_frames(n_rows)
+    messages.to_csv(messages_filepath, index=False)
+    categories.to_csv(categories_filepath, index=False)
+    del messages, categories
+
+    print('rows: {}  chunksize: {}'.format(n_rows, chunksize))
+    for mode in ['in-memory', 'chunked']:
+        database_filepath = os.path.join(directory, mode + '.db')
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--worker', mode,
+                                          messages_filepath, categories_filepath, database_filepath,
+                                          str(chunksize)])
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        print('{:<10} {:>10.0f} rows/sec  peak RSS {:>7.1f} MB'.format(
+            mode, result['rows'] / result['seconds'], result['peak_rss_mb']))
+
+
+if __name__ == '__main__':
+    main()
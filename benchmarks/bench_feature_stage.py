@@ -0,0 +1,63 @@
+"""
+Compares the feature stage of the previous build_model, where CountVectorizer
+tokenized the messages itself next to a per-call text length list, with the
+shared MessageTokenizer stage at one and at n_jobs worker processes: fit and
+transform times of the features, and whether every variant gives the same
+matrix.
+
+Usage: python benchmarks/bench_feature_stage.py [n_rows] [n_jobs]
+"""
+import os
+import sys
+
+import numpy as np
+
+from common import add_path, timed
+import synthetic
+
+add_path('Disaster_Response_Pipeline', 'models')
+from sklearn.pipeline import FeatureUnion
+from sklearn.preprocessing import FunctionTransformer
+import train_classifier
+from features import text_length_extractor
+from tokenizer import lemmatize
+
+
+def previous_stage():
+    return FeatureUnion([
+        ('nlp_pipeline', train_classifier.build_nlp_pipeline()),
+        ('txt_len', FunctionTransformer(text_length_extractor, validate=False))
+    ])
+
+
+def shared_stage(n_jobs):
+    # the feature steps of build_model, as fitted outside a parallel search
+    return train_classifier.set_pipeline_jobs(train_classifier.build_model().estimator, n_jobs)[:-1]
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    n_jobs = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    messages = np.array(synthetic.disaster_messages(n_rows), dtype=object)
+    print('{} messages, {} cpus'.format(n_rows, os.cpu_count()))
+
+    results = {}
+    for name, stage in [('previous', previous_stage()), ('shared n_jobs=1', shared_stage(1)),
+                        ('shared n_jobs={}'.format(n_jobs), shared_stage(n_jobs))]:
+        stage.set_params(**{key: (1, 2) for key in stage.get_params() if key.endswith('vect__ngram_range')})
+        # every variant starts with a cold lemma cache
+        lemmatize.cache_clear()
+        fitted, fit_time = timed(stage.fit_transform, messages)
+        lemmatize.cache_clear()
+        transformed, transform_time = timed(stage.transform, messages)
+        results[name] = (fit_time, transform_time, fitted, transformed)
+
+    base_fit, base_transform, base_matrix, _ = results['previous']
+    for name, (fit_time, transform_time, fitted, transformed) in results.items():
+        same = (fitted != base_matrix).nnz == 0 and (transformed != base_matrix).nnz == 0
+        print('{:<16} fit {:7.2f}s ({:4.1f}x)  transform {:7.2f}s ({:4.1f}x)  identical: {}'.format(
+            name, fit_time, base_fit / fit_time, transform_time, base_transform / transform_time, same))
+
+
+if __name__ == '__main__':
+    main()
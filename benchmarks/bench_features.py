@@ -0,0 +1,61 @@
+"""
+Compares the vocabulary based TF-IDF features of train_classifier with the
+hashing backend: fit time, f1 scores on a holdout, pickled model size and
+peak RSS, each backend trained in a fresh process.
+
+Usage: python benchmarks/bench_features.py [n_rows] [n_features]
+"""
+import os
+import sys
+import json
+import pickle
+import subprocess
+
+from common import add_path, peak_rss_mb, timed
+import synthetic
+
+
+def worker(backend, n_rows, n_features):
+    add_path('Disaster_Response_Pipeline', 'models')
+    import numpy as np
+    from sklearn.metrics import f1_score
+    import train_classifier
+
+    messages, Y = synthetic.disaster_corpus(n_rows)
+    messages = np.array(messages, dtype=object)
+    n_train = int(n_rows * 0.8)
+    model = train_classifier.build_model(features=backend, n_features=n_features).estimator
+    # the parameters the grid search of train_classifier settles on
+    model.set_params(features__nlp_pipeline__vect__ngram_range=(1, 2),
+                     clf__estimator__n_estimators=10, clf__estimator__min_samples_split=3)
+
+    _, fit = timed(model.fit, messages[:n_train], Y[:n_train])
+    Y_pred, predict = timed(model.predict, messages[n_train:])
+    features = model.named_steps['features']
+    return {
+        'fit_s': fit,
+        'predict_s': predict,
+        'f1_micro': f1_score(Y[n_train:], Y_pred, average='micro'),
+        'f1_macro': f1_score(Y[n_train:], Y_pred, average='macro', zero_division=0),
+        'features_mb': len(pickle.dumps(features)) / 2 ** 20,
+        'model_mb': len(pickle.dumps(model)) / 2 ** 20,
+        'rss_mb': peak_rss_mb()
+    }
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        print(json.dumps(worker(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))))
+        return
+
+    n_rows = sys.argv[1] if len(sys.argv) > 1 else '20000'
+    n_features = sys.argv[2] if len(sys.argv) > 2 else str(2 ** 20)
+    for backend in ['count', 'hashing']:
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--worker',
+                                          backend, n_rows, n_features])
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        print('{:<8} '.format(backend) + '  '.join('{}={:.3f}'.format(k, v) for k, v in result.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Measures the latency of the index page for growing databases, with the
+aggregate cache against recomputing the dashboard from the full table on
+every view as the app used to.
+
+Usage: python benchmarks/bench_index.py [n_requests]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import importlib
+
+import plotly
+from sqlalchemy import create_engine
+
+from common import add_path, latency_summary
+import synthetic
+
+SIZES = [1000, 10000, 100000]
+
+
+def uncached_graph_json(run, df):
+    """
+    This function rebuilds the index page graphs from the full dataframe,
+    the way every page view did before the aggregate cache
+    """
+    genre_counts = df.groupby('genre').count()['message']
+    cat_counts = df[df.columns[4:]].sum().sort_values()
+    num_vars = df.select_dtypes(include=['int']).columns.drop('id')
+    perc_msg_counts = df[num_vars].mean().sort_values(ascending=False).head(10)
+    graphs = run.build_graphs(genre_counts, cat_counts, perc_msg_counts)
+    return json.dumps(graphs, cls=plotly.utils.PlotlyJSONEncoder)
+
+
+def measure(fn, n_requests):
+    latencies = []
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latency_summary(latencies)
+
+
+def main():
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    directory = tempfile.mkdtemp()
+    _, model_filepath = synthetic.disaster_artifacts(directory, 500)
+    os.environ['DISASTER_MODEL'] = model_filepath
+    add_path('Disaster_Response_Pipeline', 'app')
+
+    run = None
+    for n_rows in SIZES:
+        database_filepath = os.path.join(directory, 'index_{}.db'.format(n_rows))
+        df = synthetic.disaster_table(n_rows)
+        df.to_sql('message_category', create_engine('sqlite:///{}'.format(database_filepath)), index=False)
+        os.environ['DISASTER_DATABASE'] = database_filepath
+        run = importlib.import_module('run') if run is None else importlib.reload(run)
+        client = run.app.test_client()
+
+        first = client.get('/')
+        assert uncached_graph_json(run, df) == run.dashboard.get()[1], 'cached graphs differ'
+        etag = first.headers['ETag']
+
+        rows = [
+            ('uncached', measure(lambda: uncached_graph_json(run, df), n_requests)),
+            ('GET /', measure(lambda: client.get('/'), n_requests)),
+            ('GET / 304', measure(lambda: client.get('/', headers={'If-None-Match': etag}), n_requests))
+        ]
+        for name, summary in rows:
+            print('{:>7} rows  {:<10} '.format(n_rows, name) +
+                  '  '.join('{}={:.2f}'.format(k, v) for k, v in summary.items()))
+
+
+if __name__ == '__main__':
+    main()
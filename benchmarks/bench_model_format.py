@@ -0,0 +1,82 @@
+"""
+Compares the model exports: the training pickle, the joblib serving
+artifact and the compact directory (memory-mapped and compressed) on disk
+size, load time and RSS in a fresh process, and checks that the compact
+model predicts exactly what the original pipeline predicts.
+
+Usage: python benchmarks/bench_model_format.py [n_rows] [n_estimators]
+"""
+import os
+import sys
+import json
+import pickle
+import tempfile
+import subprocess
+
+import numpy as np
+
+from common import add_path, peak_rss_mb, timed
+import synthetic
+
+
+def disk_size_mb(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 2 ** 20
+    return os.path.getsize(path) / 2 ** 20
+
+
+def worker(variant, path):
+    add_path('Disaster_Response_Pipeline', 'models')
+    import joblib
+    import model_io
+
+    loaders = {
+        'pickle': lambda: pickle.load(open(path, 'rb')),
+        'serving': lambda: joblib.load(path, mmap_mode='r'),
+        'compact': lambda: model_io.load_compact_model(path),
+        'compact_npz': lambda: model_io.load_compact_model(path)
+    }
+    model, load = timed(loaders[variant])
+    messages = synthetic.disaster_messages(200, seed=1)
+    _, predict = timed(model.predict, messages)
+    return {'load_s': load, 'predict_200_s': predict, 'rss_mb': peak_rss_mb()}
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        print(json.dumps(worker(*sys.argv[2:4])))
+        return
+
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_estimators = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    directory = tempfile.mkdtemp()
+    _, model_filepath = synthetic.disaster_artifacts(directory, n_rows, n_estimators)
+
+    add_path('Disaster_Response_Pipeline', 'models')
+    import model_io
+    pipeline = pickle.load(open(model_filepath, 'rb'))
+    paths = {
+        'pickle': model_filepath,
+        'serving': model_io.export_serving_model(pipeline, model_filepath),
+        'compact': model_io.export_compact_model(pipeline, model_io.compact_filepath(model_filepath)),
+        'compact_npz': model_io.export_compact_model(pipeline, os.path.join(directory, 'npz.compact'),
+                                                     compress=True)
+    }
+
+    # exact equality of labels and probabilities on unseen messages
+    messages = synthetic.disaster_messages(5000, seed=2)
+    compact = model_io.load_compact_model(paths['compact'])
+    labels_equal = np.array_equal(pipeline.predict(messages), compact.predict(messages))
+    proba_equal = all(np.array_equal(a, b) for a, b in
+                      zip(pipeline.predict_proba(messages), compact.predict_proba(messages)))
+    print('identical labels: {}  identical probabilities: {}'.format(labels_equal, proba_equal))
+
+    for variant, path in paths.items():
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--worker', variant, path])
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        result['size_mb'] = disk_size_mb(path)
+        print('{:<12} '.format(variant) + '  '.join('{}={:.3f}'.format(k, v) for k, v in result.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Load-tests the classifier app served by Flask's threaded development server
+and by serve.py, waitress with a pool of model processes. Each
+server runs in its own process on a synthetic database and model, with the
+prediction cache off so every request reaches the model. Clients send /go
+requests over keep-alive connections at rising concurrency, and the
+script reports the requests per second, the tail latency, and the share
+of refused (503) or timed out (504) requests.
+
+Usage: python benchmarks/bench_serving.py [requests_per_level] [workers]
+"""
+import os
+import sys
+import time
+import socket
+import tempfile
+import subprocess
+import http.client
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+
+from common import ROOT, latency_summary
+import synthetic
+
+APP_DIR = os.path.join(ROOT, 'Disaster_Response_Pipeline', 'app')
+CONCURRENCY = (1, 2, 4, 8, 16, 32, 64)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(name, port, env, workers):
+    """
+    This function starts a server process and waits until it answers
+    """
+    if name == 'flask':
+        code = 'import run; run.app.run(host="127.0.0.1", port={}, threaded=True)'.format(port)
+        cmd = [sys.executable, '-c', code]
+    else:
+        cmd = [sys.executable, 'serve.py', '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers)]
+    proc = subprocess.Popen(cmd, cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            # the first /go loads the model
+            conn.request('GET', '/go?query=warmup')
+            conn.getresponse().read()
+            conn.close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError('{} server did not start'.format(name))
+
+
+def load_test(port, messages, concurrency):
+    """
+    This function sends one /go request per message from concurrency
+    clients, each keeping its connection open
+    OUTPUT:
+    requests per second, latencies of the answered requests, count of
+    503 and 504 answers
+    """
+    chunks = [messages[i::concurrency] for i in range(concurrency)]
+
+    def client(chunk):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        latencies, errors = [], 0
+        for msg in chunk:
+            start = time.perf_counter()
+            conn.request('GET', '/go?' + urlencode({'query': msg}))
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status == 200:
+                latencies.append(time.perf_counter() - start)
+            elif resp.status in (503, 504):
+                errors += 1
+            else:
+                raise RuntimeError('unexpected status {}'.format(resp.status))
+            if resp.will_close:
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        conn.close()
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(client, chunks))
+    elapsed = time.perf_counter() - start
+    latencies = [latency for lat, _ in results for latency in lat]
+    return len(messages) / elapsed, latencies, sum(errors for _, errors in results)
+
+
+def main():
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+
+    directory = tempfile.mkdtemp()
+    database_filepath, model_filepath = synthetic.disaster_artifacts(directory, 2000)
+    env = dict(os.environ, DISASTER_DATABASE=database_filepath, DISASTER_MODEL=model_filepath,
+               DISASTER_CACHE_SIZE='0')
+    messages = synthetic.disaster_messages(n_requests, seed=1)
+    print('{} requests per level, {} model processes, {} cpus'.format(n_requests, workers, os.cpu_count()))
+
+    for name in ('flask', 'serve.py'):
+        port = free_port()
+        proc = start_server(name, port, env, workers)
+        try:
+            for concurrency in CONCURRENCY:
+                throughput, latencies, errors = load_test(port, messages, concurrency)
+                summary = latency_summary(latencies) if latencies else {}
+                print('{:<9} c={:<3} req/s={:7.1f}  p50={:7.1f}ms  p99={:7.1f}ms  max={:7.1f}ms  '
+                      '503/504={:.1%}'.format(name, concurrency, throughput, summary.get('p50_ms', 0),
+                                              summary.get('p99_ms', 0), summary.get('max_ms', 0),
+                                              errors / float(len(messages))))
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == '__main__':
+    main()
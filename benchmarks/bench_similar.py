@@ -0,0 +1,77 @@
+"""
+Measures the similar messages lookup of the web app: builds the similarity
+index over the TF-IDF vectors of a synthetic corpus, then compares query
+latency against an exact scan of every vector and reports the recall of the
+index, the share of the exact top k it returns, and its size on disk.
+
+Usage: python benchmarks/bench_similar.py [n_rows] [n_queries] [k]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import numpy as np
+
+from common import add_path, timed, latency_summary, peak_rss_mb
+import synthetic
+
+add_path('Disaster_Response_Pipeline', 'models')
+from sklearn.preprocessing import normalize
+import train_classifier
+from similarity import build_similarity_index, load_similarity_index
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    messages, _ = synthetic.disaster_corpus(n_rows)
+    messages = np.array(messages, dtype=object)
+
+    # the TF-IDF stage of build_model, fitted on a sample like the forests
+    nlp_pipeline = train_classifier.build_nlp_pipeline()
+    nlp_pipeline.set_params(vect__ngram_range=(1, 2))
+    nlp_pipeline.fit(messages[:min(n_rows, 20000)])
+
+    def transform(X):
+        return normalize(nlp_pipeline.transform(X)).astype(np.float32)
+
+    chunks = ((np.arange(i, min(i + 10000, n_rows)) + 1, messages[i:i + 10000]) for i in range(0, n_rows, 10000))
+    index, build_time = timed(build_similarity_index, transform, chunks)
+    directory = os.path.join(tempfile.mkdtemp(), 'classifier.similar')
+    index.save(directory)
+    size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    index = load_similarity_index(directory)
+    print('{} messages, {} features, built in {:.1f}s, {:.1f} MB on disk'.format(
+        n_rows, index.vectors.shape[1], build_time, size / 1e6))
+
+    # queries are edited past messages, so each has true neighbors
+    rng = np.random.RandomState(1)
+    queries = [' '.join(msg.split()[:-1]) for msg in messages[rng.randint(0, n_rows, n_queries)]]
+
+    exact_latencies, index_latencies, recalls = [], [], []
+    for query in queries:
+        vector = transform([query])
+        start = time.perf_counter()
+        scores = (index.vectors @ vector.T).toarray().ravel()
+        exact = np.argsort(-scores, kind='stable')[:k]
+        exact_latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        ids, _ = index.query(vector, k)
+        index_latencies.append(time.perf_counter() - start)
+        # ties at the k-th score count as found
+        recalls.append(np.mean(scores[ids - 1] >= scores[exact[-1]]) * len(ids) / float(k))
+
+    for name, latencies in [('exact scan', exact_latencies), ('index', index_latencies)]:
+        summary = latency_summary(latencies)
+        print('{:<10} p50={:7.2f}ms  p99={:7.2f}ms  max={:7.2f}ms'.format(
+            name, summary['p50_ms'], summary['p99_ms'], summary['max_ms']))
+    print('recall@{} {:.3f}, peak rss {:.0f} MB'.format(k, np.mean(recalls), peak_rss_mb()))
+    shutil.rmtree(os.path.dirname(directory), ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
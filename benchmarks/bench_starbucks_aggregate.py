@@ -0,0 +1,92 @@
+"""
+Measures building the per person table of the Starbucks notebook: the
+update_df loop, which scans the transcript once per person, against
+aggregate.person_summary, and checks that both give the same table. Uses
+profile.json and portfolio.json of the project with a simulated transcript,
+as transcript.json is not checked out.
+
+Usage: python benchmarks/bench_starbucks_aggregate.py [n_people]
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from common import ROOT, add_path, timed
+import synthetic
+
+add_path('Starbucks_Capstone_Project', 'functions')
+import aggregate
+
+DATA_DIR = os.path.join(ROOT, 'Starbucks_Capstone_Project', 'data')
+
+
+def map_offers(portfolio):
+    # the notebook's helpers, unchanged
+    offer_mapper = dict()
+    for i in range(portfolio.shape[0]):
+        offer_mapper[portfolio.iloc[i]['id']] = portfolio.iloc[i]['offer_type']+'_'+portfolio.iloc[i]['difficulty'].astype(str)+'_'+portfolio.iloc[i]['duration'].astype(str)
+    return offer_mapper
+
+
+def preprocess_transcript(transcript):
+    transcript['time'] = transcript['time'].apply(lambda x: x/24 if x != 0 else x)
+    transcript = pd.get_dummies(transcript,columns=['event'])
+    transcript = transcript.join(pd.DataFrame(transcript['value'].values.tolist()))
+    transcript['offer_used'] = (transcript['event_offer completed']+transcript['reward']).apply(
+                                lambda x: 1 if x > 1 else 0)
+    transcript = transcript.sort_values(by=['person','time'])
+    transcript.drop('value',axis=1,inplace=True)
+    transcript = pd.get_dummies(transcript,columns=['offer_id'])
+    return transcript
+
+
+def update_df(i,j,df,new_df,offer_map):
+    offer_received = np.count_nonzero(df['event_offer received'])
+    offer_viewed = np.count_nonzero(df['event_offer viewed'])
+    offer_completed = np.count_nonzero(df['event_offer completed'])
+    offer_transaction = np.count_nonzero(df['event_transaction'])
+    offer_used = np.count_nonzero(df['offer_used'])
+    total_spent = np.sum(df['amount'])
+    total_reward = np.sum(df['reward'])
+    new_df.loc[i,'person'] = j
+    new_df.loc[i,['offer_rec','offer_view','transact','offer_comp','offer_used','total_spent','total_reward']] = offer_received,offer_viewed,offer_transaction,offer_completed,offer_used,total_spent,total_reward
+    for x in aggregate.OFFER_IDS:
+        z = "offer_id_{}".format(x)
+        new_df.loc[i,offer_map[x]] = np.sum(df[z])
+    return new_df
+
+
+def baseline(transcript, person_ids, offer_map):
+    cols = ['person','offer_rec','offer_view','transact','offer_comp','offer_used','total_spent','total_reward']
+    new_df = pd.DataFrame(columns=cols)
+    for i in range(len(person_ids)):
+        j = person_ids[i]
+        temp = transcript[transcript['person']==j]
+        new_df = update_df(i,j,temp,new_df,offer_map)
+    return new_df
+
+
+def main():
+    n_people = int(sys.argv[1]) if len(sys.argv) > 1 else 17000
+    portfolio = pd.read_json(os.path.join(DATA_DIR, 'portfolio.json'), orient='records', lines=True)
+    profile = pd.read_json(os.path.join(DATA_DIR, 'profile.json'), orient='records', lines=True)
+    person_ids = profile['id'].values[:n_people]
+    transcript = preprocess_transcript(synthetic.starbucks_transcript(person_ids, portfolio))
+    offer_map = map_offers(portfolio)
+    print('{} people, {} events'.format(len(person_ids), len(transcript)))
+
+    before, before_time = timed(baseline, transcript, person_ids, offer_map)
+    after, after_time = timed(aggregate.person_summary, transcript, person_ids, offer_map)
+
+    # the loop fills object columns, compare the values
+    before = before.infer_objects()
+    same = before.columns.equals(after.columns) and all(
+        np.array_equal(before[col].values.astype(after[col].dtype), after[col].values) for col in after)
+    print('update_df loop {:.2f}s  person_summary {:.4f}s  speedup {:.0f}x  identical: {}'.format(
+        before_time, after_time, before_time / after_time, same))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Measures the feature encoding steps of the Starbucks notebook, which apply a
+Python function per row, against the vectorized encoders of encode.py, and
+checks that both give the same values. The frames are profile.json and
+portfolio.json of the project and a simulated transcript, repeated scale
+times (10 by default), as transcript.json is not checked out.
+
+Usage: python benchmarks/bench_starbucks_encode.py [scale]
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from common import ROOT, add_path, timed
+import synthetic
+
+add_path('Starbucks_Capstone_Project', 'functions')
+import encode
+
+DATA_DIR = os.path.join(ROOT, 'Starbucks_Capstone_Project', 'data')
+
+
+# the notebook's helpers, unchanged
+def map_offers(portfolio):
+    offer_mapper = dict()
+    for i in range(portfolio.shape[0]):
+        offer_mapper[portfolio.iloc[i]['id']] = portfolio.iloc[i]['offer_type']+'_'+portfolio.iloc[i]['difficulty'].astype(str)+'_'+portfolio.iloc[i]['duration'].astype(str)
+    return offer_mapper
+
+
+def one_hot(portfolio):
+    for ch in ['email','mobile','social','web']:
+        portfolio[ch] = portfolio['channels'].apply(lambda x: int(ch in x))
+    portfolio.drop('channels',axis=1,inplace=True)
+    return portfolio
+
+
+def add_group(df,col,x,y):
+    new_col = df[col].apply(lambda val: 1 if ((val >= x) & (val <= y)) else 0)
+    return new_col
+
+
+def groups_before(profile):
+    out = pd.DataFrame(index=profile.index)
+    for i in range(10,120,10):
+        out['age_{}_{}'.format(i,i+9)] = add_group(profile,'age',i, i+9)
+    for x,y in zip(range(21000,111001,10000),range(30000,120001,10000)):
+        out['income_{}_{}'.format(x,y)] = add_group(profile,'income',x,y)
+    return out
+
+
+def groups_after(profile):
+    return encode.bin_indicators(profile['age'], encode.AGE_GROUPS).join(
+        encode.bin_indicators(profile['income'], encode.INCOME_GROUPS))
+
+
+def transforms_before(transcript):
+    time = transcript['time'].apply(lambda x: x/24 if x != 0 else x)
+    used = (transcript['event_offer completed']+transcript['reward']).apply(lambda x: 1 if x > 1 else 0)
+    return time, used
+
+
+def transforms_after(transcript):
+    return (encode.hours_to_days(transcript['time']),
+            encode.offer_used(transcript['event_offer completed'], transcript['reward']))
+
+
+def repeat(df, scale):
+    return pd.concat([df] * scale, ignore_index=True)
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    portfolio = pd.read_json(os.path.join(DATA_DIR, 'portfolio.json'), orient='records', lines=True)
+    profile = pd.read_json(os.path.join(DATA_DIR, 'profile.json'), orient='records', lines=True)
+    transcript = synthetic.starbucks_transcript(profile['id'].values, portfolio)
+    # the columns the transforms read, as the notebook has them at that point
+    transcript = pd.get_dummies(transcript, columns=['event']).join(
+        pd.DataFrame(transcript['value'].values.tolist()))
+    transcript = repeat(transcript.drop('value', axis=1), scale)
+    portfolio, profile = repeat(portfolio, scale), repeat(profile, scale)
+    print('x{}: {} offers, {} people, {} events'.format(scale, len(portfolio), len(profile), len(transcript)))
+
+    steps = [
+        ('one_hot', lambda: one_hot(portfolio.copy()), lambda: encode.one_hot(portfolio)),
+        ('map_offers', lambda: map_offers(portfolio), lambda: encode.map_offers(portfolio)),
+        ('age/income groups', lambda: groups_before(profile), lambda: groups_after(profile)),
+        ('time/offer_used', lambda: transforms_before(transcript), lambda: transforms_after(transcript)),
+    ]
+    for name, before_fn, after_fn in steps:
+        before, before_time = timed(before_fn)
+        after, after_time = timed(after_fn)
+        if isinstance(before, dict):
+            same = before == after
+        elif isinstance(before, tuple):
+            same = all(np.array_equal(b.values, a.values) for b, a in zip(before, after))
+        else:
+            same = before.columns.equals(after.columns) and all(
+                np.array_equal(before[col].values, after[col].values) for col in before)
+        print('{:<18} apply {:8.3f}s  vectorized {:.4f}s  speedup {:6.0f}x  identical: {}'.format(
+            name, before_time, after_time, before_time / after_time, same))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Measures reading the Starbucks event log: pd.read_json with the flattening
+of the value column and the count_transact_vals loop of the notebook,
+against parsing with load.parse_transcript and reading its columnar cache,
+and checks that both give the same values. Every variant runs in a fresh
+process. A simulated transcript.json is written as it is not checked out.
+
+Usage: python benchmarks/bench_starbucks_load.py [n_people]
+"""
+import os
+import sys
+import json
+import tempfile
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+from common import ROOT, add_path, peak_rss_mb, timed
+import synthetic
+
+add_path('Starbucks_Capstone_Project', 'functions')
+import load
+
+DATA_DIR = os.path.join(ROOT, 'Starbucks_Capstone_Project', 'data')
+
+
+def count_transact_vals(transcript,col):
+    # the notebook's helper, unchanged
+    off_sum = 0
+    amt_sum =0
+    oth_sum =0
+    for i in transcript[col]:
+        if 'offer id' in i.keys() or 'offer_id' in i.keys():
+            off_sum += 1
+        elif 'amount' in i.keys():
+            amt_sum += 1
+        else:
+            oth_sum += 1
+    return off_sum,amt_sum,oth_sum
+
+
+def read_before(file):
+    transcript = pd.read_json(file, orient='records', lines=True)
+    counts = count_transact_vals(transcript, 'value')
+    transcript = transcript.join(pd.DataFrame(transcript['value'].values.tolist()))
+    return transcript.drop('value', axis=1), counts
+
+
+def read_after(file, cache):
+    transcript = load.load_data(file, cache=cache)
+    return transcript, load.count_transact_vals(transcript)
+
+
+def write_transcript(directory, n_people):
+    profile = pd.read_json(os.path.join(DATA_DIR, 'profile.json'), orient='records', lines=True)
+    portfolio = pd.read_json(os.path.join(DATA_DIR, 'portfolio.json'), orient='records', lines=True)
+    person_ids = np.resize(profile['id'].values, n_people)
+    if n_people > len(profile):
+        person_ids = ['{}_{}'.format(p, i // len(profile)) for i, p in enumerate(person_ids)]
+    transcript = synthetic.starbucks_transcript(person_ids, portfolio)
+    file = os.path.join(directory, 'transcript.json')
+    transcript.to_json(file, orient='records', lines=True)
+    return file
+
+
+def worker(variant, file):
+    variants = {'read_json': lambda: read_before(file),
+                'parse': lambda: read_after(file, cache=False),
+                'cache': lambda: read_after(file, cache=True)}
+    (transcript, counts), seconds = timed(variants[variant])
+    return {'seconds': seconds, 'rss_mb': peak_rss_mb(),
+            'frame_mb': transcript.memory_usage(deep=True).sum() / 2 ** 20, 'counts': counts}
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        print(json.dumps(worker(*sys.argv[2:4])))
+        return
+
+    n_people = int(sys.argv[1]) if len(sys.argv) > 1 else 17000
+    file = write_transcript(tempfile.mkdtemp(), n_people)
+    print('{}: {:.0f} MB'.format(file, os.path.getsize(file) / 2 ** 20))
+    _, build = timed(load.build_cache, file)
+    print('building the cache once: {:.2f}s'.format(build))
+
+    for variant in ['read_json', 'parse', 'cache']:
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--worker', variant, file])
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        print('{:<10} counts={} '.format(variant, result.pop('counts')) +
+              '  '.join('{}={:.3f}'.format(k, v) for k, v in result.items()))
+
+    before, _ = read_before(file)
+    after, _ = read_after(file, cache=True)
+    offer_id = before['offer_id'].fillna(before['offer id']).fillna('')
+    same = (np.array_equal(before['person'].values, after['person'].astype(object).values) and
+            np.array_equal(before['event'].values, after['event'].astype(object).values) and
+            np.array_equal(before['time'].values, after['time'].values) and
+            np.array_equal(offer_id.values, after['offer_id'].astype(object).fillna('').values) and
+            np.allclose(before['amount'].values, after['amount'].values, equal_nan=True) and
+            np.array_equal(before['reward'].values, after['reward'].values, equal_nan=True))
+    print('identical values: {}'.format(same))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Measures web app worker startup time and RSS: loading the whole table and
+the full GridSearchCV pickle at import, as the app used to, against the lazy
+startup that keeps only category names and loads the serving artifact on
+the first request. Every variant runs in a fresh process.
+
+Usage: python benchmarks/bench_startup.py [n_rows]
+"""
+import os
+import sys
+import json
+import pickle
+import tempfile
+import subprocess
+
+from common import add_path, peak_rss_mb, timed
+import synthetic
+
+
+def worker(variant, database_filepath, model_filepath):
+    os.environ['DISASTER_DATABASE'] = database_filepath
+    os.environ['DISASTER_MODEL'] = model_filepath
+    add_path('Disaster_Response_Pipeline', 'app')
+    add_path('Disaster_Response_Pipeline', 'models')
+
+    def eager():
+        import joblib
+        import pandas as pd
+        from sqlalchemy import create_engine
+        import run
+        df = pd.read_sql_table('message_category', create_engine('sqlite:///' + database_filepath))
+        return df, joblib.load(model_filepath)
+
+    def lazy():
+        import run
+        return run
+
+    _, startup = timed(eager if variant == 'eager' else lazy)
+    result = {'startup_s': startup, 'startup_rss_mb': peak_rss_mb()}
+    if variant == 'lazy':
+        import run
+        _, first = timed(run.app.test_client().get, '/go', query_string={'query': 'we need water'})
+        result.update({'first_request_s': first, 'serving_rss_mb': peak_rss_mb()})
+    return result
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        print(json.dumps(worker(*sys.argv[2:5])))
+        return
+
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    directory = tempfile.mkdtemp()
+    database_filepath, model_filepath = synthetic.disaster_artifacts(directory, n_rows)
+
+    # wrap the pipeline in a fitted search object, like train_classifier saves it
+    add_path('Disaster_Response_Pipeline', 'models')
+    from sklearn.model_selection import GridSearchCV
+    from model_io import export_serving_model
+    pipeline = pickle.load(open(model_filepath, 'rb'))
+    search = GridSearchCV(pipeline, {'clf__estimator__min_samples_split': [2]}, cv=2)
+    search.fit(synthetic.disaster_messages(n_rows)[:2000], synthetic.disaster_labels(2000))
+    search.best_estimator_ = pipeline
+    pickle.dump(search, open(model_filepath, 'wb'))
+    export_serving_model(search, model_filepath)
+
+    for variant in ['eager', 'lazy']:
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--worker', variant,
+                                          database_filepath, model_filepath])
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        print('{:<6} '.format(variant) + '  '.join('{}={:.2f}'.format(k, v) for k, v in result.items()))
+
+
+if __name__ == '__main__':
+    main()
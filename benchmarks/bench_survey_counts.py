@@ -0,0 +1,73 @@
+"""
+Measures clean_and_plot on the multi-select questions of the 2018 survey:
+the previous per-value, per-row substring loop of total_count against the
+sparse indicator counting, and lists the items whose counts differ because
+the loop also counted substrings ("Java" inside "JavaScript").
+
+Usage: python benchmarks/bench_survey_counts.py [n_rows]
+"""
+import os
+import sys
+from collections import defaultdict
+
+import pandas as pd
+
+from common import ROOT, add_path, timed
+import synthetic
+
+add_path('Starbucks_Capstone_Project', 'functions')
+import func
+
+
+def baseline_total_count(df, col1, col2, look_for):
+    # total_count as it was before the indicator matrix
+    new_df = defaultdict(int)
+    for val in look_for:
+        for idx in range(df.shape[0]):
+            if val in df[col1][idx]:
+                new_df[val] += int(df[col2][idx])
+    new_df = pd.DataFrame(pd.Series(new_df)).reset_index()
+    new_df.columns = [col1,col2]
+    new_df.sort_values('count',ascending=False,inplace=True)
+    return new_df
+
+
+def load_survey(n_rows):
+    """
+    This function returns the 2018 survey when the real file is checked out,
+    falling back to a synthetic frame with the same multi-select columns
+    """
+    filepath = os.path.join(ROOT, 'blogpost', 'stackoverflowsurvey', 'data', '2018', 'survey_results_public.csv')
+    try:
+        df = pd.read_csv(filepath, usecols=['Respondent'] + list(synthetic.SURVEY_OPTIONS), low_memory=False)
+    except (IOError, ValueError):
+        df = synthetic.survey_frame(n_rows or 98855)
+    return df.head(n_rows) if n_rows else df
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    df = load_survey(n_rows)
+    print('{} respondents'.format(df.shape[0]))
+
+    total_before = total_after = 0
+    for col in synthetic.SURVEY_OPTIONS:
+        possible_vals = func.unique_vals(df, col)
+        study = df[col].value_counts().reset_index()
+        study.columns = [col, 'count']
+        before, before_time = timed(baseline_total_count, study, col, 'count', possible_vals)
+        after, after_time = timed(func.total_count, study, col, 'count', possible_vals)
+        total_before += before_time
+        total_after += after_time
+
+        diff = before.set_index(col)['count'] - after.set_index(col)['count']
+        print('{:<20} loop {:7.3f}s  indicator {:7.4f}s  speedup {:6.0f}x  substring overcounts: {}'.format(
+            col, before_time, after_time, before_time / after_time, {k: int(v) for k, v in diff[diff != 0].items()}))
+
+    _, multi_time = timed(func.multi_value_counts, df, list(synthetic.SURVEY_OPTIONS))
+    print('all columns: loop {:.3f}s  indicator {:.4f}s  multi_value_counts {:.4f}s'.format(
+        total_before, total_after, multi_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Measures importing func.py of the survey blog post and loading the 2018
+survey: the previous import, which parsed both csv files, against the lazy
+import, and a full csv parse against the columnar cache of load_data. Every
+variant runs in a fresh process. A synthetic csv with the size and column
+count of the 2018 survey is used when the real file is not checked out.
+
+Usage: python benchmarks/bench_survey_load.py [n_rows]
+"""
+import os
+import sys
+import json
+import tempfile
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+from common import ROOT, add_path, peak_rss_mb, timed
+import synthetic
+
+QUESTIONS = list(synthetic.SURVEY_OPTIONS)
+
+
+def write_survey(directory, n_rows, n_columns=129, seed=0):
+    """
+    This function writes a survey and a schema csv with n_columns columns:
+    the multi-select questions, single choice questions and numbers
+    """
+    rng = np.random.RandomState(seed)
+    df = synthetic.survey_frame(n_rows, seed)
+    for i in range(n_columns - df.shape[1]):
+        if i % 8 == 0:
+            df['Number{}'.format(i)] = np.where(rng.rand(n_rows) < 0.3, np.nan, rng.lognormal(10, 1, n_rows))
+        else:
+            options = ['Answer {} to question {}'.format(j, i) for j in range(rng.randint(3, 20))]
+            df['Question{}'.format(i)] = np.where(rng.rand(n_rows) < 0.2, None, rng.choice(options, n_rows))
+    survey_file = os.path.join(directory, 'survey_results_public.csv')
+    schema_file = os.path.join(directory, 'survey_results_schema.csv')
+    df.to_csv(survey_file, index=False)
+    pd.DataFrame({'Column': df.columns, 'QuestionText': ['Question about {}'.format(c) for c in df.columns]}) \
+        .to_csv(schema_file, index=False)
+    return survey_file, schema_file
+
+
+def worker(variant, survey_file, schema_file):
+    add_path('blogpost', 'stackoverflowsurvey')
+
+    def import_before():
+        import func
+        # what the module used to do at import time
+        return pd.read_csv(survey_file, low_memory=False), pd.read_csv(schema_file)
+
+    def import_lazy():
+        import func
+        return func
+
+    # the loading variants do not pay for importing matplotlib and seaborn
+    if not variant.startswith('import'):
+        import func
+
+    def csv_questions():
+        return pd.read_csv(survey_file, low_memory=False)[QUESTIONS]
+
+    def cache_questions():
+        return func.load_data(survey_file, columns=QUESTIONS)
+
+    def cache_all():
+        return func.load_data(survey_file)
+
+    variants = {'import_before': import_before, 'import_lazy': import_lazy, 'csv_questions': csv_questions,
+                'cache_questions': cache_questions, 'cache_all': cache_all}
+    result, seconds = timed(variants[variant])
+    out = {'seconds': seconds, 'rss_mb': peak_rss_mb()}
+    if isinstance(result, pd.DataFrame):
+        out['frame_mb'] = result.memory_usage(deep=True).sum() / 2 ** 20
+    return out
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        print(json.dumps(worker(*sys.argv[2:5])))
+        return
+
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 98855
+    data_dir = os.path.join(ROOT, 'blogpost', 'stackoverflowsurvey', 'data', '2018')
+    survey_file = os.path.join(data_dir, 'survey_results_public.csv')
+    schema_file = os.path.join(data_dir, 'survey_results_schema.csv')
+    try:
+        pd.read_csv(survey_file, usecols=QUESTIONS, nrows=1)
+    except (IOError, ValueError):
+        survey_file, schema_file = write_survey(tempfile.mkdtemp(), n_rows)
+    print('{}: {:.0f} MB'.format(survey_file, os.path.getsize(survey_file) / 2 ** 20))
+
+    add_path('blogpost', 'stackoverflowsurvey')
+    import func
+    _, build = timed(func.build_cache, survey_file)
+    print('building the cache once: {:.2f}s'.format(build))
+
+    for variant in ['import_before', 'import_lazy', 'csv_questions', 'cache_questions', 'cache_all']:
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--worker', variant,
+                                          survey_file, schema_file])
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        print('{:<16} '.format(variant) + '  '.join('{}={:.3f}'.format(k, v) for k, v in result.items()))
+
+
+if __name__ == '__main__':
+    main()
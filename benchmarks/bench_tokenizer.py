@@ -0,0 +1,68 @@
+"""
+Measures tokens per second of the shared tokenizer against the previous
+per-token stopword and lemmatizer construction.
+
+Usage: python benchmarks/bench_tokenizer.py [n_messages]
+"""
+import os
+import re
+import sys
+
+import pandas as pd
+
+from common import ROOT, add_path, timed
+import synthetic
+
+add_path('Disaster_Response_Pipeline', 'models')
+from nltk.corpus import stopwords
+from nltk.tokenize import word_tokenize
+from nltk.stem import WordNetLemmatizer
+import tokenizer
+
+
+def baseline_tokenize(text):
+    # tokenize as train_classifier did before the shared tokenizer module
+    text = re.sub(r"[^a-zA-Z0-9]", " ", text.lower()).strip()
+    tokens = word_tokenize(text)
+    return [WordNetLemmatizer().lemmatize(word) for word in tokens if word not in stopwords.words('english')]
+
+
+def load_messages(n_messages):
+    """
+    This function returns messages from disaster_messages.csv when the real
+    file is checked out, falling back to synthetic messages
+    """
+    filepath = os.path.join(ROOT, 'Disaster_Response_Pipeline', 'data', 'disaster_messages.csv')
+    try:
+        messages = pd.read_csv(filepath)['message'].tolist()
+    except (IOError, KeyError, pd.errors.ParserError):
+        messages = synthetic.disaster_messages(n_messages)
+    return messages[:n_messages]
+
+
+def main():
+    n_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    messages = load_messages(n_messages)
+
+    # warm up nltk's lazy corpus loaders so neither run pays for them
+    for msg in messages[:100]:
+        baseline_tokenize(msg)
+        tokenizer.tokenize(msg)
+    tokenizer.lemmatize.cache_clear()
+
+    # time both runs before keeping any output alive, so the garbage
+    # collector does not charge the second run for the first one's lists
+    _, before_time = timed(lambda: [len(baseline_tokenize(m)) for m in messages])
+    counts, after_time = timed(lambda: [len(tokenizer.tokenize(m)) for m in messages])
+    for msg in messages:
+        assert baseline_tokenize(msg) == tokenizer.tokenize(msg), 'shared tokenizer output differs from the baseline'
+
+    n_tokens = sum(counts)
+    print('messages: {}  tokens: {}'.format(len(messages), n_tokens))
+    print('before: {:>12.0f} tokens/sec'.format(n_tokens / before_time))
+    print('after:  {:>12.0f} tokens/sec  ({:.1f}x)'.format(n_tokens / after_time, before_time / after_time))
+    print('lemma cache: {}'.format(tokenizer.lemmatize.cache_info()))
+
+
+if __name__ == '__main__':
+    main()
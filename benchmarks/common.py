@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import resource
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def add_path(*parts):
+    """
+    This function makes a project directory importable from a benchmark
+    INPUT:
+    parts - path components relative to the repository root
+    OUTPUT:
+    path - absolute path that was added to sys.path
+    """
+    path = os.path.join(ROOT, *parts)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return path
+
+
+def peak_rss_mb():
+    """
+    This function returns the peak resident set size of the process in MB
+    """
+    # VmHWM is reset by exec, unlike ru_maxrss which a subprocess inherits
+    # from the process that forked it
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except IOError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS reports bytes
+    if sys.platform == 'darwin':
+        return peak / 1024.0 / 1024.0
+    return peak / 1024.0
+
+
+def timed(fn, *args, **kwargs):
+    """
+    This function calls fn and returns its result with the elapsed seconds
+    """
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def latency_summary(latencies):
+    """
+    This function summarizes a list of latencies given in seconds
+    OUTPUT:
+    dict with mean, p50, p99 and max in milliseconds
+    """
+    ms = np.asarray(latencies) * 1000.0
+    return {
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max())
+    }
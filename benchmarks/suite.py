@@ -0,0 +1,341 @@
+"""
+Runs the hot paths of the three projects on synthetic data at several sizes
+and writes wall time, throughput and peak memory of every case to a JSON
+file, so results of two commits can be compared to catch regressions. Every
+case and size runs in a fresh process, so peak memory is not inherited from
+an earlier case. Nothing is downloaded: the data generators of synthetic.py
+follow the schema of each data set.
+
+Usage:
+    python benchmarks/suite.py run [--cases etl.clean_data,...] [--quick] [--output results.json]
+    python benchmarks/suite.py compare baseline.json results.json [--threshold 0.2]
+    python benchmarks/suite.py list
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+from common import ROOT, add_path, peak_rss_mb
+import synthetic
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+
+def setup_clean_data(size):
+    add_path('Disaster_Response_Pipeline', 'data')
+    import process_data
+    messages, categories = synthetic.disaster_frames(size)
+    df = messages.merge(categories, on='id')
+    # clean_data drops the categories column in place
+    return lambda: process_data.clean_data(df.copy())
+
+
+def setup_tokenize(size):
+    add_path('Disaster_Response_Pipeline', 'models')
+    import tokenizer
+    messages = synthetic.disaster_messages(size)
+
+    def run():
+        # every repeat starts with an empty lemma cache, like a fresh process
+        tokenizer.lemmatize.cache_clear()
+        return [tokenizer.tokenize(msg) for msg in messages]
+    return run
+
+
+def trainable_model(n_estimators=10):
+    add_path('Disaster_Response_Pipeline', 'models')
+    import train_classifier
+    model = train_classifier.build_model().estimator
+    return model.set_params(clf__estimator__n_estimators=n_estimators, clf__estimator__random_state=0)
+
+
+def setup_fit(size):
+    messages, Y = synthetic.disaster_corpus(size)
+    model = trainable_model()
+    return lambda: model.fit(messages, Y)
+
+
+def setup_predict(size):
+    messages, Y = synthetic.disaster_corpus(2000)
+    model = trainable_model().fit(messages, Y)
+    X, _ = synthetic.disaster_corpus(size, seed=1)
+    return lambda: model.predict(X)
+
+
+def disaster_app(n_rows=2000, cache_size=0):
+    directory = tempfile.mkdtemp()
+    database_filepath, model_filepath = synthetic.disaster_artifacts(directory, n_rows)
+    os.environ['DISASTER_DATABASE'] = database_filepath
+    os.environ['DISASTER_MODEL'] = model_filepath
+    # run.py reads the cache size when it is imported, 0 sends every request to the model
+    os.environ['DISASTER_CACHE_SIZE'] = str(cache_size)
+    add_path('Disaster_Response_Pipeline', 'app')
+    import run
+    return run
+
+
+def setup_go(size):
+    run = disaster_app()
+    client = run.app.test_client()
+    queries = synthetic.disaster_messages(size, seed=1)
+    # load the model outside the measurement
+    client.get('/go', query_string={'query': queries[0]})
+    return lambda: [client.get('/go', query_string={'query': query}) for query in queries]
+
+
+def setup_cache_hits(size):
+    run = disaster_app(cache_size=10000)
+    client = run.app.test_client()
+    queries = synthetic.disaster_messages(size, seed=1)
+    # every measured request is answered from the prediction cache
+    for query in queries:
+        client.get('/go', query_string={'query': query})
+    return lambda: [client.get('/go', query_string={'query': query}) for query in queries]
+
+
+def setup_index(size):
+    directory = tempfile.mkdtemp()
+    _, model_filepath = synthetic.disaster_artifacts(directory, 500)
+    database_filepath = os.path.join(directory, 'index.db')
+    from sqlalchemy import create_engine
+    synthetic.disaster_table(size).to_sql('message_category', create_engine('sqlite:///{}'.format(database_filepath)),
+                                          index=False)
+    os.environ['DISASTER_DATABASE'] = database_filepath
+    os.environ['DISASTER_MODEL'] = model_filepath
+    add_path('Disaster_Response_Pipeline', 'app')
+    import run
+
+    client = run.app.test_client()
+
+    def view():
+        # forget the cached graphs, as a change of the database does
+        run.dashboard._value = None
+        return client.get('/')
+    return view
+
+
+def setup_total_count(size):
+    add_path('Starbucks_Capstone_Project', 'functions')
+    import func
+    df = synthetic.survey_frame(size)
+    columns = list(synthetic.SURVEY_OPTIONS)
+
+    def run():
+        # what clean_and_plot does before plotting
+        for col in columns:
+            study = df[col].value_counts().reset_index()
+            study.columns = [col, 'count']
+            func.total_count(study, col, 'count', synthetic.SURVEY_OPTIONS[col])
+    return run
+
+
+def setup_unique_vals(size):
+    add_path('Starbucks_Capstone_Project', 'functions')
+    import func
+    df = synthetic.survey_frame(size)
+    return lambda: func.unique_vals(df, list(synthetic.SURVEY_OPTIONS))
+
+
+def setup_person_summary(size):
+    add_path('Starbucks_Capstone_Project', 'functions')
+    import encode
+    import aggregate
+    data_dir = os.path.join(ROOT, 'Starbucks_Capstone_Project', 'data')
+    portfolio = pd.read_json(os.path.join(data_dir, 'portfolio.json'), orient='records', lines=True)
+    profile = pd.read_json(os.path.join(data_dir, 'profile.json'), orient='records', lines=True)
+    person_ids = np.resize(profile['id'].values, size)
+    if size > len(profile):
+        person_ids = np.array(['{}_{}'.format(p, i // len(profile)) for i, p in enumerate(person_ids)])
+    transcript = encode.preprocess_transcript(synthetic.starbucks_transcript(person_ids, portfolio))
+    offer_map = encode.map_offers(portfolio)
+    return lambda: aggregate.person_summary(transcript, person_ids, offer_map)
+
+
+# name: (setup function taking the size and returning the call to measure,
+#        unit counted by the size, sizes, sizes of --quick)
+CASES = {
+    'etl.clean_data': (setup_clean_data, 'rows', [10000, 100000, 500000], [1000, 10000]),
+    'train.tokenize': (setup_tokenize, 'messages', [1000, 10000, 50000], [500, 2000]),
+    'train.fit': (setup_fit, 'messages', [1000, 5000, 10000], [300, 1000]),
+    'train.predict': (setup_predict, 'messages', [100, 1000, 10000], [100, 1000]),
+    'app.go': (setup_go, 'requests', [10, 100, 200], [10, 50]),
+    'app.cache_hits': (setup_cache_hits, 'requests', [10, 100, 200], [10, 50]),
+    'app.index': (setup_index, 'rows', [1000, 100000, 300000], [1000, 10000]),
+    'survey.total_count': (setup_total_count, 'rows', [10000, 98855, 500000], [1000, 10000]),
+    'survey.unique_vals': (setup_unique_vals, 'rows', [10000, 98855, 500000], [1000, 10000]),
+    'starbucks.person_summary': (setup_person_summary, 'people', [1700, 17000, 170000], [500, 2000]),
+}
+
+
+def measure(case, size, repeat):
+    """
+    This function runs one case at one size in the current process
+    INPUT:
+    case - string - name of the case in CASES
+    size - int - data size
+    repeat - int - number of timed calls, the median is reported
+    OUTPUT:
+    result - dict of the measurements
+    """
+    setup, unit, _, _ = CASES[case]
+    fn = setup(size)
+    rss_before = peak_rss_mb()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    seconds = float(np.median(times))
+    return {
+        'case': case,
+        'size': size,
+        'unit': unit,
+        'repeat': repeat,
+        'seconds': seconds,
+        'min_seconds': float(min(times)),
+        'throughput': size / seconds if seconds > 0 else float('inf'),
+        'peak_rss_mb': peak_rss_mb(),
+        # how much the measured calls raised the peak above what setup used
+        'call_peak_growth_mb': peak_rss_mb() - rss_before
+    }
+
+
+def git_commit():
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                         stderr=subprocess.DEVNULL)
+        dirty = subprocess.call(['git', 'diff', '--quiet', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL)
+        return output.decode().strip() + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """
+    This function describes where the results were measured
+    """
+    import sklearn
+    return {
+        'commit': git_commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__
+    }
+
+
+def run_suite(cases, quick, repeat, output):
+    """
+    This function measures every case and size in its own process and writes
+    the results to output
+    """
+    results = []
+    for case in cases:
+        _, _, sizes, quick_sizes = CASES[case]
+        for size in (quick_sizes if quick else sizes):
+            command = [sys.executable, os.path.abspath(__file__), 'worker', case, str(size), str(repeat)]
+            process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            lines = process.stdout.decode().strip().splitlines()
+            if process.returncode != 0 or not lines:
+                error = process.stderr.decode().strip().splitlines()
+                result = {'case': case, 'size': size, 'error': error[-1] if error else 'failed'}
+                print('{:<26} {:>8}  error: {}'.format(case, size, result['error']))
+            else:
+                result = json.loads(lines[-1])
+                print('{:<26} {:>8}  {:>9.4f}s  {:>12.1f} {}/s  peak {:>7.1f} MB'.format(
+                    case, size, result['seconds'], result['throughput'], result['unit'], result['peak_rss_mb']))
+            results.append(result)
+
+    report = {'environment': environment(), 'results': results}
+    directory = os.path.dirname(os.path.abspath(output))
+    os.makedirs(directory, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('results written to {}'.format(output))
+    return report
+
+
+def compare(baseline_path, current_path, threshold):
+    """
+    This function prints the change of every case between two result files
+    OUTPUT:
+    regressions - list of (case, size) that got slower or used more memory by
+                  more than threshold
+    """
+    def by_key(path):
+        with open(path) as f:
+            report = json.load(f)
+        return report['environment'], {(r['case'], r['size']): r for r in report['results'] if 'error' not in r}
+
+    base_env, base = by_key(baseline_path)
+    curr_env, curr = by_key(current_path)
+    print('baseline {} -> current {}'.format(base_env.get('commit'), curr_env.get('commit')))
+    regressions = []
+    for key in sorted(set(base) & set(curr)):
+        time_ratio = curr[key]['seconds'] / max(base[key]['seconds'], 1e-9)
+        memory_ratio = curr[key]['peak_rss_mb'] / max(base[key]['peak_rss_mb'], 1e-9)
+        flag = ''
+        if time_ratio > 1 + threshold or memory_ratio > 1 + threshold:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        print('{:<26} {:>8}  time x{:.2f}  peak memory x{:.2f}{}'.format(key[0], key[1], time_ratio,
+                                                                        memory_ratio, flag))
+    for key in sorted(set(base) ^ set(curr)):
+        print('{:<26} {:>8}  only in {}'.format(key[0], key[1], 'baseline' if key in base else 'current'))
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Benchmark suite of the disaster response, survey and '
+                                                 'Starbucks pipelines.')
+    commands = parser.add_subparsers(dest='command')
+    run = commands.add_parser('run', help='measure the cases and write a JSON result file')
+    run.add_argument('--cases', default=','.join(CASES),
+                     help='comma separated case names or prefixes, e.g. train,app.go')
+    run.add_argument('--quick', action='store_true', help='only run the small sizes')
+    run.add_argument('--repeat', type=int, default=3, help='timed calls per case and size')
+    run.add_argument('--output', default=None,
+                     help='result file, default benchmarks/results/<commit>.json')
+    cmp = commands.add_parser('compare', help='compare two result files')
+    cmp.add_argument('baseline')
+    cmp.add_argument('current')
+    cmp.add_argument('--threshold', type=float, default=0.2,
+                     help='relative slowdown or memory growth reported as a regression')
+    commands.add_parser('list', help='list the cases and their sizes')
+    worker = commands.add_parser('worker')
+    worker.add_argument('case')
+    worker.add_argument('size', type=int)
+    worker.add_argument('repeat', type=int)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    if args.command == 'worker':
+        print(json.dumps(measure(args.case, args.size, args.repeat)))
+    elif args.command == 'run':
+        selected = [name for name in CASES if any(name.startswith(c) for c in args.cases.split(','))]
+        output = args.output or os.path.join(RESULTS_DIR, '{}.json'.format(git_commit() or 'results'))
+        run_suite(selected, args.quick, args.repeat, output)
+    elif args.command == 'compare':
+        sys.exit(1 if compare(args.baseline, args.current, args.threshold) else 0)
+    elif args.command == 'list':
+        for name, (_, unit, sizes, quick_sizes) in CASES.items():
+            print('{:<26} {:<9} sizes {}  quick {}'.format(name, unit, sizes, quick_sizes))
+    else:
+        parse_args(['--help'])
+
+
+if __name__ == '__main__':
+    main()
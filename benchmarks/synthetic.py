@@ -0,0 +1,247 @@
+import numpy as np
+import pandas as pd
+
+CATEGORY_NAMES = [
+    'related', 'request', 'offer', 'aid_related', 'medical_help', 'medical_products',
+    'search_and_rescue', 'security', 'military', 'child_alone', 'water', 'food',
+    'shelter', 'clothing', 'money', 'missing_people', 'refugees', 'death', 'other_aid',
+    'infrastructure_related', 'transport', 'buildings', 'electricity', 'tools',
+    'hospitals', 'shops', 'aid_centers', 'other_infrastructure', 'weather_related',
+    'floods', 'storm', 'fire', 'earthquake', 'cold', 'other_weather', 'direct_report'
+]
+
+GENRES = ['direct', 'news', 'social']
+
+VOCABULARY = [
+    'water', 'food', 'help', 'need', 'earthquake', 'flood', 'storm', 'shelter', 'medical',
+    'hospital', 'people', 'children', 'family', 'rain', 'road', 'bridge', 'electricity',
+    'fire', 'cold', 'tent', 'money', 'aid', 'missing', 'dead', 'injured', 'doctor',
+    'please', 'village', 'city', 'house', 'destroyed', 'hungry', 'thirsty', 'clothes',
+    'blanket', 'the', 'we', 'are', 'in', 'and', 'our', 'no', 'have', 'for', 'is', 'there'
+]
+
+
+def disaster_messages(n_rows, seed=0, min_words=5, max_words=40):
+    """
+    This function generates random disaster messages
+    INPUT:
+    n_rows - int - number of messages
+    seed - int - random seed
+    OUTPUT:
+    messages - list of strings
+    """
+    rng = np.random.RandomState(seed)
+    lengths = rng.randint(min_words, max_words, size=n_rows)
+    words = np.array(VOCABULARY)
+    return [' '.join(words[rng.randint(0, len(words), size=n)]) for n in lengths]
+
+
+def disaster_frames(n_rows, seed=0, duplicate_rate=0.01):
+    """
+    This function generates frames with the schema of disaster_messages.csv
+    and disaster_categories.csv
+    INPUT:
+    n_rows - int - number of rows in each frame
+    seed - int - random seed
+    duplicate_rate - float - share of rows that repeat an earlier row
+    OUTPUT:
+    messages - dataframe with id, message, original and genre columns
+    categories - dataframe with id and categories columns
+    """
+    rng = np.random.RandomState(seed)
+    ids = np.arange(2, n_rows + 2)
+    # repeat a few ids the way the Figure Eight export does
+    n_dup = int(n_rows * duplicate_rate)
+    if n_dup:
+        ids[-n_dup:] = rng.choice(ids[:-n_dup], size=n_dup)
+        ids.sort()
+    text = disaster_messages(n_rows, seed)
+    messages = pd.DataFrame({
+        'id': ids,
+        'message': text,
+        'original': [None] * n_rows,
+        'genre': rng.choice(GENRES, size=n_rows)
+    })
+    Y = disaster_labels(n_rows, seed)
+    # 'related' also takes the value 2 in the raw export
+    Y[rng.rand(n_rows) < 0.005, 0] = 2
+    categories = pd.DataFrame({
+        'id': ids,
+        'categories': [';'.join('{}-{}'.format(c, v) for c, v in zip(CATEGORY_NAMES, row))
+                       for row in Y]
+    })
+    return messages, categories
+
+
+def disaster_labels(n_rows, seed=0):
+    """
+    This function generates a sparse 0/1 label matrix for the 36 categories
+    """
+    rng = np.random.RandomState(seed + 1)
+    rates = np.linspace(0.02, 0.3, len(CATEGORY_NAMES))
+    Y = (rng.rand(n_rows, len(CATEGORY_NAMES)) < rates).astype(int)
+    # child_alone never occurs in the real data set
+    Y[:, CATEGORY_NAMES.index('child_alone')] = 0
+    return Y
+
+
+def disaster_table(n_rows, seed=0):
+    """
+    This function generates a dataframe with the schema of the cleaned
+    message_category table
+    """
+    messages, _ = disaster_frames(n_rows, seed, duplicate_rate=0)
+    labels = pd.DataFrame(disaster_labels(n_rows, seed), columns=CATEGORY_NAMES)
+    return pd.concat([messages, labels], axis=1)
+
+
+def disaster_artifacts(directory, n_rows, n_estimators=10, seed=0):
+    """
+    This function writes a synthetic DisasterResponse database and a model
+    trained on it, so the web app can be exercised without the real data
+    INPUT:
+    directory - string - folder receiving the database and the model
+    n_rows - int - number of messages in the database
+    n_estimators - int - trees per category forest
+    OUTPUT:
+    database_filepath - string - path of the sqlite database
+    model_filepath - string - path of the pickled model
+    """
+    import os
+    import pickle
+    from sqlalchemy import create_engine
+    from common import add_path
+    add_path('Disaster_Response_Pipeline', 'models')
+    import train_classifier
+
+    df = disaster_table(n_rows, seed)
+    database_filepath = os.path.join(directory, 'DisasterResponse.db')
+    engine = create_engine('sqlite:///{}'.format(database_filepath))
+    df.to_sql('message_category', engine, index=False, if_exists='replace')
+    engine.dispose()
+
+    model = train_classifier.build_model().estimator
+    model.set_params(clf__estimator__n_estimators=n_estimators)
+    model.fit(df['message'].values, df[CATEGORY_NAMES].values)
+    model_filepath = os.path.join(directory, 'classifier.pkl')
+    with open(model_filepath, 'wb') as f:
+        pickle.dump(model, f)
+    return database_filepath, model_filepath
+
+
+def disaster_corpus(n_rows, seed=0, n_rare=50000, noise=0.05):
+    """
+    This function generates messages with a long tail of rare tokens, like
+    the place and person names of the real data, and labels that follow
+    keywords, so models trained on it have something to learn
+    INPUT:
+    n_rows - int - number of messages
+    seed - int - random seed
+    n_rare - int - number of distinct rare tokens
+    noise - float - share of labels flipped at random
+    OUTPUT:
+    messages - list of strings
+    Y - int array of shape (n_rows, 36)
+    """
+    rng = np.random.RandomState(seed)
+    messages = disaster_messages(n_rows, seed)
+    # zipf distributed rare tokens make the vocabulary grow with the corpus
+    rare = np.minimum(rng.zipf(1.3, size=(n_rows, 3)), n_rare)
+    messages = ['{} place{} name{} item{}'.format(msg, *row) for msg, row in zip(messages, rare)]
+
+    # every category fires on one keyword of the vocabulary
+    Y = np.zeros((n_rows, len(CATEGORY_NAMES)), dtype=int)
+    for i, name in enumerate(CATEGORY_NAMES):
+        keyword = ' {} '.format(VOCABULARY[i % len(VOCABULARY)])
+        Y[:, i] = [keyword in ' {} '.format(msg) for msg in messages]
+    Y ^= (rng.rand(*Y.shape) < noise).astype(int)
+    Y[:, CATEGORY_NAMES.index('child_alone')] = 0
+    return messages, Y
+
+
+SURVEY_OPTIONS = {
+    'LanguageWorkedWith': ['JavaScript', 'HTML', 'CSS', 'SQL', 'Java', 'Bash/Shell', 'Python', 'C#', 'PHP',
+                           'C++', 'C', 'TypeScript', 'Ruby', 'Swift', 'Assembly', 'Go', 'Objective-C',
+                           'VB.NET', 'R', 'Matlab', 'VBA', 'Kotlin', 'Scala', 'Groovy', 'Perl', 'Visual Basic 6',
+                           'Lua', 'Delphi/Object Pascal', 'Rust', 'Haskell', 'F#', 'Erlang', 'Clojure', 'Julia',
+                           'Cobol', 'Hack', 'Ocaml', 'CoffeeScript'],
+    'DatabaseWorkedWith': ['MySQL', 'SQL Server', 'PostgreSQL', 'MongoDB', 'SQLite', 'Redis', 'Elasticsearch',
+                           'MariaDB', 'Oracle', 'Microsoft Azure (Tables, CosmosDB, SQL, etc)', 'Google Cloud Storage',
+                           'Memcached', 'Amazon DynamoDB', 'Amazon RDS/Aurora', 'Cassandra', 'IBM Db2',
+                           'Neo4j', 'Amazon Redshift', 'Apache Hive', 'Google BigQuery', 'Apache HBase'],
+    'FrameworkWorkedWith': ['Node.js', 'Angular', 'React', '.NET Core', 'Spring', 'Django', 'Cordova',
+                            'TensorFlow', 'Xamarin', 'Spark', 'Hadoop', 'Torch/PyTorch'],
+    'EducationTypes': ['Taught yourself a new language, framework, or tool without taking a formal course',
+                       'Taken an online course in programming or software development (e.g. a MOOC)',
+                       'Received on-the-job training in software development',
+                       'Participated in a hackathon', 'Contributed to open source software',
+                       'Taken a part-time in-person course in programming or software development',
+                       'Completed an industry certification program (e.g. MCPD)',
+                       'Participated in a full-time developer training program or bootcamp',
+                       'Participated in online coding competitions (e.g. HackerRank, CodeChef, TopCoder)'],
+    'HackathonReasons': ['Because I find it enjoyable', 'To improve my general technical skills or programming ability',
+                         'To improve my knowledge of a specific programming language, framework, or other technology',
+                         'To build my professional network', 'To help me find a new job opportunities',
+                         'To win prizes or cash awards', 'Because my employer requested or required it']
+}
+
+
+def survey_frame(n_rows=98855, seed=0, missing_rate=0.2):
+    """
+    This function generates a frame shaped like the multi-select questions of
+    the 2018 Stack Overflow survey, items separated by ';'
+    INPUT:
+    n_rows - int - number of respondents, the 2018 survey has 98855
+    seed - int - random seed
+    missing_rate - float - share of respondents skipping a question
+    OUTPUT:
+    df - dataframe with one column per question of SURVEY_OPTIONS
+    """
+    rng = np.random.RandomState(seed)
+    columns = {'Respondent': np.arange(1, n_rows + 1)}
+    for col, options in SURVEY_OPTIONS.items():
+        # a few popular options and a long tail, like the real answers
+        popularity = 1.0 / np.arange(1, len(options) + 1)
+        popularity /= popularity.sum()
+        n_items = np.minimum(rng.geometric(0.3, size=n_rows), len(options))
+        answers = [';'.join(sorted(rng.choice(options, size=k, replace=False, p=popularity),
+                                   key=options.index)) for k in n_items]
+        columns[col] = np.where(rng.rand(n_rows) < missing_rate, None, answers)
+    return pd.DataFrame(columns)
+
+
+def starbucks_transcript(person_ids, portfolio, seed=0, offer_times=(0, 168, 336, 408, 504, 576),
+                         transactions_per_person=8.4):
+    """
+    This function simulates the Starbucks event log with the layout of
+    transcript.json: received and viewed offers carry {'offer id': ...},
+    completed offers {'offer_id': ..., 'reward': ...} and transactions
+    {'amount': ...}. With the 17000 people of profile.json it has about as
+    many events as the real log.
+    INPUT:
+    person_ids - list of person ids
+    portfolio - dataframe read from portfolio.json
+    seed - int - random seed
+    OUTPUT:
+    transcript - dataframe with person, event, value and time columns
+    """
+    rng = np.random.RandomState(seed)
+    offer_ids = portfolio['id'].values
+    rewards = dict(zip(portfolio['id'], portfolio['reward']))
+    informational = set(portfolio.loc[portfolio['offer_type'] == 'informational', 'id'])
+    rows = []
+    for person in person_ids:
+        for start in offer_times:
+            if rng.rand() < 0.25:
+                continue
+            offer = offer_ids[rng.randint(len(offer_ids))]
+            rows.append((person, 'offer received', {'offer id': offer}, start))
+            if rng.rand() < 0.75:
+                rows.append((person, 'offer viewed', {'offer id': offer}, start + rng.randint(0, 72)))
+            if offer not in informational and rng.rand() < 0.45:
+                rows.append((person, 'offer completed', {'offer_id': offer, 'reward': rewards[offer]},
+                             start + rng.randint(0, 120)))
+        for time in rng.randint(0, 714, size=rng.poisson(transactions_per_person)):
+            rows.append((person, 'transaction', {'amount': round(float(rng.lognormal(2.3, 0.9)), 2)}, time))
+    transcript = pd.DataFrame(rows, columns=['person', 'event', 'value', 'time'])
+    return transcript.sort_values('time', kind='mergesort').reset_index(drop=True)
@@ -1,25 +1,85 @@
+import os
+import sys
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from IPython import display
-from collections import defaultdict
 import seaborn as sns
 
-df_2018 = pd.read_csv('data/2018/survey_results_public.csv',low_memory=False);
-schema_2018 =pd.read_csv('data/2018/survey_results_schema.csv');
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'shared'))
+import column_cache
+from item_counts import (unique_vals, unique_val_counts, distinct_answers, indicator_matrix,
+                         multi_value_counts, total_count)
 
-def load_data(file):
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', '2018')
+SURVEY_FILE = os.path.join(DATA_DIR, 'survey_results_public.csv')
+SCHEMA_FILE = os.path.join(DATA_DIR, 'survey_results_schema.csv')
+
+# text columns with at most this share of distinct values are cached as categoricals
+CATEGORY_MAX_UNIQUE = 0.5
+# raise when parse_survey returns other columns or dtypes, so cached surveys are parsed again
+SURVEY_CACHE_VERSION = 1
+
+def __getattr__(name):
+    """
+    This Function loads df_2018, schema_2018 and schema_2018_index the first time
+    they are used instead of when the module is imported.
+    """
+    if name == 'df_2018':
+        value = load_data(SURVEY_FILE)
+    elif name == 'schema_2018':
+        value = pd.read_csv(SCHEMA_FILE)
+    elif name == 'schema_2018_index':
+        value = schema_index(get_dataset('schema_2018'))
+    else:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    globals()[name] = value
+    return value
+
+def get_dataset(name):
+    """
+    This Function returns df_2018, schema_2018 or schema_2018_index, loading it on first use.
+    """
+    return globals()[name] if name in globals() else __getattr__(name)
+
+def parse_survey(file):
+    """
+    This Function parses a csv file of the survey, text columns with few distinct
+    values as categoricals and integer columns downcast.
+    """
+    df = pd.read_csv(file,low_memory=False)
+    for col in df.columns:
+        values = df[col]
+        is_text = values.dtype == object or pd.api.types.is_string_dtype(values.dtype)
+        if is_text and values.nunique() <= CATEGORY_MAX_UNIQUE * values.count():
+            # categories in order of first appearance, like value_counts(sort=False) of the text
+            df[col] = values.astype(pd.CategoricalDtype(values.dropna().unique()))
+        elif pd.api.types.is_integer_dtype(values):
+            df[col] = pd.to_numeric(values, downcast='integer')
+    return df
+
+def build_cache(file):
+    """
+    This Function parses a csv file once into its columnar cache, see shared/column_cache.py.
+    """
+    return column_cache.build_cache(file, parse_survey, SURVEY_CACHE_VERSION)
+
+def load_data(file,columns=None,cache=True):
     """
     This Function loads the data file and converts file into pandas DataFrame.
     INPUT:
         file - the data file which needs to be converted into dataframe
+        columns - list of column names to load, None loads every column
+        cache - bool - read from the columnar cache of the file, parsing the csv
+                only the first time and whenever it changes
     OUTPUT:
         df - Pandas Dataframe created from the input data file
     """
-    # Load file into a dataframe
-    df = pd.read_csv(file,low_memory=False)
-    
-    return df
+    if not cache:
+        # Load file into a dataframe
+        return pd.read_csv(file,low_memory=False,usecols=columns)
+
+    return column_cache.load_columns(file, parse_survey, columns, SURVEY_CACHE_VERSION)
 
 def num_cat_vars(df):
     """
@@ -33,7 +93,7 @@ def num_cat_vars(df):
     # select all numerical variables of the dataframe
     num_vars = df.select_dtypes(include=['float','int'])
     # select all categorical variables of the dataframe
-    cat_vars = df.select_dtypes(include=['object'])
+    cat_vars = df.select_dtypes(include=['object','category'])
     return num_vars,cat_vars
 
 def status_values_plot(df,col,title=None,plot=False):
@@ -48,67 +108,61 @@ def status_values_plot(df,col,title=None,plot=False):
         status_vals - returns the series with status values and their counts
     """
     status_vals = df[col].value_counts()
+    # categoricals also report the categories without any row
+    status_vals = status_vals[status_vals > 0]
     if plot:
         (status_vals/df.shape[0]).plot(kind="bar")
         plt.title(title);
     return status_vals.reset_index()
 
-def get_description(col,schema=schema_2018):
+def schema_index(schema=None):
     """
-    This Function returns the question from schema dataframe given a variable.
+    This Function builds a dict from every column of a schema to its question.
     INPUT:
-        col -  string - the name of the column you would like to know about
-        schema - pandas dataframe with the schema of the developers survey
+        schema - pandas dataframe with the schema of the developers survey, None returns
+                 the index of schema_2018, built once on first use, a dict is returned as is
     OUTPUT:
-        desc - string - the description of the column 
-    """
-    desc =  list(schema[schema['Column']==col]['QuestionText'])[0]
-    return desc
+        index - dict mapping column names to their QuestionText
+    """
+    if schema is None:
+        return get_dataset('schema_2018_index')
+    if isinstance(schema, dict):
+        return schema
+    # the first row of a repeated column wins, as with the former scan
+    schema = schema.drop_duplicates('Column')
+    return dict(zip(schema['Column'], schema['QuestionText']))
 
-def unique_vals(df,col):
+def get_descriptions(cols,schema=None):
     """
-    This Function returns unique values in a column.
+    This Function returns the questions of many columns with a single schema index.
     INPUT:
-        df - dataframe holding the column to look for unique values
-        col - string - the column name for which unique values are required
+        cols - list of column names you would like to know about
+        schema - pandas dataframe with the schema of the developers survey or its schema_index,
+                 None uses schema_2018
     OUTPUT:
-        uval - a list of unique values in the column 
+        desc - Series of descriptions indexed by the column names
     """
-    uval = list()
-    df = df[col].dropna().unique()
-    for st in df.astype(str):
-        val = st.split(';')
-        for item in val:
-            if item not in uval:
-                uval.append(item)
-    return uval
+    index = schema_index(schema)
+    unknown = [col for col in cols if col not in index]
+    if unknown:
+        raise KeyError('columns not in the survey schema: {}'.format(unknown))
+    return pd.Series([index[col] for col in cols], index=cols, name='QuestionText')
 
-def total_count(df, col1, col2, look_for):
+def get_description(col,schema=None):
     """
-    This Function calculates the total count of individual items in a dataframe column
+    This Function returns the question from schema dataframe given a variable.
     INPUT:
-    df - the pandas dataframe you want to search
-    col1 - the column name you want to look through
-    col2 - the column you want to count values from
-    look_for - a list of strings you want to search for in each row of df[col]
-
+        col -  string - the name of the column you would like to know about
+        schema - pandas dataframe with the schema of the developers survey or its schema_index,
+                 None uses schema_2018
     OUTPUT:
-    new_df - a dataframe of each look_for with the count of how often it shows up
+        desc - string - the description of the column 
     """
-    new_df = defaultdict(int)
-    #loop through list of ed types
-    for val in look_for:
-        #loop through rows
-        for idx in range(df.shape[0]):
-            #if the ed type is in the row add 1
-            if val in df[col1][idx]:
-                new_df[val] += int(df[col2][idx])
-    new_df = pd.DataFrame(pd.Series(new_df)).reset_index()
-    new_df.columns = [col1,col2]
-    new_df.sort_values('count',ascending=False,inplace=True)
-    return new_df
-
-
+    index = schema_index(schema)
+    if col not in index:
+        raise KeyError('column not in the survey schema: {!r}'.format(col))
+    desc = index[col]
+    return desc
 
 def clean_and_plot(df,col,possible_vals,title='Method of Educating Suggested',plot=True):
     """
@@ -124,7 +178,7 @@ def clean_and_plot(df,col,possible_vals,title='Method of Educating Suggested',pl
         Displays a plot of pretty things related to the required column.
     """
     study = df[col].value_counts().reset_index()
-    study.rename(columns={'index':col,col:'count'},inplace=True)
+    study.columns = [col,'count']
     study_df = total_count(study,col,'count',possible_vals)
     
     study_df.set_index(col,inplace=True)
@@ -148,6 +202,7 @@ def piechart(df,col):
         Displays a piechart of pretty things related to the required column.
     """
     data = df[col].value_counts()
+    data = data[data > 0]
     explodes = [0 for i in range(len(data))]
     explodes[0] = 0.1
     explode=tuple(explodes)
@@ -0,0 +1,109 @@
+"""
+Columnar cache of parsed data files, shared by the survey helpers of
+blogpost/stackoverflowsurvey/func.py and the Starbucks loaders of
+Starbucks_Capstone_Project/functions/load.py.
+
+A file is parsed once into file.cache/: one pickle per column and a
+manifest.json holding the size and mtime of the file, the parser that read
+it and the column names. Later loads read only the pickles of the columns
+they ask for, and the cache is rebuilt whenever the file changes or it was
+written by another parser. A parser whose output changes, e.g. new dtypes,
+must come with a new version. Parquet would give the same
+column-selective reads, but pyarrow is not a dependency of the projects,
+while pickles keep every pandas dtype, categoricals included.
+"""
+import os
+import json
+import pickle
+import shutil
+
+import pandas as pd
+
+
+def cache_dir(file):
+    """
+    This function returns the folder holding the columnar cache of a file.
+    """
+    return file + '.cache'
+
+
+def parser_key(parse, version):
+    """
+    This function names a parser and the version of its output.
+    """
+    return '{}.{}:{}'.format(parse.__module__, parse.__qualname__, version)
+
+
+def build_cache(file, parse, version=1):
+    """
+    This function parses a file once and stores every column in its own pickle.
+
+    INPUT:
+    file: string - path of the data file
+    parse: function - parses the file into a dataframe
+    version: int - version of the output of parse
+
+    OUTPUT:
+    manifest: dictionary - with the file signature, the parser and the cached column names
+    """
+    df = parse(file)
+    stat = os.stat(file)
+    manifest = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'parser': parser_key(parse, version),
+                'columns': list(df.columns)}
+
+    # write next to the final folder and swap it in once complete
+    tmp_dir = cache_dir(file) + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for i, col in enumerate(df.columns):
+        with open(os.path.join(tmp_dir, '{}.pkl'.format(i)), 'wb') as f:
+            pickle.dump(df[col], f, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+    shutil.rmtree(cache_dir(file), ignore_errors=True)
+    os.rename(tmp_dir, cache_dir(file))
+    return manifest
+
+
+def load_manifest(file, parse, version=1):
+    """
+    This function returns the manifest of the columnar cache of a file,
+    building the cache when it is missing, older than the file or written
+    by another parser or version.
+    """
+    stat = os.stat(file)
+    signature = (stat.st_size, stat.st_mtime_ns, parser_key(parse, version))
+    try:
+        with open(os.path.join(cache_dir(file), 'manifest.json')) as f:
+            manifest = json.load(f)
+        if (manifest['size'], manifest['mtime_ns'], manifest['parser']) == signature:
+            return manifest
+    except (IOError, ValueError, KeyError):
+        pass
+    return build_cache(file, parse, version)
+
+
+def load_columns(file, parse, columns=None, version=1):
+    """
+    This function reads columns of a file from its columnar cache.
+
+    INPUT:
+    file: string - path of the data file
+    parse: function - parses the file into a dataframe when the cache is stale
+    columns: list - names of the columns to load, None loads every column
+    version: int - version of the output of parse
+
+    OUTPUT:
+    df: dataframe - the columns in the order asked for
+    """
+    manifest = load_manifest(file, parse, version)
+    positions = {col: i for i, col in enumerate(manifest['columns'])}
+    columns = manifest['columns'] if columns is None else list(columns)
+    unknown = [col for col in columns if col not in positions]
+    if unknown:
+        raise KeyError('columns not in {}: {}'.format(file, unknown))
+    data = {}
+    for col in columns:
+        with open(os.path.join(cache_dir(file), '{}.pkl'.format(positions[col])), 'rb') as f:
+            data[col] = pickle.load(f)
+    return pd.DataFrame(data, columns=columns)
@@ -0,0 +1,148 @@
+"""
+Counting of the items of multi-select answers, shared by the helpers of
+blogpost/stackoverflowsurvey/func.py and Starbucks_Capstone_Project/functions/func.py.
+
+Answers are strings of items separated by ';', like the language columns of
+the survey, or lists of items, like the channels of the Starbucks offers.
+Every distinct answer is split once and the rows are counted through a
+sparse answer by item indicator matrix, matching items exactly.
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+def unique_vals(df,col):
+    """
+    This Function returns unique values in a column.
+    INPUT:
+        df - dataframe holding the column to look for unique values
+        col - string - the column name for which unique values are required,
+              or a list of column names
+    OUTPUT:
+        uval - a list of unique values in the column in order of first appearance,
+               a dict of such lists by column name when col is a list
+    """
+    counts = unique_val_counts(df, col)
+    # a column without answers has no rows in counts, it has no values
+    columns = counts.index.get_level_values('column')
+    values = counts.index.get_level_values('value')
+    if isinstance(col, str):
+        return list(values[columns == col])
+    return {c: list(values[columns == c]) for c in col}
+
+def unique_val_counts(df, cols, sep=';'):
+    """
+    This Function returns the unique items of ;-separated columns with the number of
+    rows holding each item, splitting each distinct answer only once.
+    INPUT:
+        df - dataframe holding the columns
+        cols - string or list of column names
+        sep - string - separator of the items in a string answer
+    OUTPUT:
+        counts - Series indexed by (column, value) with the number of rows holding each
+                 item, items in order of first appearance
+    """
+    if isinstance(cols, str):
+        cols = [cols]
+    frames = []
+    for col in cols:
+        # value_counts keeps the order of first appearance when it does not sort
+        answer_counts = df[col].value_counts(sort=False)
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            # categories may be unused or in another order than the rows
+            answer_counts = answer_counts.reindex(df[col].dropna().unique())
+        indicator, items = indicator_matrix(list(answer_counts.index), sep)
+        counts = pd.Series(indicator.T.dot(answer_counts.values).astype(int), index=items)
+        counts.index = pd.MultiIndex.from_product([[col], counts.index], names=['column', 'value'])
+        frames.append(counts)
+    return pd.concat(frames).rename('count')
+
+def distinct_answers(series):
+    """
+    This Function maps every answer of a column to the id of its distinct value,
+    so multi-select answers only need to be split once per distinct value.
+    INPUT:
+        series - pandas Series of answers, strings or lists of items
+    OUTPUT:
+        codes - int array, id of the distinct answer of every row, -1 for missing answers
+        distinct - list of the distinct answers
+    """
+    # lists are not hashable, compare them as tuples
+    values = [tuple(x) if isinstance(x, (list, set)) else x for x in series]
+    codes, distinct = pd.factorize(pd.Series(values, dtype=object))
+    return codes, list(distinct)
+
+def indicator_matrix(distinct, sep=';'):
+    """
+    This Function splits answers into their individual items and returns a sparse
+    indicator matrix with exact item matching, so "Java" does not match "JavaScript".
+    INPUT:
+        distinct - list of answers, strings separated by sep or lists of items
+        sep - string - separator of the items in a string answer
+    OUTPUT:
+        indicator - scipy csr matrix of shape (len(distinct), n_items), 1 where an answer holds an item
+        items - pandas Index of the items in order of first appearance
+    """
+    parts = [list(x) if isinstance(x, (tuple, list, set)) else str(x).split(sep) for x in distinct]
+    rows = np.repeat(np.arange(len(parts)), [len(p) for p in parts])
+    item_codes, items = pd.factorize(pd.Series([str(item) for p in parts for item in p], dtype=object))
+    indicator = sparse.csr_matrix((np.ones(len(rows)), (rows, item_codes)), shape=(len(parts), len(items)))
+    # an item repeated inside one answer still counts once
+    indicator.data[:] = 1
+    return indicator, items
+
+def multi_value_counts(df, cols, look_for=None, weights=None, sep=';'):
+    """
+    This Function counts the individual items of multi-select columns in one pass per column.
+    INPUT:
+        df - the pandas dataframe holding the columns
+        cols - list of column names or a single column name
+        look_for - list of items to report, None reports every item found
+        weights - name of a column weighting every row, None counts every row once
+        sep - string - separator of the items in a string answer
+    OUTPUT:
+        counts - dataframe indexed by (column, value) with the weighted count of every item
+                 and its proportion among all items counted in that column
+    """
+    if isinstance(cols, str):
+        cols = [cols]
+    row_weights = np.ones(df.shape[0]) if weights is None else df[weights].fillna(0).values.astype(float)
+    frames = []
+    for col in cols:
+        codes, distinct = distinct_answers(df[col])
+        answered = codes >= 0
+        # sum the weights of the rows sharing an answer, then spread them over its items
+        answer_weights = np.bincount(codes[answered], weights=row_weights[answered], minlength=len(distinct))
+        indicator, items = indicator_matrix(distinct, sep)
+        counts = pd.Series(indicator.T.dot(answer_weights), index=items)
+        if weights is None:
+            counts = counts.astype(int)
+        if look_for is not None:
+            counts = counts.reindex(look_for, fill_value=0)
+        frame = pd.DataFrame({'count': counts, 'proportion': counts / max(counts.sum(), 1)})
+        frame.index = pd.MultiIndex.from_product([[col], frame.index], names=['column', 'value'])
+        frames.append(frame)
+    return pd.concat(frames)
+
+def total_count(df, col1, col2, look_for):
+    """
+    This Function calculates the total count of individual items in a dataframe column
+    INPUT:
+    df - the pandas dataframe you want to search
+    col1 - the column name you want to look through
+    col2 - the column you want to count values from
+    look_for - a list of strings you want to search for in each row of df[col]
+    OUTPUT:
+    new_df - a dataframe of each look_for with the count of how often it shows up
+    """
+    codes, distinct = distinct_answers(df[col1])
+    indicator, items = indicator_matrix(distinct)
+    answered = codes >= 0
+    answer_weights = np.bincount(codes[answered], weights=df[col2].values[answered].astype(int),
+                                 minlength=len(distinct))
+    counts = pd.Series(indicator.T.dot(answer_weights).astype(int), index=items)
+    # only report the items that occur in some row, as exact items
+    new_df = counts.reindex([val for val in look_for if val in items]).reset_index()
+    new_df.columns = [col1,col2]
+    new_df.sort_values(col2,ascending=False,kind='mergesort',inplace=True)
+    return new_df
@@ -0,0 +1,62 @@
+import os
+
+import pandas as pd
+import pytest
+
+import column_cache
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    file = str(tmp_path / 'data.csv')
+    pd.DataFrame({'a': [1, 2, 3], 'b': ['x', 'y', 'x'], 'c': [0.5, None, 1.5]}).to_csv(file, index=False)
+    return file
+
+
+def counting_parser(calls):
+    def parse(file):
+        calls.append(file)
+        df = pd.read_csv(file)
+        df['b'] = df['b'].astype('category')
+        return df
+    return parse
+
+
+def test_file_is_parsed_once_and_columns_read_on_demand(data_file):
+    calls = []
+    parse = counting_parser(calls)
+    df = column_cache.load_columns(data_file, parse)
+    assert list(df.columns) == ['a', 'b', 'c'] and df['b'].dtype == 'category'
+    subset = column_cache.load_columns(data_file, parse, ['c', 'b'])
+    assert list(subset.columns) == ['c', 'b']
+    pd.testing.assert_frame_equal(subset, df[['c', 'b']])
+    assert len(calls) == 1
+
+
+def test_cache_is_rebuilt_when_the_file_changes(data_file):
+    calls = []
+    parse = counting_parser(calls)
+    column_cache.load_columns(data_file, parse)
+    pd.DataFrame({'a': [7], 'b': ['z'], 'c': [0.0]}).to_csv(data_file, index=False)
+    os.utime(data_file, ns=(0, 0))
+    assert column_cache.load_columns(data_file, parse)['a'].tolist() == [7]
+    assert len(calls) == 2
+
+
+def test_unknown_columns_raise_key_error(data_file):
+    with pytest.raises(KeyError):
+        column_cache.load_columns(data_file, counting_parser([]), ['a', 'missing'])
+
+
+def test_cache_is_rebuilt_for_another_parser_version(data_file):
+    calls = []
+    parse = counting_parser(calls)
+    column_cache.load_columns(data_file, parse, version=1)
+    column_cache.load_columns(data_file, parse, version=1)
+    assert len(calls) == 1
+    column_cache.load_columns(data_file, parse, version=2)
+    assert len(calls) == 2
+
+    def other_parser(file):
+        return pd.read_csv(file).astype({'a': 'float64'})
+    assert column_cache.load_columns(data_file, other_parser, version=2)['a'].dtype == 'float64'
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from item_counts import unique_vals, multi_value_counts
+
+
+def first_appearance(series):
+    # the item order of the original, one answer at a time implementation
+    uval = []
+    for answer in series.dropna().unique().astype(str):
+        for item in answer.split(';'):
+            if item not in uval:
+                uval.append(item)
+    return uval
+
+
+def test_unique_vals_matches_the_original_order():
+    df = pd.DataFrame({'lang': ['Python;SQL', np.nan, 'Java;JavaScript', 'SQL;Java', 'Python;SQL']})
+    assert unique_vals(df, 'lang') == first_appearance(df['lang'])
+
+
+def test_unique_vals_of_a_column_without_answers():
+    df = pd.DataFrame({'empty': [np.nan, np.nan], 'lang': ['Go', 'Go;C']})
+    assert unique_vals(df, 'empty') == []
+    assert unique_vals(df.iloc[:0], 'lang') == []
+    assert unique_vals(df, ['empty', 'lang']) == {'empty': [], 'lang': ['Go', 'C']}
+
+
+def test_multi_value_counts_of_list_answers():
+    df = pd.DataFrame({'channels': [['email', 'mobile'], ['web', 'email'], None, ['email', 'mobile']]})
+    counts = multi_value_counts(df, 'channels', look_for=['email', 'mobile', 'web', 'social'])
+    assert counts['count'].tolist() == [3, 2, 1, 0]